@@ -1,8 +1,9 @@
 from django.contrib import admin
-from .models import Service, ServiceProfessional, Event, Reservation, Review
+from .models import Service, ServiceProfessional, Event, Reservation, Review, OutgoingEmail
 # Register your models here.
 admin.site.register(Service)
 admin.site.register(ServiceProfessional)
 admin.site.register(Event)
 admin.site.register(Reservation)
 admin.site.register(Review)
+admin.site.register(OutgoingEmail)
@@ -0,0 +1,159 @@
+import hashlib
+import json
+from django.core.exceptions import BadRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views import View
+from .caching import get_content_version, get_reviews_version
+from .models import Service, ServiceProfessional, Event, Review
+from .pagination import keyset_page, BadCursor
+
+#read-only JSON API for the kiosk displays and mobile front end, everything lives under /api/v1/.
+#  ?fields=id,name      only return these fields
+#  ?limit=100           page size (max 500)
+#  ?after=<cursor>      next page, copy it from "next" in the previous response
+#related objects (services, event) are embedded and come from prefetch_related, so a page costs the same
+#number of queries no matter how big it is.
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def service_summary(service):
+    return {'id': service.pk, 'name': service.name}
+
+
+class ApiListView(View):
+    model = None
+    order_field = 'id'
+    descending = False
+    #True when the content version in core/caching.py covers this model, then we can answer
+    #If-None-Match without touching the database
+    versioned = True
+    fields = {} #field name -> function(obj) returning the value
+
+    def get_queryset(self):
+        return self.model.objects.all()
+
+    def version(self):
+        return get_content_version()
+
+    def selected_fields(self):
+        requested = self.request.GET.get('fields')
+        if not requested:
+            return list(self.fields)
+        names = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise BadRequest(f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(self.fields)}")
+        return names
+
+    def page_size(self):
+        try:
+            limit = int(self.request.GET.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            raise BadRequest("limit must be a number.")
+        return max(1, min(limit, MAX_LIMIT))
+
+    def get(self, request):
+        names = self.selected_fields()
+        limit = self.page_size()
+
+        etag = None
+        if self.versioned:
+            raw = f"{self.version()}|{request.get_full_path()}"
+            etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return self.finish(not_modified, etag)
+
+        try:
+            rows, next_cursor = keyset_page(self.get_queryset(), self.order_field, request.GET.get('after'), limit, self.descending)
+        except BadCursor:
+            raise BadRequest("Invalid cursor.")
+
+        next_url = None
+        if next_cursor:
+            params = request.GET.copy()
+            params['after'] = next_cursor
+            next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+        body = json.dumps({
+            'results': [{name: self.fields[name](row) for name in names} for row in rows],
+            'next': next_url,
+        }, cls=DjangoJSONEncoder)
+
+        if etag is None: #no version to go by, use the body itself
+            etag = quote_etag(hashlib.md5(body.encode()).hexdigest())
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return self.finish(not_modified, etag)
+        return self.finish(HttpResponse(body, content_type='application/json'), etag)
+
+    def finish(self, response, etag):
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=60)
+        return response
+
+
+class EventList(ApiListView):
+    model = Event
+    order_field = 'start_time_and_date'
+    fields = {
+        'id': lambda event: event.pk,
+        'name': lambda event: event.name,
+        'description': lambda event: event.description,
+        'location': lambda event: event.event_location,
+        'start': lambda event: event.start_time_and_date,
+        'end': lambda event: event.end_time,
+        'services': lambda event: [service_summary(service) for service in event.services.all()],
+    }
+
+    def get_queryset(self):
+        return Event.objects.prefetch_related('services')
+
+
+class ServiceList(ApiListView):
+    model = Service
+    fields = {
+        'id': lambda service: service.pk,
+        'name': lambda service: service.name,
+        'description': lambda service: service.service_description,
+    }
+
+
+class ProfessionalList(ApiListView):
+    model = ServiceProfessional
+    fields = {
+        'id': lambda pro: pro.pk,
+        'name': lambda pro: pro.name,
+        'services': lambda pro: [service_summary(service) for service in pro.services.all()],
+    }
+
+    def get_queryset(self):
+        return ServiceProfessional.objects.prefetch_related('services')
+
+
+class ReviewList(ApiListView):
+    model = Review
+    order_field = 'time_and_date'
+    descending = True #newest first, like the reviews page
+    fields = {
+        'id': lambda review: review.pk,
+        'name': lambda review: review.name,
+        'author': lambda review: review.user.username,
+        'text': lambda review: review.text,
+        'stars': lambda review: review.stars,
+        'date': lambda review: review.time_and_date,
+        'event': lambda review: {'id': review.any_event.pk, 'name': review.any_event.name} if review.any_event else None, #archived ones too
+        'services': lambda review: [service_summary(service) for service in review.services.all()],
+    }
+
+    def version(self):
+        #the reviews have their own version, the embedded event and service names are under the content version
+        return f"{get_content_version()}.{get_reviews_version()}"
+
+    def get_queryset(self):
+        return Review.objects.select_related('event', 'archived_event', 'user').prefetch_related('services')
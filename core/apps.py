@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.core import checks
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
 
+    def ready(self):
+        from . import signals #connects the cache invalidation receivers
+        from .booking import check_assignment_setting
+        checks.register(check_assignment_setting)
@@ -0,0 +1,79 @@
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Event, Reservation, Review, ArchivedEvent, ArchivedReservation, WaitlistEntry
+
+#moves events that ended a while ago, with their reservations, out of the live tables into ArchivedEvent and
+#ArchivedReservation (the archive_events command, run from cron). the booking checks, availability grids and
+#appointment pages only ever look at the live tables, so they stay the size of a semester instead of growing forever.
+#reviews stay where they are and point at the archived event instead. archived rows keep their ids.
+
+KEEP_DAYS = 90 #events stay live this long after they end
+BATCH_SIZE = 100 #events per transaction
+
+
+def names(objects):
+    return "; ".join(sorted(str(obj) for obj in objects))
+
+
+def archive_batch(events):
+    #events: a list of Event with services prefetched. returns how many reservations were moved
+    event_ids = [event.pk for event in events]
+    ArchivedEvent.objects.bulk_create([
+        ArchivedEvent(
+            id=event.pk, name=event.name, description=event.description, start_time_and_date=event.start_time_and_date,
+            end_time=event.end_time, event_location=event.event_location, services=names(event.services.all()),
+        )
+        for event in events
+    ])
+
+    reservations = (
+        Reservation.objects
+        .filter(event_id__in=event_ids)
+        .select_related('professional')
+        .prefetch_related('services')
+        .order_by('pk')
+    )
+    moved, rows = 0, []
+    for reservation in reservations.iterator(chunk_size=2000):
+        rows.append(ArchivedReservation(
+            id=reservation.pk, username=reservation.username, time_and_date=reservation.time_and_date,
+            event_id=reservation.event_id, professional=str(reservation.professional or ''), user_id=reservation.user_id,
+            services=names(reservation.services.all()), updated_at=reservation.updated_at,
+        ))
+        if len(rows) >= 2000:
+            moved += len(ArchivedReservation.objects.bulk_create(rows))
+            rows = []
+    moved += len(ArchivedReservation.objects.bulk_create(rows))
+
+    Review.objects.filter(event_id__in=event_ids).update(archived_event_id=F('event_id')) #same id on both sides
+
+    #deleting reservations one by one would send a signal per row and refresh the availability grid for every one of
+    #them, for events nobody can book anymore. deleting the events drops their whole grids instead (signals.py)
+    WaitlistEntry.objects.filter(event_id__in=event_ids).delete() #nobody is waiting for an event that's long over
+    Reservation.services.through.objects.filter(reservation__event_id__in=event_ids).delete()
+    Reservation.objects.filter(event_id__in=event_ids)._raw_delete(Reservation.objects.db)
+    Event.objects.filter(pk__in=event_ids).delete() #ratings go with them, reviews get event=None (they have archived_event)
+    return moved
+
+
+def archive_events(keep_days=KEEP_DAYS, batch_size=BATCH_SIZE, now=None):
+    #returns (events moved, reservations moved). every batch is its own transaction, so a big first run doesn't hold
+    #locks for long and can be stopped and started again
+    cutoff = (now or timezone.now()) - timedelta(days=keep_days)
+    events_moved = reservations_moved = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                Event.objects
+                .filter(end_time__lt=cutoff)
+                .order_by('end_time', 'pk')
+                .prefetch_related('services')
+                .select_for_update()[:batch_size]
+            )
+            if not events:
+                break
+            reservations_moved += archive_batch(events)
+            events_moved += len(events)
+    return events_moved, reservations_moved
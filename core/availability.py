@@ -0,0 +1,176 @@
+import math
+from django.core.cache import cache
+from .booking import slot_length
+from .models import Event, Reservation, ServiceProfessional
+
+#precomputed "who is busy when" for every event, kept in the cache so the booking page can list open times without
+#running the booking query once per slot. core/signals.py keeps it up to date.
+#
+#we store three things:
+#  - per event: the slot start times and the services it offers
+#  - per event and pro: the indexes of the slots that pro is busy in
+#  - once for everybody: which services every pro offers
+#a pro is free for a set of services in a slot if they offer all of them and aren't busy, so any combination of
+#services can be answered from these without storing every combination.
+#a booking only rewrites its own pro's key, from the database, so bookings for different pros landing in different
+#workers at once can't overwrite each other's changes the way a read-modify-write of one shared grid would.
+
+GRID_TIMEOUT = 60 * 60 * 24 #rebuilt on the next read anyway if it falls out
+SKILLS_KEY = "availability:skills"
+
+
+def grid_key(event_id):
+    return f"availability:event:{event_id}"
+
+
+def busy_key(event_id, professional_id):
+    return f"availability:event:{event_id}:pro:{professional_id}"
+
+
+def event_slots(event):
+    slots = []
+    current = event.start_time_and_date
+    while current < event.end_time:
+        slots.append(current)
+        current += slot_length()
+    return slots
+
+
+def busy_slots_for(slots, reservation_times):
+    #indexes of the slots that overlap any of the given reservation start times.
+    #slots are evenly spaced so we can jump straight to the (at most 2) slots a reservation can touch
+    if not slots:
+        return set()
+    slot = slot_length()
+    busy = set()
+    for time_and_date in reservation_times:
+        position = (time_and_date - slots[0]) / slot
+        for index in (math.floor(position), math.ceil(position)):
+            if 0 <= index < len(slots) and abs(slots[index] - time_and_date) < slot:
+                busy.add(index)
+    return busy
+
+
+def build_grid(event, professional_ids=None):
+    #professional_ids: every pro gets a busy key, including the ones with nothing booked
+    slots = event_slots(event)
+    busy = {pk: set() for pk in (professional_ids if professional_ids is not None else get_skills())}
+    if slots:
+        slot = slot_length()
+        reservations = (
+            Reservation.objects
+            .filter(professional__isnull=False, time_and_date__gt=slots[0] - slot, time_and_date__lt=slots[-1] + slot)
+            .values_list('professional_id', 'time_and_date')
+        )
+        times_by_pro = {}
+        for professional_id, time_and_date in reservations:
+            times_by_pro.setdefault(professional_id, []).append(time_and_date)
+        for professional_id, times in times_by_pro.items():
+            busy[professional_id] = busy_slots_for(slots, times)
+
+    grid = {
+        'slots': slots,
+        'services': set(event.services.values_list('pk', flat=True)),
+    }
+    cache.set_many({busy_key(event.pk, pk): indexes for pk, indexes in busy.items()}, GRID_TIMEOUT)
+    cache.set(grid_key(event.pk), grid, GRID_TIMEOUT)
+    grid['busy'] = busy
+    return grid
+
+
+def build_skills():
+    skills = {pk: set() for pk in ServiceProfessional.objects.values_list('pk', flat=True)}
+    for professional_id, service_id in ServiceProfessional.services.through.objects.values_list('serviceprofessional_id', 'service_id'):
+        skills[professional_id].add(service_id)
+    cache.set(SKILLS_KEY, skills, GRID_TIMEOUT)
+    return skills
+
+
+def get_grid(event):
+    #{'slots': [start], 'services': {service id}, 'busy': {pro id: {slot index}}}
+    professional_ids = list(get_skills())
+    grid = cache.get(grid_key(event.pk))
+    if grid is not None:
+        keys = {busy_key(event.pk, pk): pk for pk in professional_ids}
+        found = cache.get_many(list(keys))
+        if len(found) == len(keys):
+            grid['busy'] = {keys[key]: indexes for key, indexes in found.items()}
+            return grid
+    return build_grid(event, professional_ids) #missing, or some pro's key fell out
+
+
+def get_skills():
+    skills = cache.get(SKILLS_KEY)
+    if skills is None:
+        skills = build_skills()
+    return skills
+
+
+def open_slots(event, service_ids=None):
+    #[(slot start, [free pro ids])] for every slot where at least one pro can do all of service_ids.
+    #with no service_ids, a slot is open if any pro who offers one of the event's services is free
+    grid = get_grid(event)
+    skills = get_skills()
+    if service_ids:
+        wanted = set(service_ids)
+        able = [pk for pk, offered in skills.items() if wanted <= offered]
+    else:
+        able = [pk for pk, offered in skills.items() if offered & grid['services']]
+
+    result = []
+    for index, start in enumerate(grid['slots']):
+        free = [pk for pk in able if index not in grid['busy'].get(pk, ())]
+        if free:
+            result.append((start, free))
+    return result
+
+
+def open_slots_by_service(event):
+    #[(slot start, [services someone is free for])] for the booking page
+    grid = get_grid(event)
+    skills = get_skills()
+    services = list(event.services.all())
+    result = []
+    for index, start in enumerate(grid['slots']):
+        offered = set()
+        for pk, pro_services in skills.items():
+            if index not in grid['busy'].get(pk, ()):
+                offered |= pro_services
+        available = [service for service in services if service.pk in offered]
+        if available:
+            result.append((start, available))
+    return result
+
+
+def refresh_professional(professional_id, times):
+    #a reservation for this pro was added/moved/removed around these times, fix up the cached grids that cover them.
+    #only that pro's key gets rewritten, straight from the database, the rest of the grid is left alone
+    if professional_id is None or not times:
+        return
+    slot = slot_length()
+    event_ids = set()
+    for time_and_date in times:
+        event_ids |= set(
+            Event.objects
+            .filter(start_time_and_date__lt=time_and_date + slot, end_time__gt=time_and_date - slot)
+            .values_list('pk', flat=True)
+        )
+    for event_id in event_ids:
+        grid = cache.get(grid_key(event_id))
+        if grid is None or not grid['slots']:
+            continue #not cached, it will be built fresh when somebody asks
+        slots = grid['slots']
+        reservation_times = list(
+            Reservation.objects
+            .filter(professional_id=professional_id, time_and_date__gt=slots[0] - slot, time_and_date__lt=slots[-1] + slot)
+            .values_list('time_and_date', flat=True)
+        )
+        cache.set(busy_key(event_id, professional_id), busy_slots_for(slots, reservation_times), GRID_TIMEOUT)
+
+
+def forget_event(event_id):
+    cache.delete(grid_key(event_id))
+
+
+def forget_skills():
+    cache.delete(SKILLS_KEY)
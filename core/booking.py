@@ -0,0 +1,123 @@
+import random
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from django.conf import settings
+from django.core import checks
+from django.db.models import Count, Exists, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from .models import ServiceProfessional, Reservation
+
+#logic for picking a professional for a reservation lives here so the views stay small
+
+
+def slot_length():
+    return timedelta(minutes=settings.APPOINTMENT_SLOT_MINUTES)
+
+
+def overlapping_reservations(time_and_date, exclude_pk=None):
+    #every reservation whose slot overlaps a slot starting at time_and_date.
+    #two slots of the same length overlap when their starts are less than one slot apart
+    slot = slot_length()
+    qs = Reservation.objects.filter(
+        time_and_date__gt=time_and_date - slot,
+        time_and_date__lt=time_and_date + slot,
+    )
+    if exclude_pk is not None:
+        qs = qs.exclude(pk=exclude_pk) #so editing a reservation doesn't conflict with itself
+    return qs
+
+
+def is_professional_free(professional, time_and_date, exclude_pk=None):
+    return not overlapping_reservations(time_and_date, exclude_pk).filter(professional=professional).exists()
+
+
+def qualified_professionals(services):
+    #returns every professional that offers ALL of the given services, in one query
+    #we filter the through table by the selected services and then count how many of them each pro matched.
+    #if the count equals how many services were picked, that pro can do everything
+    service_ids = [service.pk for service in services]
+    if not service_ids:
+        return ServiceProfessional.objects.all()
+
+    return (
+        ServiceProfessional.objects
+        .filter(services__in=service_ids)
+        .annotate(matched_services=Count('services', filter=Q(services__in=service_ids), distinct=True))
+        .filter(matched_services=len(set(service_ids)))
+    )
+
+
+def free_professionals(services, time_and_date):
+    #qualified pros that have no reservation overlapping the slot, still one query (the busy check is a subquery on the pro+time index)
+    busy = overlapping_reservations(time_and_date).filter(professional=OuterRef('pk'))
+    return qualified_professionals(services).filter(~Exists(busy))
+
+
+class AssignmentStrategy(ABC):
+    #decides which free pro gets a booking: order() gets the queryset of free qualified pros and returns their pks,
+    #best first. reserve_professional tries them in that order. pick one with settings.APPOINTMENT_ASSIGNMENT
+    def __init__(self, rng=random):
+        self.rng = rng #the simulate_assignment command passes a seeded one
+
+    @abstractmethod
+    def order(self, candidates, time_and_date, event=None):
+        ...
+
+
+class RandomStrategy(AssignmentStrategy):
+    #every free pro has the same chance, no matter how busy they already are
+    def order(self, candidates, time_and_date, event=None):
+        pks = list(candidates.values_list('pk', flat=True))
+        self.rng.shuffle(pks)
+        return pks
+
+
+class LeastLoadedStrategy(AssignmentStrategy):
+    #the pro with the fewest reservations at this event (or within WINDOW of the time when there's no event) goes
+    #first, ties are broken at random. the counts come with the candidates in the same query, as a subquery per pro
+    WINDOW = timedelta(hours=4)
+
+    def order(self, candidates, time_and_date, event=None):
+        if event is not None:
+            counted = Reservation.objects.filter(event=event) #uses the event+time index
+        else:
+            counted = Reservation.objects.filter(time_and_date__gt=time_and_date - self.WINDOW, time_and_date__lt=time_and_date + self.WINDOW)
+        load = counted.filter(professional=OuterRef('pk')).order_by().values('professional').annotate(count=Count('pk')).values('count')
+        rows = list(candidates.annotate(load=Coalesce(Subquery(load, output_field=IntegerField()), Value(0))).values_list('pk', 'load'))
+        self.rng.shuffle(rows)
+        rows.sort(key=lambda row: row[1]) #stable, so equally loaded pros stay shuffled
+        return [pk for pk, _ in rows]
+
+
+STRATEGIES = {
+    'random': RandomStrategy,
+    'least_loaded': LeastLoadedStrategy,
+}
+
+
+def get_strategy():
+    return STRATEGIES[settings.APPOINTMENT_ASSIGNMENT]()
+
+
+def check_assignment_setting(app_configs, **kwargs):
+    #system check (registered in apps.py) so a typo in APPOINTMENT_ASSIGNMENT stops runserver/migrate/check
+    #instead of turning the first booking into a KeyError
+    if settings.APPOINTMENT_ASSIGNMENT in STRATEGIES:
+        return []
+    return [checks.Error(
+        f"APPOINTMENT_ASSIGNMENT is {settings.APPOINTMENT_ASSIGNMENT!r}.",
+        hint=f"Use one of: {', '.join(STRATEGIES)}.",
+        id='core.E001',
+    )]
+
+
+def reserve_professional(services, time_and_date, event=None, strategy=None):
+    #picks a free qualified pro (in the strategy's order) and locks their row. MUST be called inside transaction.atomic()
+    #and the reservation has to be saved before that block ends, otherwise the lock does nothing.
+    #another booking for the same pro waits on the lock, then sees our reservation when it re-checks.
+    strategy = strategy or get_strategy()
+    for pk in strategy.order(free_professionals(services, time_and_date), time_and_date, event):
+        professional = ServiceProfessional.objects.select_for_update().get(pk=pk)
+        if is_professional_free(professional, time_and_date): #someone may have booked them before we got the lock
+            return professional
+    return None
@@ -0,0 +1,137 @@
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+
+#caching for the public, read-mostly pages (home, services, professionals, event detail).
+#every cache key has a "content version" in it. saving/deleting an event, service or professional bumps the version
+#(see core/signals.py) so all the old entries just stop being used, nothing has to be deleted one by one.
+#reviews have a version of their own: they're posted far more often than the rest changes, and only the pages with
+#review totals on them (views with shows_reviews) and the reviews API have to move when one is.
+#
+#logged out visitors get the whole page from the cache. logged in users get a page with their own nav and csrf token,
+#only the slow lists inside it are cached ({% cache %} fragments keyed on content_version and is_superuser).
+
+VERSION_KEY = "public_pages:version"
+REVIEWS_VERSION_KEY = "public_pages:reviews_version"
+HITS_KEY = "public_pages:hits"
+MISSES_KEY = "public_pages:misses"
+
+
+def get_content_version(key=VERSION_KEY):
+    #start from the clock so a version that fell out of the cache can never match old entries again
+    return cache.get_or_set(key, lambda: int(time.time()), None)
+
+
+async def aget_content_version(key=VERSION_KEY):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, int(time.time()), None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_content_version(key=VERSION_KEY):
+    try:
+        cache.incr(key)
+    except ValueError: #key was evicted
+        cache.set(key, int(time.time()), None)
+
+
+def get_reviews_version():
+    return get_content_version(REVIEWS_VERSION_KEY)
+
+
+def bump_reviews_version():
+    bump_content_version(REVIEWS_VERSION_KEY)
+
+
+def count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+async def acount(key):
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, None)
+        await cache.aincr(key)
+
+
+def cache_stats():
+    return {
+        'version': get_content_version(),
+        'hits': cache.get(HITS_KEY, 0),
+        'misses': cache.get(MISSES_KEY, 0),
+    }
+
+
+def save_page(key, response):
+    if response.status_code == 200:
+        timeout = settings.PUBLIC_PAGE_CACHE_SECONDS
+        if hasattr(response, 'render') and callable(response.render):
+            response.add_post_render_callback(lambda r: cache.set(key, r, timeout)) #template responses render later
+        else:
+            cache.set(key, response, timeout)
+    return response
+
+
+class PublicPageCacheMixin:
+    #put this first in the bases of a public view. works for both normal and async views
+    shows_reviews = False #review totals on the page, so it changes with the reviews version too
+    cache_params = () #the query parameters the view reads, anything else in the url doesn't get its own cache entry
+
+    def page_key(self, request, version):
+        #/?x=1, /?x=2... are the same page, so they're the same entry and nobody can fill the cache with them
+        params = urlencode(sorted((name, request.GET[name]) for name in self.cache_params if name in request.GET))
+        return f"public_pages:page:{version}:{request.path}?{params}"
+
+    def page_version(self):
+        if self.shows_reviews:
+            return f"{get_content_version()}.{get_reviews_version()}"
+        return get_content_version()
+
+    async def apage_version(self):
+        if self.shows_reviews:
+            return f"{await aget_content_version()}.{await aget_content_version(REVIEWS_VERSION_KEY)}"
+        return await aget_content_version()
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self.async_dispatch(request, *args, **kwargs)
+        if request.method != 'GET' or request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+
+        key = self.page_key(request, self.page_version())
+        response = cache.get(key)
+        if response is not None:
+            count(HITS_KEY)
+            return response
+
+        count(MISSES_KEY)
+        return save_page(key, super().dispatch(request, *args, **kwargs))
+
+    async def async_dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser() #request.user would hit the database synchronously
+        if request.method != 'GET' or request.user.is_authenticated:
+            return await super().dispatch(request, *args, **kwargs)
+
+        key = self.page_key(request, await self.apage_version())
+        response = await cache.aget(key)
+        if response is not None:
+            await acount(HITS_KEY)
+            return response
+
+        await acount(MISSES_KEY)
+        return save_page(key, await super().dispatch(request, *args, **kwargs))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['content_version'] = get_content_version() #for the {% cache %} fragments
+        if self.shows_reviews:
+            context['reviews_version'] = get_reviews_version()
+        return context
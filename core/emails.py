@@ -0,0 +1,101 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from .models import OutgoingEmail
+
+#emails are never sent inside a request. views call queue_*, and the send_queued_emails command does the sending.
+#https://docs.djangoproject.com/en/5.2/topics/email/
+
+CLAIM_TIMEOUT = timedelta(minutes=5) #if a worker dies mid batch, its emails become due again after this
+
+
+def queue_email(to_email, subject, message):
+    return OutgoingEmail.objects.create(to_email=to_email, subject=subject, message=message)
+
+
+def queue_appointment_email(appointment, subject="Your Appointment Confirmation", intro="Your appointment has been confirmed with the following details:"):
+
+    service_names = []
+    for service in appointment.services.all():
+        service_names.append(service.name)
+    services_string = "Services: " + ", ".join(service_names)
+
+    message = (
+        f"Hello {appointment.user.username},\n\n"
+        f"{intro}\n\n"
+        f"Event: {appointment.event.name}\n"
+        f"Date: {appointment.time_and_date}\n"
+        f"Services: {services_string}\n"
+        f"Assigned Professional: {appointment.professional.name if appointment.professional else 'TBD'}\n\n"
+        f"Thank you for choosing our services!\n"
+        f"- Cosmetology Team"
+    )
+
+    return queue_email(appointment.user.email, subject, message)
+
+
+def retry_delay(attempts):
+    #exponential backoff: 1 min, 2 min, 4 min... capped so a long outage doesn't push emails out for days
+    delay = settings.EMAIL_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+    return timedelta(seconds=min(delay, settings.EMAIL_RETRY_MAX_SECONDS))
+
+
+def claim_batch(batch_size):
+    #marks a batch as taken by pushing next_attempt_at forward, so two workers never send the same email.
+    #skip_locked lets a second worker grab different rows on postgres instead of waiting (sqlite ignores it)
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutgoingEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=OutgoingEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        OutgoingEmail.objects.filter(pk__in=ids).update(next_attempt_at=now + CLAIM_TIMEOUT)
+    return list(OutgoingEmail.objects.filter(pk__in=ids).order_by('pk'))
+
+
+def record_failure(email, error):
+    email.attempts += 1
+    email.last_error = repr(error)
+    if email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+        email.status = OutgoingEmail.FAILED
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+
+
+def send_queued_emails(batch_size=50):
+    #sends one batch over a single smtp connection and returns (sent, failed) counts
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    sent = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e: #could not even connect, every email in the batch counts as a failed attempt
+        for email in batch:
+            record_failure(email, e)
+    else:
+        for email in batch:
+            try:
+                EmailMessage(
+                    email.subject, email.message, settings.DEFAULT_FROM_EMAIL, [email.to_email],
+                    connection=connection,
+                ).send()
+            except Exception as e: #smtp errors come in lots of types, we treat them all as "try again later"
+                record_failure(email, e)
+            else:
+                sent += 1
+                email.attempts += 1
+                email.status = OutgoingEmail.SENT
+                email.sent_at = timezone.now()
+                email.last_error = ''
+        connection.close()
+
+    OutgoingEmail.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    return sent, len(batch) - sent
@@ -0,0 +1,42 @@
+import csv
+from django.utils import timezone
+
+#streaming CSV: csv.writer wants a file, so we give it one that just hands back each line for the response to send.
+#https://docs.djangoproject.com/en/5.2/howto/outputting-csv/#streaming-large-csv-files
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+#a cell starting with one of these is run as a formula by Excel/Sheets, and usernames and names are typed in by users.
+#a leading ' makes it plain text (https://owasp.org/www-community/attacks/CSV_Injection)
+FORMULA_STARTS = ('=', '+', '-', '@', '\t', '\r')
+
+
+def cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_STARTS):
+        return "'" + value
+    return value
+
+
+def csv_rows(header, rows):
+    writer = csv.writer(Echo())
+    yield '\ufeff' #byte order mark so Excel opens the file as UTF-8 instead of mangling names with accents
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([cell(value) for value in row])
+
+
+def appointment_row(reservation):
+    return [
+        reservation.pk,
+        timezone.localtime(reservation.time_and_date).strftime('%Y-%m-%d %H:%M'),
+        reservation.event.name,
+        reservation.event.event_location,
+        reservation.user.username,
+        reservation.user.email,
+        reservation.professional.name if reservation.professional else '',
+        ", ".join(service.name for service in reservation.services.all()),
+    ]
@@ -0,0 +1,180 @@
+import hashlib
+import json
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.core.exceptions import BadRequest
+from django.db.models import Count, Max
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .booking import slot_length
+from .caching import get_content_version
+from .models import Event, Reservation
+
+#calendar feeds (JSON for our front end, .ics for google calendar/outlook/apple calendar).
+#everything is generated row by row from .iterator() so big ranges never sit in memory all at once,
+#and every feed has an ETag so pollers get a cheap 304 when nothing changed.
+
+DEFAULT_RANGE = timedelta(days=90)
+MAX_RANGE = timedelta(days=366)
+CHUNK_SIZE = 500
+
+
+def parse_bound(value):
+    #accepts 2026-05-01 or a full datetime
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise BadRequest(f"Invalid date: {value!r}")
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def date_range(request):
+    #?start=&end= from the url, defaults to the next 90 days from today
+    try:
+        start = parse_bound(request.GET['start']) if request.GET.get('start') else timezone.make_aware(
+            datetime.combine(timezone.localdate(), time.min))
+        end = parse_bound(request.GET['end']) if request.GET.get('end') else start + DEFAULT_RANGE
+    except ValueError: #parse_datetime raises this for things like month 13
+        raise BadRequest("Invalid date.")
+    if end <= start:
+        raise BadRequest("end must be after start.")
+    if end - start > MAX_RANGE:
+        raise BadRequest("Date range can be at most a year.")
+    return start, end
+
+
+def events_in_range(start, end):
+    #events that overlap the range at all (uses the start/end index)
+    return Event.objects.filter(start_time_and_date__lt=end, end_time__gt=start)
+
+
+def reservations_in_range(user, start, end):
+    return Reservation.objects.filter(user=user, time_and_date__gte=start - slot_length(), time_and_date__lt=end)
+
+
+def feed_state(queryset):
+    #one aggregate query for the ETag. the count changes when something is deleted,
+    #max(updated_at) when something is added or edited
+    state = queryset.order_by().aggregate(count=Count('pk'), last_modified=Max('updated_at'))
+    return state['count'], state['last_modified']
+
+
+def feed_etag(kind, start, end, count, last_modified):
+    #the rows also carry service, event and pro names, which change without touching the rows' updated_at.
+    #editing any of those bumps the content version (caching.py), so it goes in too
+    raw = (
+        f"{kind}|{start.isoformat()}|{end.isoformat()}|{count}|{last_modified.isoformat() if last_modified else ''}"
+        f"|{get_content_version()}"
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def event_json(event, request):
+    return {
+        'id': event.pk,
+        'name': event.name,
+        'description': event.description,
+        'location': event.event_location,
+        'start': event.start_time_and_date.isoformat(),
+        'end': event.end_time.isoformat(),
+        'services': [service.name for service in event.services.all()],
+        'url': request.build_absolute_uri(reverse('Cosmetology:event_detail', kwargs={'pk': event.pk})),
+    }
+
+
+def reservation_json(reservation, request):
+    return {
+        'id': reservation.pk,
+        'event': reservation.event.name,
+        'location': reservation.event.event_location,
+        'start': reservation.time_and_date.isoformat(),
+        'end': (reservation.time_and_date + slot_length()).isoformat(),
+        'professional': reservation.professional.name if reservation.professional else None,
+        'services': [service.name for service in reservation.services.all()],
+    }
+
+
+def stream_json(rows, to_json, request):
+    #writes a JSON list one item at a time
+    yield '['
+    first = True
+    for row in rows:
+        if not first:
+            yield ','
+        first = False
+        yield json.dumps(to_json(row, request))
+    yield ']'
+
+
+#iCalendar (RFC 5545) bits
+def ics_text(value):
+    return (
+        str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def ics_time(moment):
+    return moment.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def ics_line(line):
+    #lines longer than 75 bytes have to be folded onto continuation lines that start with a space
+    data = line.encode()
+    parts = []
+    while len(data) > 75:
+        cut = 75 if not parts else 74
+        while cut > 0 and (data[cut] & 0xC0) == 0x80: #don't split a multi-byte character
+            cut -= 1
+        parts.append(data[:cut].decode())
+        data = data[cut:]
+    parts.append(data.decode())
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def stream_ics(rows, to_vevent, request, name):
+    yield ics_line('BEGIN:VCALENDAR')
+    yield ics_line('VERSION:2.0')
+    yield ics_line('PRODID:-//ACC Cosmetology//Calendar//EN')
+    yield ics_line(f'X-WR-CALNAME:{ics_text(name)}')
+    now = ics_time(timezone.now())
+    for row in rows:
+        yield ics_line('BEGIN:VEVENT')
+        for field, value in to_vevent(row, request):
+            yield ics_line(f'{field}:{value}')
+        yield ics_line(f'DTSTAMP:{now}')
+        yield ics_line('END:VEVENT')
+    yield ics_line('END:VCALENDAR')
+
+
+def event_vevent(event, request):
+    host = request.get_host()
+    services = ", ".join(service.name for service in event.services.all())
+    return [
+        ('UID', f'event-{event.pk}@{host}'),
+        ('DTSTART', ics_time(event.start_time_and_date)),
+        ('DTEND', ics_time(event.end_time)),
+        ('LAST-MODIFIED', ics_time(event.updated_at)),
+        ('SUMMARY', ics_text(event.name)),
+        ('DESCRIPTION', ics_text(f"{event.description}\nServices: {services}")),
+        ('LOCATION', ics_text(event.event_location)),
+        ('URL', request.build_absolute_uri(reverse('Cosmetology:event_detail', kwargs={'pk': event.pk}))),
+    ]
+
+
+def reservation_vevent(reservation, request):
+    host = request.get_host()
+    services = ", ".join(service.name for service in reservation.services.all())
+    professional = reservation.professional.name if reservation.professional else 'TBD'
+    return [
+        ('UID', f'reservation-{reservation.pk}@{host}'),
+        ('DTSTART', ics_time(reservation.time_and_date)),
+        ('DTEND', ics_time(reservation.time_and_date + slot_length())),
+        ('LAST-MODIFIED', ics_time(reservation.updated_at)),
+        ('SUMMARY', ics_text(f"Cosmetology appointment: {services}")),
+        ('DESCRIPTION', ics_text(f"Event: {reservation.event.name}\nProfessional: {professional}")),
+        ('LOCATION', ics_text(reservation.event.event_location)),
+    ]
@@ -1,5 +1,7 @@
+from datetime import datetime, time, timedelta
 from django import forms
-from .models import Event, Reservation, Review, Service
+from django.utils import timezone
+from .models import Event, Reservation, Review, Service, ServiceProfessional
 
 class EventForm(forms.ModelForm):
     class Meta:
@@ -59,4 +61,46 @@ class ReviewForm(forms.ModelForm):
         labels = {
             'event': 'Event (optional)',
             'services': 'Services (optional)',
-        }
\ No newline at end of file
+        }
+
+class AppointmentFilterForm(forms.Form):
+    #GET form for the admin appointments page, every field is optional
+    event = forms.ModelChoiceField(queryset=Event.objects.all(), required=False)
+    professional = forms.ModelChoiceField(queryset=ServiceProfessional.objects.all(), required=False)
+    service = forms.ModelChoiceField(queryset=Service.objects.all(), required=False)
+    start_date = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}), label='From')
+    end_date = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}), label='To')
+
+    def filter(self, qs):
+        #applies whatever filters were filled in to a Reservation queryset. nothing filled in is everything,
+        #something that doesn't parse (a date like 2026-13-01) is nothing, the page shows the form errors instead
+        if not self.is_bound:
+            return qs
+        if not self.is_valid():
+            return qs.none()
+        filters = self.cleaned_data
+        if filters['event']:
+            qs = qs.filter(event=filters['event'])
+        if filters['professional']:
+            qs = qs.filter(professional=filters['professional'])
+        if filters['service']:
+            qs = qs.filter(services=filters['service'])
+        #compare against real datetimes instead of __date so the time index can be used
+        if filters['start_date']:
+            qs = qs.filter(time_and_date__gte=timezone.make_aware(datetime.combine(filters['start_date'], time.min)))
+        if filters['end_date']:
+            qs = qs.filter(time_and_date__lt=timezone.make_aware(datetime.combine(filters['end_date'] + timedelta(days=1), time.min)))
+        return qs
+
+class ImportScheduleForm(forms.Form):
+    #admin upload for core/imports.py
+    KIND_CHOICES = [
+        ('', 'Guess from the file'),
+        ('events_csv', 'Events (CSV)'),
+        ('events_ics', 'Events (ICS calendar)'),
+        ('professionals_csv', 'Professionals (CSV)'),
+    ]
+    file = forms.FileField()
+    kind = forms.ChoiceField(choices=KIND_CHOICES, required=False)
+    create_services = forms.BooleanField(required=False, label="Create services that don't exist yet")
+    dry_run = forms.BooleanField(required=False, label="Only check the file, don't save")
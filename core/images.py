@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+from functools import cache
+from io import BytesIO
+from django.core.files.base import ContentFile
+
+#smaller copies of the big static photos (the home page slideshow) in newer formats. they're made during
+#collectstatic by core.storage.ResponsiveStaticFilesStorage, before the files get hashed and compressed, and the
+#browser picks one through the srcset that {% responsive_image %} writes.
+#  images/im2.jpeg -> images/im2.480w.avif, images/im2.480w.webp, images/im2.480w.jpg, ... for every width
+#what got made is written to responsive-images.json in STATIC_ROOT, the template tag reads it from there.
+#without it (runserver before collectstatic, tests) the tag falls back to a plain lazy <img>.
+
+SOURCES = ['images/im1.jpg', 'images/im2.jpeg', 'images/img3.jpg']
+WIDTHS = [480, 800, 1200, 1600] #never bigger than the original, which is always offered too
+FORMATS = [
+    #(Pillow format, extension, mime type, save options), best first since the browser takes the first it supports
+    ('AVIF', 'avif', 'image/avif', {'quality': 50}),
+    ('WEBP', 'webp', 'image/webp', {'quality': 75, 'method': 6}),
+    ('JPEG', 'jpg', 'image/jpeg', {'quality': 80, 'optimize': True, 'progressive': True}),
+]
+MANIFEST = 'responsive-images.json'
+
+
+def variant_name(path, width, extension):
+    root, _ = os.path.splitext(path)
+    return f"{root}.{width}w.{extension}"
+
+
+def widths_for(original_width):
+    return [width for width in WIDTHS if width < original_width] + [original_width]
+
+
+def encode(image, width, pillow_format, options):
+    from PIL import Image
+
+    if width != image.width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+    out = BytesIO()
+    #exif and the rest of the metadata are left behind, the color profile is kept so colors don't shift
+    image.save(out, pillow_format, icc_profile=image.info.get('icc_profile'), **options)
+    return out.getvalue()
+
+
+def make_variants(data, path):
+    #(entry for the manifest, {variant name: bytes}) for one source image
+    from PIL import Image, ImageOps
+
+    image = Image.open(BytesIO(data))
+    image = ImageOps.exif_transpose(image) #phones save photos sideways and set a flag
+    icc_profile = image.info.get('icc_profile')
+    if image.mode != 'RGB':
+        image = image.convert('RGB') #the sources are photos, the last format (jpeg) is the fallback for everyone
+    image.info['icc_profile'] = icc_profile
+
+    entry = {'hash': hashlib.md5(data).hexdigest(), 'width': image.width, 'height': image.height, 'sources': []}
+    files = {}
+    for pillow_format, extension, mime_type, options in FORMATS:
+        srcset = []
+        for width in widths_for(image.width):
+            name = variant_name(path, width, extension)
+            files[name] = encode(image, width, pillow_format, options)
+            srcset.append([name, width])
+        entry['sources'].append({'type': mime_type, 'srcset': srcset})
+    return entry, files
+
+
+def build(storage, paths):
+    #called from the storage's post_process. paths is collectstatic's {name: (source storage, name)}.
+    #writes the variants into storage and returns them in the same shape so they get hashed and compressed too
+    previous = read_manifest(storage)
+    manifest, made = {}, {}
+    for path in SOURCES:
+        if path not in paths:
+            continue
+        source_storage, source_path = paths[path]
+        with source_storage.open(source_path) as source:
+            data = source.read()
+        entry = previous.get(path)
+        names = [name for group in (entry or {}).get('sources', []) for name, _ in group['srcset']]
+        if entry is None or entry['hash'] != hashlib.md5(data).hexdigest() or not all(storage.exists(name) for name in names):
+            entry, files = make_variants(data, path)
+            for name, content in files.items():
+                replace(storage, name, content)
+        manifest[path] = entry
+        for group in entry['sources']:
+            for name, _ in group['srcset']:
+                made[name] = (storage, name)
+    replace(storage, MANIFEST, json.dumps(manifest, indent=1).encode())
+    read_manifest.cache_clear()
+    return made
+
+
+def replace(storage, name, content):
+    if storage.exists(name):
+        storage.delete(name) #save() would pick a new name instead of overwriting
+    storage.save(name, ContentFile(content))
+
+
+@cache
+def read_manifest(storage):
+    #{source path: {'width', 'height', 'hash', 'sources': [{'type', 'srcset': [[name, width]]}]}}
+    if not storage.exists(MANIFEST):
+        return {}
+    with storage.open(MANIFEST) as file:
+        return json.load(file)
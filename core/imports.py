@@ -0,0 +1,348 @@
+import csv
+import re
+from datetime import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Event, Reservation, Service, ServiceProfessional
+from . import availability
+from .caching import bump_content_version
+
+#bulk import of a semester's schedule (import_schedule command and the admin upload page).
+#  events CSV:         name,start,end,location,description,services
+#  professionals CSV:  name,services
+#  .ics:               one event per VEVENT (SUMMARY, DTSTART, DTEND, LOCATION, DESCRIPTION, CATEGORIES = services)
+#services are listed by name, separated by ";" in CSV. rows are read and checked one at a time, so a big file
+#never sits in memory, and a bad row is reported with its line number instead of stopping the import.
+#good rows are saved in batches, matched on (name, start) for events and name for professionals: existing ones are
+#updated, new ones created. the whole import is one transaction. an update that would leave bookings behind (an end
+#time before some reservation, or a service somebody booked taken off the event) is a row error and isn't saved.
+
+BATCH_SIZE = 500
+SERVICE_SEPARATOR = ';'
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.errors = [] #(line number, message)
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+
+class ServiceNames:
+    #service name -> Service, loaded once. unknown names are errors unless create is on
+    def __init__(self, create=False):
+        self.create = create
+        self.by_name = {service.name.lower(): service for service in Service.objects.all()}
+
+    def lookup(self, names):
+        services = []
+        for name in names:
+            name = name.strip()
+            if not name:
+                continue
+            service = self.by_name.get(name.lower())
+            if service is None:
+                if not self.create:
+                    raise ValidationError(f"Unknown service {name!r}.")
+                service = self.by_name[name.lower()] = Service.objects.create(name=name, service_description=name)
+            services.append(service)
+        return services
+
+
+def parse_when(value):
+    try:
+        moment = parse_datetime(value.strip()) if value else None
+    except ValueError: #right format, impossible date like month 13
+        moment = None
+    if moment is None:
+        raise ValidationError(f"Invalid date/time {value!r}, use something like 2026-05-01 09:00.")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def check_event(fields):
+    #same checks as the event form, minus the services
+    event = Event(**fields)
+    event.full_clean(exclude=['updated_at'])
+    if event.end_time <= event.start_time_and_date:
+        raise ValidationError("End has to be after start.")
+
+
+def messages(error):
+    if hasattr(error, 'message_dict'):
+        return "; ".join(f"{field}: {' '.join(errors)}" for field, errors in error.message_dict.items())
+    return " ".join(error.messages)
+
+
+#reading files, every reader yields (line number, (fields, services)) or (line number, ValidationError)
+
+def numbered_rows(lines):
+    #(line the row starts on, row). a quoted value can span lines, so count on from where the last row ended
+    reader = csv.DictReader(lines)
+    last_line = 1 #the header
+    for row in reader:
+        yield last_line + 1, row
+        last_line = reader.line_num
+
+
+def csv_events(lines, services):
+    for line, row in numbered_rows(lines):
+        try:
+            fields = {
+                'name': (row.get('name') or '').strip(),
+                'start_time_and_date': parse_when(row.get('start')),
+                'end_time': parse_when(row.get('end')),
+                'event_location': (row.get('location') or '').strip(),
+                'description': (row.get('description') or '').strip(),
+            }
+            check_event(fields)
+            yield line, (fields, services.lookup((row.get('services') or '').split(SERVICE_SEPARATOR)))
+        except ValidationError as error:
+            yield line, error
+
+
+def csv_professionals(lines, services):
+    for line, row in numbered_rows(lines):
+        try:
+            name = (row.get('name') or '').strip()
+            if not name:
+                raise ValidationError("Name is required.")
+            if len(name) > ServiceProfessional._meta.get_field('name').max_length:
+                raise ValidationError("Name is too long.")
+            yield line, ({'name': name}, services.lookup((row.get('services') or '').split(SERVICE_SEPARATOR)))
+        except ValidationError as error:
+            yield line, error
+
+
+def ics_unescape(value):
+    #\n is a new line, \, \; \\ are the characters themselves
+    return re.sub(r'\\(.)', lambda match: '\n' if match.group(1) in 'nN' else match.group(1), value)
+
+
+def ics_properties(lines):
+    #unfolds continuation lines and yields (line number, NAME, {params}, value)
+    pending, pending_line = None, 0
+    for number, raw in enumerate(lines, start=1):
+        raw = raw.rstrip('\r\n')
+        if raw[:1] in (' ', '\t') and pending is not None:
+            pending += raw[1:]
+            continue
+        if pending:
+            yield (pending_line, *ics_split(pending))
+        pending, pending_line = raw, number
+    if pending:
+        yield (pending_line, *ics_split(pending))
+
+
+def ics_split(line):
+    #NAME;PARAM=x;PARAM="y:z":value, the first colon outside quotes ends the name and params
+    quoted = False
+    for index, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ':' and not quoted:
+            head, value = line[:index], line[index + 1:]
+            break
+    else:
+        head, value = line, ''
+    name, *params = head.split(';')
+    return name.upper(), dict(param.split('=', 1) for param in params if '=' in param), value
+
+
+def ics_time(value, params):
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        raise ValidationError("All day events can't be imported, they need a start and end time.")
+    try:
+        moment = datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    except ValueError:
+        raise ValidationError(f"Invalid date/time {value!r}.")
+    if value.endswith('Z'):
+        return moment.replace(tzinfo=ZoneInfo('UTC'))
+    try:
+        zone = ZoneInfo(params['TZID'].strip('"')) if 'TZID' in params else None
+    except ZoneInfoNotFoundError:
+        raise ValidationError(f"Unknown time zone {params['TZID']!r}.")
+    return timezone.make_aware(moment, zone)
+
+
+def ics_vevents(lines):
+    #(line of BEGIN:VEVENT, {property: (value, params)}) for every event in the file
+    current = None
+    for line, name, params, value in ics_properties(lines):
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            current = {'_line': line}
+        elif name == 'END' and value.upper() == 'VEVENT' and current is not None:
+            yield current.pop('_line'), current
+            current = None
+        elif current is not None and name in ('SUMMARY', 'DTSTART', 'DTEND', 'LOCATION', 'DESCRIPTION', 'CATEGORIES'):
+            current[name] = (value, params)
+
+
+def ics_text(properties, key):
+    return ics_unescape(properties.get(key, ('', {}))[0]).strip()
+
+
+def ics_events(lines, services):
+    for line, properties in ics_vevents(lines):
+        try:
+            if 'DTSTART' not in properties or 'DTEND' not in properties:
+                raise ValidationError("DTSTART and DTEND are required.")
+            fields = {
+                'name': ics_text(properties, 'SUMMARY'),
+                'start_time_and_date': ics_time(*properties['DTSTART']),
+                'end_time': ics_time(*properties['DTEND']),
+                'event_location': ics_text(properties, 'LOCATION'),
+                'description': ics_text(properties, 'DESCRIPTION'),
+            }
+            check_event(fields)
+            categories = properties.get('CATEGORIES', ('', {}))[0]
+            yield line, (fields, services.lookup(ics_unescape(name) for name in split_categories(categories)))
+        except ValidationError as error:
+            yield line, error
+
+
+def split_categories(value):
+    #CATEGORIES:Haircut,Nail art\, gel  (an escaped comma stays in the name)
+    names, current, escaped = [], '', False
+    for char in value:
+        if escaped:
+            current += '\\' + char
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == ',':
+            names.append(current)
+            current = ''
+        else:
+            current += char
+    names.append(current)
+    return names
+
+
+READERS = {
+    'events_csv': csv_events,
+    'professionals_csv': csv_professionals,
+    'events_ics': ics_events,
+}
+
+
+#saving
+
+def save_events(batch, result):
+    #batch: {(name, start): (line, fields, services)}
+    existing = {}
+    names = {key[0] for key in batch}
+    starts = {key[1] for key in batch}
+    for event in Event.objects.filter(name__in=names, start_time_and_date__in=starts).order_by('-pk'):
+        existing[(event.name, event.start_time_and_date)] = event #oldest one wins if there are duplicates
+
+    #what the existing events already have booked: the latest reservation and every service in use
+    event_ids = [event.pk for event in existing.values()]
+    last_booked = dict(Reservation.objects.filter(event__in=event_ids).values('event').annotate(last=Max('time_and_date')).values_list('event', 'last'))
+    booked_services = {}
+    for event_id, service_id in Reservation.services.through.objects.filter(reservation__event__in=event_ids).values_list('reservation__event', 'service').distinct():
+        booked_services.setdefault(event_id, set()).add(service_id)
+
+    now = timezone.now()
+    to_create, to_update = [], []
+    for key, (line, fields, services) in list(batch.items()):
+        event = existing.get(key)
+        if event is None:
+            to_create.append(Event(**fields))
+        else:
+            last = last_booked.get(event.pk)
+            dropped = booked_services.get(event.pk, set()) - {service.pk for service in services}
+            if last is not None and last > fields['end_time']:
+                result.error(line, f"{event.name} has reservations until {timezone.localtime(last):%Y-%m-%d %H:%M}, after the new end time.")
+                del batch[key]
+                continue
+            if dropped:
+                dropped = ', '.join(sorted(service.name for service in Service.objects.filter(pk__in=dropped)))
+                result.error(line, f"{event.name} has reservations for {dropped}, which the row takes off the event.")
+                del batch[key]
+                continue
+            for name, value in fields.items():
+                setattr(event, name, value)
+            event.updated_at = now #bulk_update skips auto_now
+            to_update.append(event)
+    Event.objects.bulk_create(to_create)
+    Event.objects.bulk_update(to_update, ['description', 'event_location', 'end_time', 'updated_at'])
+    result.created += len(to_create)
+    result.updated += len(to_update)
+
+    saved = {(event.name, event.start_time_and_date): event for event in to_create + to_update}
+    Through = Event.services.through
+    Through.objects.filter(event__in=[event.pk for event in saved.values()]).delete() #the file's list replaces the old one
+    Through.objects.bulk_create([
+        Through(event_id=saved[key].pk, service_id=service.pk) for key, (_, _, services) in batch.items() for service in services
+    ], ignore_conflicts=True)
+    return [event.pk for event in saved.values()]
+
+
+def save_professionals(batch, result):
+    #batch: {name: (line, fields, services)}
+    existing = {}
+    for pro in ServiceProfessional.objects.filter(name__in=list(batch)).order_by('-pk'):
+        existing[pro.name] = pro
+    to_create = [ServiceProfessional(**fields) for name, (_, fields, _) in batch.items() if name not in existing]
+    ServiceProfessional.objects.bulk_create(to_create)
+    result.created += len(to_create)
+    result.updated += len(batch) - len(to_create)
+
+    saved = {**existing, **{pro.name: pro for pro in to_create}}
+    Through = ServiceProfessional.services.through
+    Through.objects.filter(serviceprofessional__in=[pro.pk for pro in saved.values()]).delete()
+    Through.objects.bulk_create([
+        Through(serviceprofessional_id=saved[name].pk, service_id=service.pk) for name, (_, _, services) in batch.items() for service in services
+    ], ignore_conflicts=True)
+    return []
+
+
+def detect_kind(filename, first_line):
+    if filename.lower().endswith('.ics') or first_line.startswith('BEGIN:VCALENDAR'):
+        return 'events_ics'
+    header = [column.strip().lower() for column in first_line.lstrip('\ufeff').split(',')]
+    return 'events_csv' if 'start' in header else 'professionals_csv'
+
+
+def import_schedule(lines, kind, create_services=False, dry_run=False, batch_size=BATCH_SIZE):
+    #lines: any iterable of text lines (an open file, an uploaded file wrapped in TextIOWrapper)
+    result = ImportResult()
+    is_events = kind.startswith('events')
+    save = save_events if is_events else save_professionals
+    touched_events = []
+
+    with transaction.atomic():
+        services = ServiceNames(create=create_services)
+        batch = {}
+        for line, row in READERS[kind](lines, services):
+            if isinstance(row, ValidationError):
+                result.error(line, messages(row))
+                continue
+            fields, row_services = row
+            key = (fields['name'], fields['start_time_and_date']) if is_events else fields['name']
+            batch[key] = (line, fields, row_services) #a later row for the same event/pro wins
+            if len(batch) >= batch_size:
+                touched_events += save(batch, result)
+                batch = {}
+        if batch:
+            touched_events += save(batch, result)
+        result.errors.sort() #rows refused while saving are reported after the batch was read
+
+        if dry_run:
+            transaction.set_rollback(True)
+        else:
+            #bulk saves don't send the signals that keep the caches in sync (see signals.py)
+            transaction.on_commit(bump_content_version)
+            transaction.on_commit(availability.forget_skills)
+            for event_id in touched_events:
+                transaction.on_commit(lambda event_id=event_id: availability.forget_event(event_id))
+    return result
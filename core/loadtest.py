@@ -0,0 +1,162 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+
+#helpers for the load testing commands (compare_servers, load_test). they start a real gunicorn on the same database
+#the management command uses and hit it over http from a pool of threads.
+
+SERVERS = {
+    'sync': ["cosmetology.wsgi"],
+    'async': ["-k", "uvicorn_worker.UvicornWorker", "cosmetology.asgi:application"],
+}
+
+
+def login_session(user):
+    #a logged in session made straight in the database, so load tests don't go through the login form
+    #(and its rate limit) for every simulated user
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return {settings.SESSION_COOKIE_NAME: session.session_key}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(timings, errors, elapsed):
+    #timings in seconds, results in ms
+    done = len(timings)
+    return {
+        'requests': done + errors,
+        'errors': errors,
+        'rps': round(done / elapsed, 1) if elapsed else 0,
+        'p50_ms': round(percentile(timings, 50) * 1000, 1) if timings else None,
+        'p95_ms': round(percentile(timings, 95) * 1000, 1) if timings else None,
+        'p99_ms': round(percentile(timings, 99) * 1000, 1) if timings else None,
+    }
+
+
+class Recorder:
+    #collects timings by endpoint name from many threads
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.errors = {}
+        self.started = time.perf_counter()
+
+    def record(self, name, seconds, ok):
+        with self.lock:
+            self.timings.setdefault(name, [])
+            self.errors.setdefault(name, 0)
+            if ok:
+                self.timings[name].append(seconds)
+            else:
+                self.errors[name] += 1
+
+    def results(self):
+        elapsed = time.perf_counter() - self.started
+        with self.lock:
+            return {name: summarize(self.timings[name], self.errors[name], elapsed) for name in sorted(self.timings)}
+
+
+class Browser:
+    #one simulated visitor: keeps its cookies and sends the csrf token back like a browser form would
+    def __init__(self, base_url, recorder):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.http = requests.Session()
+
+    def request(self, name, method, path, expect=(200,), data=None):
+        headers = {}
+        if method == 'POST':
+            headers['X-CSRFToken'] = self.http.cookies.get(settings.CSRF_COOKIE_NAME, '')
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, data=data, headers=headers, allow_redirects=False, timeout=30)
+        except requests.RequestException:
+            self.recorder.record(name, time.perf_counter() - start, False)
+            return None
+        ok = response.status_code in expect
+        self.recorder.record(name, time.perf_counter() - start, ok)
+        return response if ok else None
+
+    def get(self, name, path, expect=(200,)):
+        return self.request(name, 'GET', path, expect)
+
+    def post(self, name, path, data, expect=(302,)):
+        return self.request(name, 'POST', path, expect, data)
+
+
+def hammer(url, total, concurrency, cookies=None):
+    #sends `total` GETs to url from `concurrency` threads, each with its own keep-alive connection
+    local = threading.local()
+    timings = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def one(_):
+        if not hasattr(local, 'http'):
+            local.http = requests.Session()
+            local.http.cookies.update(cookies or {})
+        start = time.perf_counter()
+        try:
+            ok = local.http.get(url, allow_redirects=False, timeout=30).status_code == 200
+        except requests.RequestException:
+            ok = False
+        took = time.perf_counter() - start
+        with lock:
+            if ok:
+                timings.append(took)
+            else:
+                errors[0] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(total)))
+    return summarize(timings, errors[0], time.perf_counter() - start)
+
+
+class Server:
+    #runs gunicorn in the background for as long as the with block
+    def __init__(self, kind, port, workers):
+        self.env = {**os.environ, 'LOAD_TEST': '1'} #see LOAD_TEST in settings.py
+        self.command = [sys.executable, "-m", "gunicorn", "-b", f"127.0.0.1:{port}", "-w", str(workers), *SERVERS[kind]]
+        self.port = port
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, cwd=Path(settings.BASE_DIR), env=self.env,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited early: {' '.join(self.command)}")
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.process.kill()
+        raise RuntimeError("Server did not start within 30 seconds.")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(10)
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.port}{path}"
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.archive import BATCH_SIZE, KEEP_DAYS, archive_events
+
+
+class Command(BaseCommand):
+    help = "Move events that ended a while ago, and their reservations, into the archive tables (run it nightly from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-days", type=int, default=KEEP_DAYS, help="Days after an event ends before it gets archived")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Events per transaction")
+
+    def handle(self, *args, **options):
+        events, reservations = archive_events(keep_days=options["keep_days"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {events} events and {reservations} reservations."))
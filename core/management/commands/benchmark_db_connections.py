@@ -0,0 +1,68 @@
+import copy
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.utils import ConnectionHandler
+
+#shows what connection reuse saves per request on postgres. every simulated request does what django does around
+#a real one: close_if_unusable_or_obsolete() when it starts and finishes (request_started/request_finished signals)
+#with a small query in between. run it from the web container so the network hop to postgres is the real one:
+#   docker compose exec web python manage.py benchmark_db_connections --requests 500
+#for the whole stack, run load_test with DB_POOL_MAX_SIZE=0 DB_CONN_MAX_AGE=0 and then with the defaults.
+
+MODES = {
+    'new connection per request': {'CONN_MAX_AGE': 0},
+    'persistent (CONN_MAX_AGE)': {'CONN_MAX_AGE': 600},
+    'psycopg pool': {'CONN_MAX_AGE': 0, 'pool': {'min_size': 1, 'max_size': 2}},
+}
+
+
+def mode_settings(overrides):
+    database = copy.deepcopy(settings.DATABASES['default'])
+    database['OPTIONS'] = {key: value for key, value in database.get('OPTIONS', {}).items() if key != 'pool'}
+    database.pop('DISABLE_SERVER_SIDE_CURSORS', None)
+    database['CONN_MAX_AGE'] = overrides['CONN_MAX_AGE']
+    if 'pool' in overrides:
+        database['OPTIONS']['pool'] = overrides['pool']
+    return database
+
+
+class Command(BaseCommand):
+    help = "Time requests with a new Postgres connection each time vs persistent connections vs the psycopg pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=300, help="Simulated requests per mode")
+        parser.add_argument("--query", default="SELECT 1", help="SQL each request runs")
+
+    def handle(self, *args, **options):
+        if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.postgresql':
+            raise CommandError("This compares postgres connection handling, run it with DJANGO_DB=postgres.")
+
+        results = {}
+        for number, (name, overrides) in enumerate(MODES.items()):
+            alias = f"benchmark_{number}" #the pool is kept per alias, so every mode gets its own
+            database = mode_settings(overrides)
+            connections = ConnectionHandler({'default': database, alias: database}) #django insists on a default
+            connection = connections[alias]
+            timings = []
+            try:
+                for _ in range(options["requests"]):
+                    start = time.perf_counter()
+                    connection.close_if_unusable_or_obsolete()
+                    with connection.cursor() as cursor:
+                        cursor.execute(options["query"])
+                        cursor.fetchall()
+                    connection.close_if_unusable_or_obsolete()
+                    timings.append((time.perf_counter() - start) * 1000)
+            finally:
+                connection.close()
+                if connection.pool:
+                    connection.close_pool()
+            timings.sort()
+            results[name] = (statistics.median(timings), timings[int(len(timings) * 0.95)])
+
+        baseline = results['new connection per request'][0]
+        for name, (median, p95) in results.items():
+            self.stdout.write(f"{name:<28} median {median:7.2f} ms  p95 {p95:7.2f} ms  saves {baseline - median:6.2f} ms/request")
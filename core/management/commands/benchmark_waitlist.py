@@ -0,0 +1,108 @@
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core import waitlist
+from core.booking import slot_length
+from core.loadtest import percentile
+from core.models import Event, Reservation, Service, ServiceProfessional, WaitlistEntry
+
+#how long filling a cancelled slot from the waitlist takes when an event has thousands of people waiting.
+#makes a fully booked event with --waiters people in line, cancels --cancellations random reservations and times
+#waitlist.promote() for each. everything is rolled back at the end:
+#   python manage.py benchmark_waitlist --waiters 5000 --cancellations 200 --output waitlist.json
+
+
+class Command(BaseCommand):
+    help = "Time waitlist promotion on a fully booked event with thousands of waiters"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--waiters", type=int, default=5000)
+        parser.add_argument("--pros", type=int, default=12)
+        parser.add_argument("--hours", type=int, default=8, help="Length of the event")
+        parser.add_argument("--cancellations", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", help="Also write the results to this JSON file")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with transaction.atomic():
+            event = self.make_event(rng, options)
+            reservations = list(Reservation.objects.filter(event=event).values_list('pk', 'professional_id', 'time_and_date'))
+            timings, queries, promoted = [], [], 0
+            for pk, professional_id, time_and_date in rng.sample(reservations, min(options["cancellations"], len(reservations))):
+                Reservation.objects.filter(pk=pk).delete()
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    reservation = waitlist.promote(event.pk, professional_id, time_and_date)
+                    timings.append(time.perf_counter() - started)
+                queries.append(len(captured))
+                promoted += reservation is not None
+            still_waiting = WaitlistEntry.objects.filter(event=event, status=WaitlistEntry.WAITING).count()
+            transaction.set_rollback(True)
+
+        results = {
+            'waiters': options["waiters"],
+            'cancellations': len(timings),
+            'promoted': promoted,
+            'still_waiting': still_waiting,
+            'queries_max': max(queries),
+            'p50_ms': round(percentile(timings, 50) * 1000, 2),
+            'p95_ms': round(percentile(timings, 95) * 1000, 2),
+            'p99_ms': round(percentile(timings, 99) * 1000, 2),
+        }
+        self.stdout.write(
+            f"{results['promoted']} of {results['cancellations']} cancellations filled from {options['waiters']} waiters "
+            f"({results['still_waiting']} still waiting)\n"
+            f"promote: p50 {results['p50_ms']} ms  p95 {results['p95_ms']} ms  p99 {results['p99_ms']} ms  "
+            f"at most {results['queries_max']} queries"
+        )
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+
+    def make_event(self, rng, options):
+        #every pro does haircuts plus maybe one extra, every slot of every pro is booked. most waiters want a haircut,
+        #some want an extra too, a few want something nobody offers (they're skipped every time, the worst case)
+        haircut = Service.objects.create(name="Benchmark haircut", service_description="benchmark")
+        extras = [Service.objects.create(name=f"Benchmark extra {number}", service_description="benchmark") for number in range(3)]
+        nobody = Service.objects.create(name="Benchmark nobody", service_description="benchmark")
+        pros = []
+        for number in range(options["pros"]):
+            pro = ServiceProfessional.objects.create(name=f"Benchmark pro {number}")
+            pro.services.set([haircut] + rng.sample(extras, rng.randint(0, 1)))
+            pros.append(pro)
+
+        start = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=1), datetime.min.time())) + timedelta(hours=9)
+        event = Event.objects.create(
+            name="Benchmark day", description="benchmark", event_location="nowhere",
+            start_time_and_date=start, end_time=start + timedelta(hours=options["hours"]),
+        )
+        event.services.set([haircut, nobody] + extras)
+
+        owner = User.objects.create(username="benchmark_waitlist_owner")
+        slots = int(timedelta(hours=options["hours"]) / slot_length())
+        booked = Reservation.objects.bulk_create([
+            Reservation(username=owner.username, time_and_date=start + slot_length() * slot, event=event, professional=pro, user=owner)
+            for pro in pros for slot in range(slots)
+        ])
+        Reservation.services.through.objects.bulk_create([
+            Reservation.services.through(reservation_id=reservation.pk, service_id=haircut.pk) for reservation in booked
+        ])
+
+        users = User.objects.bulk_create([User(username=f"benchmark_waiter_{number}") for number in range(options["waiters"])])
+        entries = WaitlistEntry.objects.bulk_create([WaitlistEntry(user=user, username=user.username, event=event) for user in users])
+        through = []
+        for entry in entries:
+            roll = rng.random()
+            wanted = [haircut] + ([rng.choice(extras)] if roll < 0.3 else []) + ([nobody] if roll > 0.9 else [])
+            through += [WaitlistEntry.services.through(waitlistentry_id=entry.pk, service_id=service.pk) for service in wanted]
+        WaitlistEntry.services.through.objects.bulk_create(through)
+        return event
@@ -0,0 +1,60 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from core.loadtest import SERVERS, Server, hammer, login_session
+
+#runs the same requests against sync gunicorn (wsgi) and gunicorn with uvicorn workers (asgi) on this machine and
+#this database, one after the other, and prints requests/second and latency for each. seed some data first:
+#   python manage.py fill_dat_up --users 500 --events 50 --reservations 20000
+#   python manage.py compare_servers --requests 2000 --concurrency 32 --output compare.json
+
+
+class Command(BaseCommand):
+    help = "Compare sync (WSGI) and async (ASGI) gunicorn throughput on the pages that were made async"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000, help="Requests per page per server")
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--servers", nargs="+", choices=list(SERVERS), default=list(SERVERS))
+        parser.add_argument("--output", help="Also write the results to this JSON file")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(is_superuser=False).order_by('pk').first()
+        if user is None:
+            raise CommandError("No users, run fill_dat_up first.")
+        cookies = login_session(user)
+
+        pages = [
+            ("home (logged out)", reverse('Cosmetology:index'), None),
+            ("home (logged in)", reverse('Cosmetology:index'), cookies),
+            ("user appointments", reverse('Cosmetology:user_appointments'), cookies),
+            ("event select", reverse('Cosmetology:user_appointment_pick_event_create'), cookies),
+        ]
+
+        results = {}
+        for kind in options["servers"]:
+            results[kind] = {}
+            with Server(kind, options["port"], options["workers"]) as server:
+                for name, path, page_cookies in pages:
+                    hammer(server.url(path), options["concurrency"], options["concurrency"], page_cookies) #warm up
+                    results[kind][name] = hammer(server.url(path), options["requests"], options["concurrency"], page_cookies)
+
+        for kind, by_page in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{kind} ({' '.join(SERVERS[kind])})"))
+            for name, stats in by_page.items():
+                self.stdout.write(
+                    f"  {name:<20} {stats['rps']:>8} req/s  p50 {stats['p50_ms']} ms  p95 {stats['p95_ms']} ms  "
+                    f"errors {stats['errors']}"
+                )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump({
+                    'requests': options["requests"], 'concurrency': options["concurrency"],
+                    'workers': options["workers"], 'results': results,
+                }, f, indent=2)
@@ -0,0 +1,66 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.booking import free_professionals
+from core.models import Event, Reservation, Review
+
+#prints the query plan and timing of the queries our pages run the most, to check the indexes in
+#core/migrations/0002_hot_path_indexes.py are used. to compare before/after on the same data:
+#   python manage.py fill_dat_up --users 50000 --events 2000 --pros 200 --reservations 1000000
+#   python manage.py migrate core 0001 && python manage.py explain_hot_queries
+#   python manage.py migrate core && python manage.py explain_hot_queries
+#works on sqlite and postgres (DJANGO_DB=postgres).
+
+
+class Command(BaseCommand):
+    help = "Show EXPLAIN output and timings for the hot lookup queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=20, help="How many times each query is timed")
+        parser.add_argument("--no-plans", action="store_true", help="Only print timings")
+
+    def handle(self, *args, **options):
+        reservation = Reservation.objects.exclude(professional=None).order_by('pk').first()
+        event = Event.objects.order_by('pk').first()
+        if reservation is None or event is None:
+            self.stderr.write("No data, run fill_dat_up first.")
+            return
+
+        middle = reservation.time_and_date
+        queries = {
+            "user's appointments (user + time)":
+                Reservation.objects.filter(user_id=reservation.user_id).order_by('time_and_date'),
+            "event's appointments (event + time)":
+                Reservation.objects.filter(event_id=event.pk).order_by('time_and_date'),
+            "is the pro busy (professional + time)":
+                Reservation.objects.filter(
+                    professional_id=reservation.professional_id,
+                    time_and_date__gt=middle - timedelta(minutes=30),
+                    time_and_date__lt=middle + timedelta(minutes=30),
+                ),
+            "free qualified pros (booking)":
+                free_professionals(list(reservation.services.all()), middle),
+            "events on at a time (start/end window)":
+                Event.objects.filter(start_time_and_date__lte=middle, end_time__gte=middle),
+            "admin appointments page (time + id)":
+                Reservation.objects.filter(time_and_date__gte=middle).order_by('time_and_date', 'pk')[:51],
+            "newest reviews":
+                Review.objects.order_by('-time_and_date', '-pk')[:21],
+        }
+
+        self.stdout.write(f"{connection.vendor}, {Reservation.objects.count()} reservations, {options['runs']} runs each\n")
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(options["runs"]):
+                start = time.perf_counter()
+                list(queryset.all()) #.all() makes a fresh copy so nothing comes from the result cache
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  median {statistics.median(timings):.2f} ms, max {max(timings):.2f} ms")
+            if not options["no_plans"]:
+                for line in queryset.explain().splitlines():
+                    self.stdout.write(f"  {line}")
@@ -1,135 +1,211 @@
-#Instructions below are not written by me:
-
 import random
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 
-from django.core.management.base import BaseCommand
+from allauth.account.models import EmailAddress
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
-from faker import Faker
 
-from core.models import Service, ServiceProfessional, Event, Reservation, Review
+from core.booking import slot_length
+from core.models import Service, ServiceProfessional, Event, Reservation, Review, EventRating, ServiceRating, ArchivedEvent, ArchivedReservation, WaitlistEntry
+from core.ratings import rebuild
+
+#fills the database with fake but valid data for benchmarking, e.g.
+#   python manage.py fill_dat_up --users 50000 --events 2000 --reservations 1000000
+#everything is inserted with bulk_create in batches (m2m too, straight into the through tables) and
+#all randomness comes from --seed, so the same arguments always give the same dataset.
+
+USERNAME_PREFIX = "loadgen_" #only users with this prefix get deleted when the command runs again
+PASSWORD = "password123" #every generated user has this password
+BASE_SERVICES = ["Haircut", "Manicure", "Pedicure", "Facial", "Massage", "Coloring", "Braiding", "Makeup"]
+WORDS = ["spring", "clinic", "glow", "style", "studio", "open", "house", "fresh", "look", "day", "night", "salon"]
+FIRST_NAMES = ["Ana", "Ben", "Carla", "Dev", "Ema", "Femi", "Gia", "Hao", "Ivy", "Jon", "Kai", "Lena", "Mo", "Nia"]
+LAST_NAMES = ["Lopez", "Kim", "Patel", "Nguyen", "Smith", "Okafor", "Rossi", "Haddad", "Silva", "Chen"]
+LOCATIONS = ["ACC Room 101", "ACC Room 204", "ACC Salon", "Career Center Lobby", "Gym"]
+
 
 class Command(BaseCommand):
-    help = "Populate DB with logic-enforced Services, Professionals, Events, Reservations, and Reviews"
+    help = "Populate DB with a deterministic, production-sized dataset of Services, Professionals, Events, Reservations, and Reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--pros", type=int, default=20)
+        parser.add_argument("--events", type=int, default=20)
+        parser.add_argument("--reservations", type=int, default=200)
+        parser.add_argument("--reviews", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=0, help="Same seed and arguments give the same data")
+        parser.add_argument("--start", type=str, default=None, help="Date (YYYY-MM-DD) events are spread around, defaults to today")
+        parser.add_argument("--batch-size", type=int, default=5000)
 
     def handle(self, *args, **options):
-        fake = Faker()
-        now = timezone.now()
-
-        # Clear existing data (except superusers)
-        Review.objects.all().delete()
-        Reservation.objects.all().delete()
-        Event.objects.all().delete()
-        ServiceProfessional.objects.all().delete()
-        Service.objects.all().delete()
-        User.objects.exclude(is_superuser=True).delete()
-
-        self.stdout.write("Creating demo users…")
-        users = []
-        for _ in range(5):
-            u = User.objects.create_user(
-                username=fake.user_name(),
-                email=fake.email(),
-                password="password123"
-            )
-            users.append(u)
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        start = datetime.fromisoformat(options["start"]).date() if options["start"] else timezone.localdate()
+        self.anchor = timezone.make_aware(datetime.combine(start, time(hour=8)))
+
+        self.clear()
+        with transaction.atomic():
+            users = self.create_users(options["users"])
+            services = self.create_services()
+            pros = self.create_pros(options["pros"], services)
+            events = self.create_events(options["events"], services)
+            created = self.create_reservations(options["reservations"], users, pros, events)
+            reviews = self.create_reviews(options["reviews"], users, events)
+            rebuild() #bulk_create doesn't send the signals that keep the review totals up to date
+
+        cache.clear() #bulk_create doesn't send signals, so drop the cached pages and availability grids
+        self.stdout.write(self.style.SUCCESS(
+            f"DB populated: {len(users)} users, {len(services)} services, {len(pros)} pros, {len(events)} events, {created} reservations, {reviews} reviews"
+        ))
 
+    def clear(self):
+        #_raw_delete skips loading every row to send delete signals, which would take forever with a million reservations
+        self.stdout.write("Clearing old data…")
+        with transaction.atomic():
+            for model in [EventRating, ServiceRating, Review.services.through, Review, ArchivedReservation, ArchivedEvent,
+                          WaitlistEntry.services.through, WaitlistEntry, Reservation.services.through, Reservation,
+                          Event.services.through, Event, ServiceProfessional.services.through, ServiceProfessional, Service]:
+                model.objects.all()._raw_delete(model.objects.db)
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def bulk_create(self, model, objects):
+        created = []
+        for i in range(0, len(objects), self.batch_size):
+            created += model.objects.bulk_create(objects[i:i + self.batch_size])
+        return created
+
+    def create_users(self, count):
+        self.stdout.write(f"Creating {count} users…")
+        password = make_password(PASSWORD) #hashing once instead of once per user
+        users = self.bulk_create(User, [
+            User(username=f"{USERNAME_PREFIX}{i}", email=f"{USERNAME_PREFIX}{i}@example.com", password=password)
+            for i in range(count)
+        ])
+        #verified, or allauth won't let them log in (the load_test command logs in through the real form)
+        self.bulk_create(EmailAddress, [EmailAddress(user=user, email=user.email, verified=True, primary=True) for user in users])
+        return users
+
+    def create_services(self):
         self.stdout.write("Creating services…")
-        services = []
-        base_services = ["Haircut", "Manicure", "Pedicure", "Facial", "Massage"]
-        for name in base_services:
-            svc = Service.objects.create(
-                name=name,
-                service_description=fake.sentence(nb_words=6),
-                price=random.randint(20, 150)
-            )
-            services.append(svc)
-
-        self.stdout.write("Creating professionals…")
-        pros = []
-        for _ in range(4):
-            pro = ServiceProfessional.objects.create(
-                name=fake.name(),
-                class_period=f"{random.randint(1,4)} months"
-            )
-            pro.services.set(random.sample(services, k=random.randint(1,3)))
-            pros.append(pro)
-
-        self.stdout.write("Creating events (some past, some future)…")
+        return self.bulk_create(Service, [
+            Service(name=name, service_description=f"{name} by our students") for name in BASE_SERVICES
+        ])
+
+    def create_pros(self, count, services):
+        self.stdout.write(f"Creating {count} professionals…")
+        pros = self.bulk_create(ServiceProfessional, [
+            ServiceProfessional(name=f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}") for _ in range(count)
+        ])
+        Through = ServiceProfessional.services.through
+        self.pro_skills = {}
+        rows = []
+        for pro in pros:
+            skills = self.rng.sample(services, k=self.rng.randint(1, 3))
+            self.pro_skills[pro.pk] = {service.pk for service in skills}
+            rows += [Through(serviceprofessional_id=pro.pk, service_id=service.pk) for service in skills]
+        self.bulk_create(Through, rows)
+        return pros
+
+    def create_events(self, count, services):
+        self.stdout.write(f"Creating {count} events (some past, some future)…")
         events = []
-        for _ in range(5):
-            offset = random.randint(-30, 30)
-            start = now + timedelta(days=offset, hours=random.randint(8,11))
-            duration = timedelta(hours=random.choice([2,3,4]))
-            ev = Event.objects.create(
-                name=fake.catch_phrase(),
-                description=fake.text(max_nb_chars=100),
+        spread = max(count, 30) #about one event a day around --start
+        for _ in range(count):
+            start = self.anchor + timedelta(days=self.rng.randint(-spread // 2, spread // 2), minutes=30 * self.rng.randint(0, 6))
+            #line every event up on one grid of slots, so a slot number means the same time at every event
+            start -= timedelta(seconds=int(start.timestamp()) % int(slot_length().total_seconds()))
+            events.append(Event(
+                name=f"{self.rng.choice(WORDS).title()} {self.rng.choice(WORDS).title()}",
+                description=" ".join(self.rng.choices(WORDS, k=10)),
                 start_time_and_date=start,
-                end_time=start + duration,
-                event_location=fake.city()
-            )
-            ev.services.set(random.sample(services, k=random.randint(2,4)))
-            events.append(ev)
+                end_time=start + timedelta(hours=self.rng.choice([2, 3, 4])),
+                event_location=self.rng.choice(LOCATIONS),
+            ))
+        events = self.bulk_create(Event, events)
+
+        Through = Event.services.through
+        self.event_services = {}
+        rows = []
+        for event in events:
+            offered = self.rng.sample(services, k=self.rng.randint(2, 4))
+            self.event_services[event.pk] = {service.pk for service in offered}
+            rows += [Through(event_id=event.pk, service_id=service.pk) for service in offered]
+        self.bulk_create(Through, rows)
+        return events
+
+    def create_reservations(self, count, users, pros, events):
+        #same rules as the booking page: the pro offers every picked service, is never double booked,
+        #and the time is a slot inside the event
+        self.stdout.write(f"Creating {count} reservations…")
+        if not (users and pros and events):
+            return 0
+        pros_for_event = {
+            event.pk: [pro.pk for pro in pros if self.pro_skills[pro.pk] & self.event_services[event.pk]]
+            for event in events
+        }
+        bookable = [event for event in events if pros_for_event[event.pk]]
+        taken = set() #(pro id, slot number) pairs already booked
+        slot = slot_length() #APPOINTMENT_SLOT_MINUTES, the same slots booking.py checks
+        Through = Reservation.services.through
 
-        self.stdout.write("Creating reservations with enforced logic…")
         created = 0
         attempts = 0
-        while created < 15 and attempts < 100:
-            attempts += 1
-            user = random.choice(users)
-            event = random.choice(events)
-
-            span = event.end_time - event.start_time_and_date
-            if span.total_seconds() < 1800:
-                continue
-            minutes_slot = random.randint(0, int(span.total_seconds() // 1800)) * 30
-            time_slot = event.start_time_and_date + timedelta(minutes=minutes_slot)
-
-            # ensure timezone-aware
-            if timezone.is_naive(time_slot):
-                time_slot = timezone.make_aware(time_slot, timezone.get_current_timezone())
-
-            # no double-book
-            if Reservation.objects.filter(user=user, time_and_date=time_slot).exists():
-                continue
-
-            svc_choices = list(event.services.all())
-            chosen_services = random.sample(svc_choices, k=random.randint(1, len(svc_choices)))
-            avail_pros = [p for p in pros if all(s in p.services.all() for s in chosen_services)]
-            if not avail_pros:
-                continue
-            professional = random.choice(avail_pros)
-
-            res = Reservation.objects.create(
-                username=user.username,
-                email=user.email,
-                time_and_date=time_slot,
-                event=event,
-                professional=professional,
-                user=user
-            )
-            res.services.set(chosen_services)
-            created += 1
-
-        self.stdout.write(f"Created {created} reservations.")
-
-        self.stdout.write("Creating reviews for past attended events…")
-        reviews = 0
-        for res in Reservation.objects.filter(time_and_date__lt=now):
-            if random.choice([True, False]):
-                rv = Review.objects.create(
-                    user=res.user,
-                    username=res.username,
-                    title=fake.sentence(nb_words=4),
-                    text=fake.paragraph(nb_sentences=2),
-                    event=res.event,
-                    stars=random.randint(1,5)
-                )
-                if res.services.exists():
-                    rv.services.set(random.sample(list(res.services.all()), k=random.randint(0, res.services.count())))
-                reviews += 1
-
-        self.stdout.write(self.style.SUCCESS(
-            f"DB populated: {len(users)} users, {len(services)} services, {len(pros)} pros, {len(events)} events, {created} reservations, {reviews} reviews"
-        ))
+        while created < count and attempts < count * 5 and bookable:
+            batch = []
+            batch_services = []
+            while len(batch) < self.batch_size and created + len(batch) < count and attempts < count * 5:
+                attempts += 1
+                event = self.rng.choice(bookable)
+                slots = max(1, int((event.end_time - event.start_time_and_date) / slot))
+                time_slot = event.start_time_and_date + slot * self.rng.randrange(slots)
+                pro_id = self.rng.choice(pros_for_event[event.pk])
+                key = (pro_id, int(time_slot.timestamp()) // int(slot.total_seconds()))
+                if key in taken: #no double-book
+                    continue
+                taken.add(key)
+                offered = sorted(self.pro_skills[pro_id] & self.event_services[event.pk])
+                user = self.rng.choice(users)
+                batch.append(Reservation(
+                    username=user.username, user=user, event=event, professional_id=pro_id, time_and_date=time_slot,
+                ))
+                batch_services.append(self.rng.sample(offered, k=self.rng.randint(1, len(offered))))
+            batch = Reservation.objects.bulk_create(batch)
+            Through.objects.bulk_create([
+                Through(reservation_id=reservation.pk, service_id=service_id)
+                for reservation, service_ids in zip(batch, batch_services)
+                for service_id in service_ids
+            ])
+            created += len(batch)
+            self.stdout.write(f"  {created}/{count}")
+
+        if created < count:
+            self.stdout.write(self.style.WARNING(f"Only room for {created} reservations, add --pros or --events for more."))
+        return created
+
+    def create_reviews(self, count, users, events):
+        self.stdout.write(f"Creating {count} reviews…")
+        if not (users and events):
+            return 0
+        reviews = []
+        review_services = []
+        for _ in range(count):
+            user = self.rng.choice(users)
+            event = self.rng.choice(events)
+            reviews.append(Review(
+                user=user, username=user.username, name=user.username, event=event,
+                text=" ".join(self.rng.choices(WORDS, k=12)), stars=self.rng.randint(1, 5),
+            ))
+            offered = sorted(self.event_services[event.pk])
+            review_services.append(self.rng.sample(offered, k=self.rng.randint(0, len(offered))))
+        reviews = self.bulk_create(Review, reviews)
+
+        Through = Review.services.through
+        self.bulk_create(Through, [
+            Through(review_id=review.pk, service_id=service_id)
+            for review, service_ids in zip(reviews, review_services)
+            for service_id in service_ids
+        ])
+        return len(reviews)
@@ -0,0 +1,41 @@
+from itertools import chain
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import BATCH_SIZE, READERS, detect_kind, import_schedule
+
+#   python manage.py import_schedule fall_events.csv
+#   python manage.py import_schedule fall.ics --create-services
+#   python manage.py import_schedule professionals.csv --dry-run
+#file formats are described at the top of core/imports.py
+
+
+class Command(BaseCommand):
+    help = "Import events (CSV or ICS) or professionals (CSV) with their services, updating ones that already exist"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--kind", choices=list(READERS), help="Defaults to guessing from the file name and header")
+        parser.add_argument("--create-services", action="store_true", help="Create services the file names that don't exist yet")
+        parser.add_argument("--dry-run", action="store_true", help="Check the file and report errors without saving anything")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            file = open(options["path"], encoding="utf-8-sig", newline="")
+        except OSError as error:
+            raise CommandError(error)
+        with file:
+            first_line = file.readline()
+            kind = options["kind"] or detect_kind(options["path"], first_line)
+            result = import_schedule(
+                chain([first_line], file), kind,
+                create_services=options["create_services"], dry_run=options["dry_run"], batch_size=options["batch_size"],
+            )
+
+        for line, message in result.errors:
+            self.stderr.write(f"line {line}: {message}")
+        summary = f"{kind}: {result.created} created, {result.updated} updated, {len(result.errors)} rows with errors"
+        if options["dry_run"]:
+            summary += " (dry run, nothing was saved)"
+        self.stdout.write(self.style.SUCCESS(summary) if not result.errors else self.style.WARNING(summary))
@@ -0,0 +1,166 @@
+import json
+import random
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+
+from core.booking import slot_length
+from core.loadtest import SERVERS, Browser, Recorder, Server
+from core.models import Event
+from core.management.commands.fill_dat_up import PASSWORD, USERNAME_PREFIX
+
+#drives whole user sessions against a real gunicorn on this database and records latency per endpoint.
+#every session: log in, home, pick an event, book, look at my appointments, move the booking, cancel it, read reviews.
+#   python manage.py fill_dat_up --users 200 --events 30 --reservations 5000
+#   python manage.py load_test --sessions 200 --concurrency 16 --output before.json
+#   ...change something...
+#   python manage.py load_test --sessions 200 --concurrency 16 --output after.json --baseline before.json
+#bookings are cancelled at the end of each session, so runs can be repeated on the same data.
+
+CANCEL_LINK = re.compile(r'user_appointment_cancel/(\d+)')
+
+
+def local_input(moment):
+    #what a datetime-local input would send
+    return timezone.localtime(moment).strftime('%Y-%m-%dT%H:%M')
+
+
+class Command(BaseCommand):
+    help = "Run simulated booking sessions against a local server and report p50/p95/p99 and req/s per endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sessions", type=int, default=100, help="How many user sessions to run in total")
+        parser.add_argument("--concurrency", type=int, default=8, help="Sessions running at the same time")
+        parser.add_argument("--server", choices=list(SERVERS), default="async", help="Which gunicorn worker to start")
+        parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+        parser.add_argument("--port", type=int, default=8766)
+        parser.add_argument("--url", help="Test an already running server instead of starting one, e.g. http://127.0.0.1:8000")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the results to this JSON file")
+        parser.add_argument("--baseline", help="JSON file from an earlier run to compare p95 against")
+
+    def handle(self, *args, **options):
+        self.events = self.bookable_events()
+        usernames = [f"{USERNAME_PREFIX}{i}" for i in range(options["sessions"])]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        if len(existing) < options["sessions"]:
+            raise CommandError(f"Need {options['sessions']} load test users, found {len(existing)}. Run fill_dat_up --users {options['sessions']}.")
+        if not self.events:
+            raise CommandError("No upcoming events with services, run fill_dat_up first.")
+
+        self.recorder = Recorder()
+        self.bookings = {'booked': 0, 'no_slot': 0}
+        if options["url"]:
+            self.run(options["url"].rstrip('/'), usernames, options)
+        else:
+            with Server(options["server"], options["port"], options["workers"]) as server:
+                self.run(server.url(''), usernames, options)
+        results = self.recorder.results()
+
+        baseline = {}
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)['endpoints']
+        self.report(results, baseline)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump({
+                    'commit': self.commit(),
+                    'finished': timezone.now().isoformat(),
+                    'server': options["url"] or options["server"],
+                    'sessions': options["sessions"],
+                    'concurrency': options["concurrency"],
+                    'bookings': self.bookings,
+                    'endpoints': results,
+                }, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def bookable_events(self):
+        #[(event id, [service ids], [slot start times])] for events that haven't ended
+        events = []
+        for event in Event.objects.filter(end_time__gt=timezone.now()).prefetch_related('services').order_by('start_time_and_date')[:50]:
+            service_ids = [service.pk for service in event.services.all()]
+            slots = []
+            moment = max(event.start_time_and_date, timezone.now() + slot_length())
+            while moment + slot_length() <= event.end_time:
+                slots.append(moment)
+                moment += slot_length()
+            if service_ids and slots:
+                events.append((event.pk, service_ids, slots))
+        return events
+
+    def run(self, base_url, usernames, options):
+        rng = random.Random(options["seed"])
+        plans = [(username, rng.choice(self.events), rng.random()) for username in usernames] #decided up front so runs repeat
+        with ThreadPoolExecutor(options["concurrency"]) as pool:
+            list(pool.map(lambda plan: self.session(base_url, *plan), plans))
+
+    def session(self, base_url, username, event, pick):
+        browser = Browser(base_url, self.recorder)
+        rng = random.Random(f"{username}{pick}")
+        event_id, service_ids, slots = event
+
+        if not browser.get("login page", reverse('account_login')):
+            return
+        if not browser.post("login", reverse('account_login'), {'login': username, 'password': PASSWORD}):
+            return
+        browser.get("home", reverse('Cosmetology:index'))
+        browser.get("event select", reverse('Cosmetology:user_appointment_pick_event_create'))
+        browser.post("event select POST", reverse('Cosmetology:user_appointment_pick_event_create'), {'event': event_id})
+
+        add_url = reverse('Cosmetology:user_appointment_add', kwargs={'event_id': event_id})
+        browser.get("appointment add", add_url)
+        services = rng.sample(service_ids, k=1)
+        #the form shows the booking again (200) when nobody is free at that time, that still counts as a good request
+        booked = browser.post("appointment add POST", add_url, {
+            'services': services, 'time_and_date': local_input(rng.choice(slots)),
+        }, expect=(200, 302))
+
+        listing = browser.get("user appointments", reverse('Cosmetology:user_appointments'))
+        if booked is not None and booked.status_code == 302 and listing is not None:
+            self.count('booked')
+            reservation_id = max(int(pk) for pk in CANCEL_LINK.findall(listing.text)) #newest one is ours
+            edit_url = reverse('Cosmetology:user_appointment_update', kwargs={'event_id': event_id, 'pk': reservation_id})
+            browser.get("appointment edit", edit_url)
+            browser.post("appointment edit POST", edit_url, {
+                'services': services, 'time_and_date': local_input(rng.choice(slots)),
+            }, expect=(200, 302))
+            cancel_url = reverse('Cosmetology:user_appointment_cancel', kwargs={'pk': reservation_id})
+            browser.get("appointment cancel", cancel_url)
+            browser.post("appointment cancel POST", cancel_url, {})
+        elif booked is not None:
+            self.count('no_slot')
+
+        browser.get("reviews", reverse('Cosmetology:reviews'))
+
+    def count(self, outcome):
+        with self.recorder.lock:
+            self.bookings[outcome] += 1
+
+    def commit(self):
+        try:
+            return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def report(self, results, baseline):
+        self.stdout.write(f"{'endpoint':<24} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+        for name, stats in results.items():
+            line = (f"{name:<24} {stats['requests']:>8} {stats['errors']:>6} {stats['rps']:>8} "
+                    f"{stats['p50_ms']!s:>8} {stats['p95_ms']!s:>8} {stats['p99_ms']!s:>8}")
+            before = baseline.get(name, {}).get('p95_ms')
+            if before and stats['p95_ms']:
+                change = (stats['p95_ms'] - before) / before * 100
+                line += f"  p95 {change:+.0f}% vs baseline"
+                if change > 20:
+                    line = self.style.WARNING(line)
+            self.stdout.write(line)
+        self.stdout.write(f"Bookings: {self.bookings['booked']} made, {self.bookings['no_slot']} found no free professional")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.caching import bump_reviews_version
+from core.ratings import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recount the review totals (EventRating, ServiceRating) from scratch, e.g. after importing reviews"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            events, services = rebuild()
+        bump_reviews_version() #the services and event pages show the ratings
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ratings for {events} events and {services} services."))
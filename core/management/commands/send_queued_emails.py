@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.emails import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Send emails waiting in the outbox (OutgoingEmail) in batches over one SMTP connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50, help="How many emails to send per SMTP connection")
+        parser.add_argument("--loop", action="store_true", help="Keep running and poll the outbox instead of exiting when it is empty")
+        parser.add_argument("--interval", type=float, default=10, help="Seconds to sleep between polls when --loop is set")
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued_emails(options["batch_size"])
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} emails, {failed} failed.")
+            if sent + failed == options["batch_size"]:
+                continue #outbox probably has more, go again right away
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,107 @@
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.booking import STRATEGIES, reserve_professional, slot_length
+from core.loadtest import percentile
+from core.models import Event, Reservation, Service, ServiceProfessional
+
+#replays the same made-up booking day with every assignment strategy in core/booking.py and prints how evenly the
+#bookings end up spread over the pros and how long each pick takes. everything happens in a transaction that is
+#rolled back at the end, so it can run against any database (the timings are only meaningful on the real one):
+#   python manage.py simulate_assignment --pros 12 --hours 8 --fill 0.7 --output assignment.json
+
+
+class Command(BaseCommand):
+    help = "Compare the pro assignment strategies on a simulated booking day (load spread and time per decision)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pros", type=int, default=12)
+        parser.add_argument("--hours", type=int, default=8, help="Length of the event")
+        parser.add_argument("--fill", type=float, default=0.7, help="Booking requests as a share of all pro slots")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--strategies", nargs="+", choices=list(STRATEGIES), default=list(STRATEGIES))
+        parser.add_argument("--output", help="Also write the results to this JSON file")
+
+    def handle(self, *args, **options):
+        results = {name: self.simulate(name, options) for name in options["strategies"]}
+
+        for name, stats in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(
+                f"  booked {stats['booked']} of {stats['requests']}, turned away {stats['turned_away']}\n"
+                f"  per pro: min {stats['min']}  max {stats['max']}  mean {stats['mean']}  stdev {stats['stdev']}  "
+                f"max/mean {stats['max_over_mean']}\n"
+                f"  decision: p50 {stats['p50_ms']} ms  p95 {stats['p95_ms']} ms  p99 {stats['p99_ms']} ms"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump({'options': {key: options[key] for key in ('pros', 'hours', 'fill', 'seed')}, 'results': results}, f, indent=2)
+
+    def simulate(self, name, options):
+        rng = random.Random(options["seed"]) #same day for every strategy
+        with transaction.atomic():
+            event, requests = self.make_day(rng, options)
+            user = User.objects.create(username="simulate_assignment")
+            strategy = STRATEGIES[name](rng=random.Random(options["seed"]))
+
+            timings, turned_away = [], 0
+            for time_and_date, services in requests:
+                started = time.perf_counter()
+                professional = reserve_professional(services, time_and_date, event, strategy)
+                timings.append(time.perf_counter() - started)
+                if professional is None:
+                    turned_away += 1
+                    continue
+                reservation = Reservation.objects.create(
+                    username=user.username, time_and_date=time_and_date, event=event, professional=professional, user=user)
+                reservation.services.set(services)
+
+            loads = [pro.reservation_set.count() for pro in ServiceProfessional.objects.filter(name__startswith="Simulated")]
+            transaction.set_rollback(True)
+
+        mean = statistics.mean(loads)
+        return {
+            'requests': len(requests),
+            'booked': len(requests) - turned_away,
+            'turned_away': turned_away,
+            'loads': sorted(loads),
+            'min': min(loads),
+            'max': max(loads),
+            'mean': round(mean, 2),
+            'stdev': round(statistics.pstdev(loads), 2),
+            'max_over_mean': round(max(loads) / mean, 2) if mean else None,
+            'p50_ms': round(percentile(timings, 50) * 1000, 2),
+            'p95_ms': round(percentile(timings, 95) * 1000, 2),
+            'p99_ms': round(percentile(timings, 99) * 1000, 2),
+        }
+
+    def make_day(self, rng, options):
+        #every pro does haircuts, most do one or two other things. requests are mostly haircuts, some add another service
+        haircut = Service.objects.create(name="Simulated haircut", service_description="simulated")
+        extras = [Service.objects.create(name=f"Simulated extra {number}", service_description="simulated") for number in range(3)]
+        for number in range(options["pros"]):
+            pro = ServiceProfessional.objects.create(name=f"Simulated pro {number}")
+            pro.services.set([haircut] + rng.sample(extras, rng.randint(0, 2)))
+
+        start = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=1), datetime.min.time())) + timedelta(hours=9)
+        event = Event.objects.create(
+            name="Simulated day", description="simulated", event_location="nowhere",
+            start_time_and_date=start, end_time=start + timedelta(hours=options["hours"]),
+        )
+        event.services.set([haircut] + extras)
+
+        slots = int(timedelta(hours=options["hours"]) / slot_length())
+        requests = []
+        for _ in range(int(slots * options["pros"] * options["fill"])):
+            services = [haircut] + ([rng.choice(extras)] if rng.random() < 0.3 else [])
+            requests.append((start + slot_length() * rng.randrange(slots), services))
+        return event, requests
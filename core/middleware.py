@@ -0,0 +1,133 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+#times every request and counts its sql queries through connection.execute_wrapper, so we can see what each view costs.
+#results go in a Server-Timing header (shows up in the browser dev tools network tab) and in a small in-memory
+#summary per view that superusers can see at /request_stats. each gunicorn worker keeps its own summary.
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter() #sql text (with %s placeholders, not values) -> how many times it ran
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        #the same query shape running over and over in one request is usually an N+1 loop
+        return {sql: times for sql, times in self.statements.items() if times > 1}
+
+
+class RequestStats:
+    #rolling window of the last few requests for every view
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, view_name, queries, db_ms, wall_ms, duplicates):
+        with self.lock:
+            if view_name not in self.samples:
+                self.samples[view_name] = deque(maxlen=self.window)
+            self.samples[view_name].append((queries, db_ms, wall_ms, duplicates))
+
+    def summary(self):
+        with self.lock:
+            samples = {view: list(rows) for view, rows in self.samples.items()}
+        result = {}
+        for view, rows in sorted(samples.items()):
+            walls = sorted(row[2] for row in rows)
+            result[view] = {
+                'requests': len(rows),
+                'avg_queries': round(sum(row[0] for row in rows) / len(rows), 1),
+                'max_queries': max(row[0] for row in rows),
+                'avg_db_ms': round(sum(row[1] for row in rows) / len(rows), 2),
+                'p50_ms': round(walls[len(walls) // 2], 2),
+                'p95_ms': round(walls[min(len(walls) - 1, int(len(walls) * 0.95))], 2),
+                'max_duplicate_queries': max(row[3] for row in rows),
+            }
+        return {'pid': os.getpid(), 'views': result}
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+
+
+#these run in the sync thread, looking up `connection` here would give the event loop's connection instead
+def attach(recorder):
+    connection.execute_wrappers.append(recorder)
+
+
+def detach(recorder):
+    connection.execute_wrappers.remove(recorder)
+
+
+request_stats = RequestStats(getattr(settings, 'REQUEST_STATS_WINDOW', 200))
+
+
+class QueryTimingMiddleware:
+    #works under both wsgi and asgi, so it doesn't force async views back into a thread
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        #database connections are per thread and the async orm runs its queries in the request's sync thread
+        #(django gives every asgi request its own), so the recorder has to be attached over there
+        await sync_to_async(attach)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(detach)(recorder)
+        return self.finish(request, response, recorder, start)
+
+    def finish(self, request, response, recorder, start):
+        wall_ms = (time.perf_counter() - start) * 1000
+        db_ms = recorder.duration * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else 'unresolved'
+        duplicates = recorder.duplicates()
+        duplicate_count = sum(times - 1 for times in duplicates.values())
+        request_stats.record(view_name, recorder.count, db_ms, wall_ms, duplicate_count)
+
+        if duplicates and max(duplicates.values()) >= settings.REQUEST_STATS_DUPLICATE_THRESHOLD:
+            sql, times = max(duplicates.items(), key=lambda item: item[1])
+            logger.warning("Possible N+1 in %s: query ran %d times: %s", view_name, times, sql)
+
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries", '
+            f'app;dur={wall_ms:.1f}'
+        )
+        return response
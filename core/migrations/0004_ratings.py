@@ -0,0 +1,68 @@
+# Generated by Django 5.2 on 2026-10-18 16:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def count_existing_reviews(apps, schema_editor):
+    #the same counting as core.ratings.rebuild, copied here so later changes to that module can't change this migration
+    Review = apps.get_model('core', 'Review')
+    EventRating = apps.get_model('core', 'EventRating')
+    ServiceRating = apps.get_model('core', 'ServiceRating')
+
+    def totals(reviews, group_by, stars_field):
+        rows = reviews.values(group_by).annotate(
+            count=Count('pk'),
+            total=Sum(stars_field),
+            **{f'stars_{stars}': Count('pk', filter=Q(**{stars_field: stars})) for stars in range(1, 6)},
+        ).order_by()
+        return {row.pop(group_by): row for row in rows}
+
+    by_event = totals(Review.objects.exclude(event=None), 'event_id', 'stars')
+    by_service = totals(Review.services.through.objects.all(), 'service_id', 'review__stars')
+    EventRating.objects.bulk_create([EventRating(event_id=pk, **row) for pk, row in by_event.items()], batch_size=1000)
+    ServiceRating.objects.bulk_create([ServiceRating(service_id=pk, **row) for pk, row in by_service.items()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventRating',
+            fields=[
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('stars_1', models.PositiveIntegerField(default=0)),
+                ('stars_2', models.PositiveIntegerField(default=0)),
+                ('stars_3', models.PositiveIntegerField(default=0)),
+                ('stars_4', models.PositiveIntegerField(default=0)),
+                ('stars_5', models.PositiveIntegerField(default=0)),
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating', serialize=False, to='core.event')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ServiceRating',
+            fields=[
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('stars_1', models.PositiveIntegerField(default=0)),
+                ('stars_2', models.PositiveIntegerField(default=0)),
+                ('stars_3', models.PositiveIntegerField(default=0)),
+                ('stars_4', models.PositiveIntegerField(default=0)),
+                ('stars_5', models.PositiveIntegerField(default=0)),
+                ('service', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating', serialize=False, to='core.service')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(count_existing_reviews, migrations.RunPython.noop),
+    ]
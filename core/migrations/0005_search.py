@@ -0,0 +1,70 @@
+from django.db import migrations
+
+#full text search for core/search.py. the same migration does different things per database:
+#postgres gets GIN indexes on the tsvector expressions the search queries use, sqlite gets FTS5 tables
+#that point at the real tables (external content) and triggers that keep them up to date.
+
+CONFIG = 'english'
+SEARCHED = {
+    #model: fields, same as SOURCES in core/search.py
+    'Service': ['name', 'service_description'],
+    'Event': ['name', 'description', 'event_location'],
+    'Review': ['text'],
+}
+
+
+def postgres_index(model_name):
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+    return GinIndex(SearchVector(*SEARCHED[model_name], config=CONFIG), name=f'{model_name.lower()}_search_idx')
+
+
+def sqlite_statements(table, fields):
+    search = f'{table}_search'
+    columns = ', '.join(fields)
+    new_values = ', '.join(f'new.{field}' for field in fields)
+    old_values = ', '.join(f'old.{field}' for field in fields)
+    return [
+        f"CREATE VIRTUAL TABLE {search} USING fts5({columns}, content='{table}', content_rowid='id', tokenize='porter unicode61')",
+        f"CREATE TRIGGER {search}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {search}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER {search}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {search}({search}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER {search}_update AFTER UPDATE ON {table} BEGIN "
+        f"INSERT INTO {search}({search}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {search}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        f"INSERT INTO {search}({search}) VALUES ('rebuild')", #index the rows that are already there
+    ]
+
+
+def create_search(apps, schema_editor):
+    for model_name, fields in SEARCHED.items():
+        model = apps.get_model('core', model_name)
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.add_index(model, postgres_index(model_name))
+        elif schema_editor.connection.vendor == 'sqlite':
+            for statement in sqlite_statements(model._meta.db_table, fields):
+                schema_editor.execute(statement)
+
+
+def drop_search(apps, schema_editor):
+    for model_name in SEARCHED:
+        model = apps.get_model('core', model_name)
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.remove_index(model, postgres_index(model_name))
+        elif schema_editor.connection.vendor == 'sqlite':
+            search = f'{model._meta.db_table}_search'
+            for trigger in ('insert', 'delete', 'update'):
+                schema_editor.execute(f"DROP TRIGGER IF EXISTS {search}_{trigger}")
+            schema_editor.execute(f"DROP TABLE IF EXISTS {search}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_ratings'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search, drop_search),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2 on 2026-10-18 16:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedEvent',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=200)),
+                ('description', models.CharField(max_length=200)),
+                ('start_time_and_date', models.DateTimeField()),
+                ('event_location', models.CharField(max_length=200)),
+                ('end_time', models.DateTimeField()),
+                ('services', models.TextField(blank=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedReservation',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('username', models.CharField(max_length=200)),
+                ('time_and_date', models.DateTimeField()),
+                ('professional', models.CharField(blank=True, max_length=200)),
+                ('services', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['end_time', 'id'], name='event_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedevent',
+            index=models.Index(fields=['end_time', 'id'], name='archivedevent_end_idx'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='archived_event',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.archivedevent'),
+        ),
+        migrations.AddField(
+            model_name='archivedreservation',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='core.archivedevent'),
+        ),
+        migrations.AddField(
+            model_name='archivedreservation',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='archivedreservation',
+            index=models.Index(fields=['user', 'time_and_date'], name='archivedres_user_time_idx'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.utils import timezone
 
 # Create your models here.
 
@@ -17,6 +18,19 @@ class ServiceProfessional(models.Model):
     def __str__(self):
         return self.name
 
+class EventQuerySet(models.QuerySet):
+    #time windows. upcoming is everything that hasn't ended yet, so it includes the events on right now (those can
+    #still be booked). past is newest first, the way the past events page lists them
+    def upcoming(self, now=None):
+        return self.filter(end_time__gte=now or timezone.now()).order_by('start_time_and_date', 'pk')
+
+    def current(self, now=None):
+        now = now or timezone.now()
+        return self.filter(start_time_and_date__lte=now, end_time__gte=now).order_by('start_time_and_date', 'pk')
+
+    def past(self, now=None):
+        return self.filter(end_time__lt=now or timezone.now()).order_by('-end_time', '-pk')
+
 class Event(models.Model):
     name = models.CharField(max_length=200)
     description = models.CharField(max_length=200)
@@ -24,6 +38,17 @@ class Event(models.Model):
     event_location = models.CharField(max_length=200)
     end_time = models.DateTimeField()
     services = models.ManyToManyField(Service)
+    updated_at = models.DateTimeField(auto_now=True) #Last-Modified for the calendar feeds
+
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            #"which events are on at this time" (booking checks, availability grid, calendar ranges)
+            models.Index(fields=['start_time_and_date', 'end_time'], name='event_window_idx'),
+            #upcoming (ended after now) and the past events page (newest end first, id is the tie breaker)
+            models.Index(fields=['end_time', 'id'], name='event_end_idx'),
+        ]
 
     #removed service relationship
     def __str__(self):
@@ -38,10 +63,52 @@ class Reservation(models.Model):
     professional = models.ForeignKey(ServiceProfessional, on_delete=models.CASCADE, null=True, blank=True) #just in case
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     services = models.ManyToManyField(Service)
+    updated_at = models.DateTimeField(auto_now=True) #Last-Modified for the calendar feeds
+
+    class Meta:
+        indexes = [
+            #the booking engine looks up "is this pro busy around this time" on every booking
+            models.Index(fields=['professional', 'time_and_date'], name='reservation_pro_time_idx'),
+            #admin appointments page pages through everything by time, id is the tie breaker
+            models.Index(fields=['time_and_date', 'id'], name='reservation_time_id_idx'),
+            #a user's appointments in time order
+            models.Index(fields=['user', 'time_and_date'], name='reservation_user_time_idx'),
+            #everything booked at one event in time order (availability, admin filter by event)
+            models.Index(fields=['event', 'time_and_date'], name='reservation_event_time_idx'),
+        ]
 
     def __str__(self):
        return f"Reservation for {self.event} by {self.user}"
 
+class WaitlistEntry(models.Model):
+    #someone who couldn't get an appointment because every pro who does their services was booked. when a reservation
+    #at the event is cancelled, core/waitlist.py books the longest waiting person that pro can take, at the freed time
+    WAITING = 'waiting'
+    PROMOTED = 'promoted'
+    LEFT = 'left'
+    STATUS_CHOICES = [
+        (WAITING, 'Waiting'),
+        (PROMOTED, 'Booked'),
+        (LEFT, 'Left the waitlist'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    username = models.CharField(max_length=200)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    services = models.ManyToManyField(Service)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=WAITING)
+    reservation = models.OneToOneField(Reservation, null=True, blank=True, on_delete=models.SET_NULL) #what they got
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            #promotion walks an event's waiters in the order they joined
+            models.Index(fields=['event', 'status', 'created_at', 'id'], name='waitlist_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.username} waiting for {self.event}"
+
 class Review(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     username = models.CharField(max_length=200)
@@ -50,6 +117,7 @@ class Review(models.Model):
     time_and_date = models.DateTimeField(auto_now=True)
 
     event = models.ForeignKey(Event, null=True, blank=True, on_delete=models.SET_NULL)
+    archived_event = models.ForeignKey('ArchivedEvent', null=True, blank=True, on_delete=models.SET_NULL, editable=False) #set when the event gets archived
     services = models.ManyToManyField(Service, blank=True)
 
     #https://www.youtube.com/watch?v=kc47J3qoLU4 ignore, putting it here in case i need to come back to it
@@ -62,5 +130,123 @@ class Review(models.Model):
     ]
 
     stars = models.IntegerField(choices=STAR_CHOICES)
+
+    class Meta:
+        indexes = [
+            #the reviews page lists newest first
+            models.Index(fields=['-time_and_date', '-id'], name='review_newest_idx'),
+        ]
+
+    def __str__(self):
+       return f"{self.name}"
+
+    @property
+    def any_event(self):
+        #the event whether it's still live or already archived
+        return self.event or self.archived_event
+
+class ArchivedEvent(models.Model):
+    #events that ended a while ago, moved out of Event by the archive_events command (core/archive.py).
+    #rows keep the id they had as an Event, so reviews and links still line up
+    id = models.BigIntegerField(primary_key=True)
+    name = models.CharField(max_length=200)
+    description = models.CharField(max_length=200)
+    start_time_and_date = models.DateTimeField()
+    event_location = models.CharField(max_length=200)
+    end_time = models.DateTimeField()
+    services = models.TextField(blank=True) #service names at the time, "; " between them
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['end_time', 'id'], name='archivedevent_end_idx'), #past events page, after the live ones
+        ]
+
+    def __str__(self):
+        return self.name
+
+class ArchivedReservation(models.Model):
+    id = models.BigIntegerField(primary_key=True) #same id it had as a Reservation
+    username = models.CharField(max_length=200)
+    time_and_date = models.DateTimeField()
+    event = models.ForeignKey(ArchivedEvent, on_delete=models.CASCADE, related_name='reservations')
+    professional = models.CharField(max_length=200, blank=True) #name, pros come and go
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    services = models.TextField(blank=True)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'time_and_date'], name='archivedres_user_time_idx'), #someone's history
+        ]
+
+    def __str__(self):
+       return f"Reservation for {self.event} by {self.user}"
+
+class Rating(models.Model):
+    #running totals of the reviews for one event or service, kept up to date by core/ratings.py as reviews change,
+    #so showing a rating is one row no matter how many reviews there are
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0) #sum of the stars
+    stars_1 = models.PositiveIntegerField(default=0) #how many reviews gave 1 star, and so on
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def average(self):
+        return round(self.total / self.count, 1) if self.count else None
+
+    def histogram(self):
+        #[(stars, reviews, percent)] from 5 stars down, for the bars on the page
+        rows = []
+        for stars in range(5, 0, -1):
+            reviews = getattr(self, f'stars_{stars}')
+            rows.append((stars, reviews, round(reviews * 100 / self.count) if self.count else 0))
+        return rows
+
+class EventRating(Rating):
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, primary_key=True, related_name='rating')
+
+    def __str__(self):
+        return f"{self.event}: {self.average} ({self.count} reviews)"
+
+class ServiceRating(Rating):
+    service = models.OneToOneField(Service, on_delete=models.CASCADE, primary_key=True, related_name='rating')
+
+    def __str__(self):
+        return f"{self.service}: {self.average} ({self.count} reviews)"
+
+class OutgoingEmail(models.Model):
+    #emails wait here until the send_queued_emails command sends them, so a slow or broken smtp server never breaks a booking
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'), #gave up after too many attempts
+    ]
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=200)
+    message = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now) #pushed back after every failure
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            #the worker only ever asks for "pending and due"
+            models.Index(fields=['status', 'next_attempt_at'], name='outgoingemail_due_idx'),
+        ]
+
     def __str__(self):
-       return f"{self.title}"
+        return f"{self.subject} to {self.to_email} ({self.status})"
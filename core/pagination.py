@@ -0,0 +1,63 @@
+import base64
+import heapq
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+#keyset ("cursor") pagination: instead of OFFSET, the next page starts right after the last row we showed.
+#the cost of a page doesn't grow with how deep you are, as long as there is an index on (field, id).
+
+
+class BadCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk):
+    if hasattr(value, 'isoformat'): #dates and datetimes
+        value = value.isoformat()
+    raw = json.dumps([value, pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor, field=None):
+    #field is the model field the page is ordered by. the value goes through it here, so a cursor that decodes fine
+    #but holds something that isn't a date (or whatever the field is) is a BadCursor, not an error from the filter
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if field is not None:
+            value = field.to_python(value)
+        if value is None:
+            raise ValueError("cursor without a value")
+        return value, int(pk)
+    except (ValueError, TypeError, ValidationError) as e:
+        raise BadCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+def keyset_page(queryset, field, cursor=None, page_size=50, descending=False):
+    #returns (rows, next_cursor). next_cursor is None on the last page
+    return keyset_page_across([queryset], field, cursor, page_size, descending)
+
+
+def keyset_page_across(querysets, field, cursor=None, page_size=50, descending=False):
+    #same thing over several tables at once, e.g. live events and archived ones. every table gives its next page and
+    #they're merged by (field, id), so rows from different tables can come in any order. the ids must not repeat
+    #between them
+    if cursor:
+        value, pk = decode_cursor(cursor, querysets[0].model._meta.get_field(field))
+    after = 'lt' if descending else 'gt'
+
+    pages = []
+    for queryset in querysets:
+        if descending:
+            queryset = queryset.order_by(f'-{field}', '-pk')
+        else:
+            queryset = queryset.order_by(field, 'pk')
+        if cursor:
+            queryset = queryset.filter(Q(**{f'{field}__{after}': value}) | Q(**{field: value, f'pk__{after}': pk}))
+        pages.append(list(queryset[:page_size + 1])) #one extra row tells us if there is a next page without a COUNT query
+
+    rows = list(heapq.merge(*pages, key=lambda row: (getattr(row, field), row.pk), reverse=descending))[:page_size + 1]
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(getattr(rows[-1], field), rows[-1].pk)
@@ -0,0 +1,54 @@
+from django.db.models import Count, F, Q, Sum
+from .models import Review, EventRating, ServiceRating
+
+#review totals per event and per service (EventRating/ServiceRating). core/signals.py calls add/remove as reviews
+#are written, inside the same transaction, so the totals can't drift from the reviews. the updates are
+#"count = count + 1" in the database, two reviews saved at once can't overwrite each other.
+#if they ever do get out of sync (bulk_create, raw sql) "python manage.py rebuild_ratings" recounts everything.
+
+
+def change(model, ids, stars, sign):
+    #adds (sign=1) or takes away (sign=-1) one review with this many stars from the ratings of these events/services
+    ids = [pk for pk in ids if pk is not None]
+    if not ids or stars not in range(1, 6):
+        return
+    key = model._meta.pk.attname #event_id or service_id
+    model.objects.bulk_create([model(**{key: pk}) for pk in ids], ignore_conflicts=True) #first review, start at zero
+    star_field = f'stars_{stars}'
+    model.objects.filter(pk__in=ids).update(
+        count=F('count') + sign,
+        total=F('total') + sign * stars,
+        **{star_field: F(star_field) + sign},
+    )
+
+
+def add(event_ids=(), service_ids=(), stars=None):
+    change(EventRating, event_ids, stars, 1)
+    change(ServiceRating, service_ids, stars, 1)
+
+
+def remove(event_ids=(), service_ids=(), stars=None):
+    change(EventRating, event_ids, stars, -1)
+    change(ServiceRating, service_ids, stars, -1)
+
+
+def totals(reviews, group_by, stars_field):
+    #one grouped query: {id: {'count', 'total', 'stars_1'...'stars_5'}}
+    rows = reviews.values(group_by).annotate(
+        count=Count('pk'),
+        total=Sum(stars_field),
+        **{f'stars_{stars}': Count('pk', filter=Q(**{stars_field: stars})) for stars in range(1, 6)},
+    ).order_by()
+    return {row.pop(group_by): row for row in rows}
+
+
+def rebuild():
+    #recounts every rating from the reviews
+    by_event = totals(Review.objects.exclude(event=None), 'event_id', 'stars')
+    by_service = totals(Review.services.through.objects.all(), 'service_id', 'review__stars')
+
+    EventRating.objects.all().delete()
+    ServiceRating.objects.all().delete()
+    EventRating.objects.bulk_create([EventRating(event_id=pk, **row) for pk, row in by_event.items()], batch_size=1000)
+    ServiceRating.objects.bulk_create([ServiceRating(service_id=pk, **row) for pk, row in by_service.items()], batch_size=1000)
+    return len(by_event), len(by_service)
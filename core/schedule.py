@@ -0,0 +1,138 @@
+from datetime import datetime, time, timedelta
+from django.core.cache import cache
+from django.utils import timezone
+from .booking import slot_length
+from .caching import get_content_version, bump_content_version
+from .models import Event, Reservation
+
+#a pro's schedule, day by day: their bookings, when they could be working (events that offer something they do),
+#the gaps between bookings and how much of the working time is booked.
+#the bookings for the whole range come from one query on the (professional, time_and_date) index, the events from
+#one more, and the rest is interval math in memory. every day is cached on its own, under a key with the content
+#version (event/service/pro changes) and the pro's generation in it. signals.py moves the generation when one of the
+#pro's reservations changes. nothing is deleted: a build that read the database before the change writes under the
+#old generation, which nobody reads anymore, so it can't put a stale day back.
+
+MAX_DAYS = 31
+TIMEOUT = 60 * 60 * 24
+
+
+#intervals are (start, end) tuples, a "set" of them is a sorted list that doesn't overlap
+
+def merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract(intervals, taken):
+    #the parts of intervals not covered by taken, both already merged
+    result = []
+    index = 0
+    for start, end in intervals:
+        while index < len(taken) and taken[index][1] <= start:
+            index += 1 #ends before this interval, and before every later one too
+        current, position = start, index
+        while position < len(taken) and taken[position][0] < end:
+            if taken[position][0] > current:
+                result.append((current, taken[position][0]))
+            current = max(current, taken[position][1])
+            position += 1
+        if current < end:
+            result.append((current, end))
+    return result
+
+
+def length(intervals):
+    return sum((end - start for start, end in intervals), timedelta())
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def generation_key(professional_id):
+    return f"schedule:generation:{professional_id}"
+
+
+def day_key(professional_id, day, version, generation):
+    return f"schedule:{version}:{professional_id}:{generation}:{day.isoformat()}"
+
+
+def build_days(professional, days):
+    #{day: schedule} for consecutive days, computed from the database
+    start, end = day_bounds(days[0])[0], day_bounds(days[-1])[1]
+    slot = slot_length()
+    reservations = (
+        Reservation.objects
+        .filter(professional=professional, time_and_date__gte=start, time_and_date__lt=end)
+        .select_related('event')
+        .prefetch_related('services')
+        .order_by('time_and_date', 'pk')
+    )
+    events = (
+        Event.objects
+        .filter(start_time_and_date__lt=end, end_time__gt=start, services__serviceprofessional=professional)
+        .distinct()
+    )
+
+    bookings_by_day = {day: [] for day in days}
+    for reservation in reservations:
+        bookings_by_day[timezone.localdate(reservation.time_and_date)].append({
+            'id': reservation.pk,
+            'start': reservation.time_and_date,
+            'end': reservation.time_and_date + slot,
+            'event': reservation.event.name,
+            'client': reservation.username,
+            'services': [service.name for service in reservation.services.all()],
+        })
+    working = [(event.start_time_and_date, event.end_time) for event in events]
+
+    result = {}
+    for day in days:
+        day_start, day_end = day_bounds(day)
+        work = merge((max(s, day_start), min(e, day_end)) for s, e in working if s < day_end and e > day_start)
+        booked = merge((booking['start'], booking['end']) for booking in bookings_by_day[day])
+        gaps = subtract(work, booked)
+        working_time, free_time = length(work), length(gaps)
+        result[day] = {
+            'day': day,
+            'bookings': bookings_by_day[day],
+            'working': work,
+            'gaps': gaps,
+            'working_minutes': int(working_time.total_seconds() // 60),
+            'booked_minutes': int((working_time - free_time).total_seconds() // 60),
+            'utilization': round((working_time - free_time) / working_time * 100) if working_time else None, #percent
+        }
+    return result
+
+
+def schedule(professional, first_day, days=1):
+    #[day schedule] for first_day and the days after it, cached days come from the cache and the rest from one
+    #round of queries covering just the missing ones
+    wanted = [first_day + timedelta(days=offset) for offset in range(days)]
+    #both read before the database is, see the top
+    version = get_content_version()
+    generation = get_content_version(generation_key(professional.pk))
+    keys = {day: day_key(professional.pk, day, version, generation) for day in wanted}
+    cached = cache.get_many(list(keys.values()))
+    found = {day: cached[key] for day, key in keys.items() if key in cached}
+
+    missing = [day for day in wanted if day not in found]
+    if missing:
+        span = [missing[0] + timedelta(days=offset) for offset in range((missing[-1] - missing[0]).days + 1)]
+        built = build_days(professional, span)
+        cache.set_many({keys[day]: built[day] for day in missing}, TIMEOUT)
+        found.update({day: built[day] for day in missing})
+    return [found[day] for day in wanted]
+
+
+def forget(slots):
+    #slots: (professional id, time) of reservations that were added, moved or removed
+    for professional_id in {professional_id for professional_id, _ in slots if professional_id}:
+        bump_content_version(generation_key(professional_id))
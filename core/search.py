@@ -0,0 +1,85 @@
+import re
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from .models import Service, Event, Review
+
+#full text search over services, events and reviews.
+#postgres: to_tsvector(...) @@ websearch_to_tsquery(...) with GIN indexes on the same expressions, ts_rank for ordering.
+#sqlite: FTS5 tables (core_<model>_search) that point at the real tables and are kept up to date by triggers,
+#bm25() for ordering and snippet() for the highlights.
+#both are created in migrations/0005_search.py. either way a search only touches rows that match.
+
+LIMIT = 10 #results per section
+CONFIG = 'english'
+START, STOP = '\x02', '\x03' #highlight markers, swapped for <mark> after the text is escaped
+
+SOURCES = {
+    #section: (model, fields searched, field the snippet comes from)
+    'services': (Service, ['name', 'service_description'], 'service_description'),
+    'events': (Event, ['name', 'description', 'event_location'], 'description'),
+    'reviews': (Review, ['text'], 'text'),
+}
+
+
+def highlight(text):
+    return mark_safe(escape(text).replace(START, '<mark>').replace(STOP, '</mark>'))
+
+
+def fts_query(query):
+    #every word has to match, the last one can be the start of a word (so "mani" finds manicure).
+    #quoting each word means nothing the user types is read as FTS5 syntax
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def search_sqlite(model, query, limit):
+    match = fts_query(query)
+    if match is None:
+        return []
+    table = f"{model._meta.db_table}_search"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, snippet({table}, -1, %s, %s, '…', 16) FROM {table} WHERE {table} MATCH %s ORDER BY bm25({table}) LIMIT %s",
+            [START, STOP, match, limit],
+        )
+        return cursor.fetchall()
+
+
+def search_postgres(model, fields, snippet_field, query, limit):
+    from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+
+    search_query = SearchQuery(query, search_type='websearch', config=CONFIG)
+    rows = (
+        model.objects
+        .annotate(document=SearchVector(*fields, config=CONFIG)) #same expression as the GIN index
+        .filter(document=search_query)
+        .annotate(
+            rank=SearchRank('document', search_query),
+            snippet=SearchHeadline(snippet_field, search_query, config=CONFIG, start_sel=START, stop_sel=STOP, max_words=16, min_words=8),
+        )
+        .order_by('-rank', 'pk')
+        .values_list('pk', 'snippet')[:limit]
+    )
+    return list(rows)
+
+
+def search(query, limit=LIMIT):
+    #{'services': [(service, snippet)], 'events': [...], 'reviews': [...]}, best match first
+    results = {section: [] for section in SOURCES}
+    if not query.strip():
+        return results
+    for section, (model, fields, snippet_field) in SOURCES.items():
+        if connection.vendor == 'postgresql':
+            hits = search_postgres(model, fields, snippet_field, query, limit)
+        else:
+            hits = search_sqlite(model, query, limit)
+
+        queryset = model.objects.all()
+        if model is Review:
+            queryset = queryset.select_related('event', 'archived_event', 'user')
+        objects = queryset.in_bulk([pk for pk, _ in hits])
+        results[section] = [(objects[pk], highlight(snippet or '')) for pk, snippet in hits if pk in objects]
+    return results
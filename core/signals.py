@@ -0,0 +1,187 @@
+from django.db import transaction
+from django.utils import timezone
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import Event, Reservation, Review, Service, ServiceProfessional
+from . import availability, ratings, schedule, waitlist
+from .caching import bump_content_version, bump_reviews_version
+
+#keeps the cached availability grids (core/availability.py), pro schedules (core/schedule.py), public pages
+#(core/caching.py) and review totals (core/ratings.py) in sync with the database. cache updates run on_commit so a booking that gets rolled back never
+#shows up in the cache
+
+
+@receiver(pre_save, sender=Reservation)
+def remember_old_slot(sender, instance, **kwargs):
+    #we need to know where the reservation used to be so that slot can be freed up again
+    instance._old_slot = None
+    if instance.pk:
+        instance._old_slot = Reservation.objects.filter(pk=instance.pk).values_list('professional_id', 'time_and_date').first()
+
+
+@receiver(post_save, sender=Reservation)
+def reservation_saved(sender, instance, **kwargs):
+    new_pro, new_time = instance.professional_id, instance.time_and_date
+    old = getattr(instance, '_old_slot', None)
+
+    def refresh():
+        if old and old[0] != new_pro:
+            availability.refresh_professional(old[0], [old[1]])
+            availability.refresh_professional(new_pro, [new_time])
+        elif old and old[1] != new_time:
+            availability.refresh_professional(new_pro, [old[1], new_time])
+        else:
+            availability.refresh_professional(new_pro, [new_time])
+    transaction.on_commit(refresh)
+
+
+@receiver(post_delete, sender=Reservation)
+def reservation_deleted(sender, instance, **kwargs):
+    professional_id, time_and_date = instance.professional_id, instance.time_and_date
+    transaction.on_commit(lambda: availability.refresh_professional(professional_id, [time_and_date]))
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def reservation_schedule_changed(sender, instance, **kwargs):
+    slots = [(instance.professional_id, instance.time_and_date)]
+    if getattr(instance, '_old_slot', None): #moved, maybe away from another pro
+        slots.append(instance._old_slot)
+    transaction.on_commit(lambda: schedule.forget(slots))
+
+
+@receiver(post_delete, sender=Reservation)
+def reservation_cancelled(sender, instance, **kwargs):
+    #the freed slot goes to the waitlist once the cancel has committed. robust: a failed promotion is logged, it
+    #doesn't turn the cancel the user already made into an error page
+    event_id, professional_id, time_and_date = instance.event_id, instance.professional_id, instance.time_and_date
+    transaction.on_commit(lambda: waitlist.promote(event_id, professional_id, time_and_date), robust=True)
+
+
+@receiver(m2m_changed, sender=Reservation.services.through)
+def reservation_services_changed(sender, instance, action, reverse, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and not reverse: #the schedule lists the services
+        slot = (instance.professional_id, instance.time_and_date)
+        transaction.on_commit(lambda: schedule.forget([slot]))
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: availability.build_grid(instance))
+
+
+@receiver(m2m_changed, sender=Event.services.through)
+def event_services_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(lambda: availability.build_grid(instance))
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    event_id = instance.pk
+    transaction.on_commit(lambda: availability.forget_event(event_id))
+
+
+@receiver(post_save, sender=ServiceProfessional)
+@receiver(post_delete, sender=ServiceProfessional)
+def professional_changed(sender, **kwargs):
+    transaction.on_commit(availability.forget_skills)
+
+
+@receiver(m2m_changed, sender=ServiceProfessional.services.through)
+def professional_services_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(availability.forget_skills)
+
+
+@receiver(pre_save, sender=Review)
+def remember_old_rating(sender, instance, **kwargs):
+    instance._old_rating = None
+    if instance.pk:
+        instance._old_rating = Review.objects.filter(pk=instance.pk).values_list('event_id', 'stars').first()
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    #services aren't set yet when a review is created, those are counted in review_services_changed.
+    #these run right away (not on_commit) so the totals commit or roll back together with the review
+    old = getattr(instance, '_old_rating', None)
+    new = (instance.event_id, instance.stars)
+    if old == new:
+        return
+    if old:
+        ratings.remove(event_ids=[old[0]], stars=old[1])
+    ratings.add(event_ids=[new[0]], stars=new[1])
+    if old and old[1] != new[1]:
+        service_ids = list(instance.services.values_list('pk', flat=True))
+        ratings.remove(service_ids=service_ids, stars=old[1])
+        ratings.add(service_ids=service_ids, stars=new[1])
+
+
+@receiver(m2m_changed, sender=Review.services.through)
+def review_services_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear': #nothing tells us which rows a clear removed, so look before they're gone
+        instance._cleared = set(
+            instance.review_set.values_list('pk', flat=True) if reverse else instance.services.values_list('pk', flat=True)
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared', set())
+    update = ratings.add if action == 'post_add' else ratings.remove
+    if reverse: #service.review_set.add(...), pk_set is reviews
+        for stars in Review.objects.filter(pk__in=pk_set).values_list('stars', flat=True):
+            update(service_ids=[instance.pk], stars=stars)
+    else:
+        update(service_ids=pk_set, stars=instance.stars)
+
+
+@receiver(pre_delete, sender=Review)
+def review_deleting(sender, instance, **kwargs):
+    #the services rows get deleted without an m2m_changed signal
+    instance._service_ids = list(instance.services.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    ratings.remove(event_ids=[instance.event_id], service_ids=getattr(instance, '_service_ids', []), stars=instance.stars)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=ServiceProfessional)
+@receiver(post_delete, sender=ServiceProfessional)
+def public_content_changed(sender, **kwargs):
+    transaction.on_commit(bump_content_version)
+
+
+@receiver(m2m_changed, sender=Event.services.through)
+@receiver(m2m_changed, sender=ServiceProfessional.services.through)
+def public_content_m2m_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(bump_content_version)
+
+
+#reviews only move the reviews version: the rating on the services and event pages and the reviews API, not every
+#cached page
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_content_changed(sender, **kwargs):
+    transaction.on_commit(bump_reviews_version)
+
+
+@receiver(m2m_changed, sender=Review.services.through)
+def review_content_m2m_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(bump_reviews_version)
+
+
+@receiver(m2m_changed, sender=Event.services.through)
+@receiver(m2m_changed, sender=Reservation.services.through)
+def touch_updated_at(sender, instance, action, reverse, **kwargs):
+    #changing services doesn't save the row, but the calendar feeds need Last-Modified/ETag to move
+    if action in ('post_add', 'post_remove', 'post_clear') and not reverse:
+        type(instance).objects.filter(pk=instance.pk).update(updated_at=timezone.now())
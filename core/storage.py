@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core import mail
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+from . import images
+
+
+class ResponsiveStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    #whitenoise's hashed + gzip/brotli storage, plus the resized copies of the slideshow images (see images.py)
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = {**paths, **images.build(self, paths)}
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+    def stored_name(self, name):
+        #before collectstatic has run there's no manifest at all, use the plain names instead of failing every page.
+        #only for development and the tests (the test runner is what sets mail.outbox): a production deploy that
+        #skipped collectstatic should fail loudly, not serve unhashed names that whitenoise then caches forever
+        if not self.hashed_files and (settings.DEBUG or hasattr(mail, 'outbox')):
+            return name
+        return super().stored_name(name)
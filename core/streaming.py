@@ -0,0 +1,29 @@
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+#StreamingHttpResponse for the big exports and feeds that works under both servers.
+#under ASGI (uvicorn) django reads a plain iterator with sync_to_async(list), which means the whole CSV/feed sits in
+#memory before the first byte goes out. there we hand it an async iterator instead, that pulls a batch of lines at a
+#time from the same .iterator() generator in django's sync thread (where its database cursor lives).
+#under WSGI the plain iterator is already streamed, and an async one would be the thing read into a list.
+
+BATCH_SIZE = 500 #lines per trip to the sync thread
+
+
+def streaming_response(request, content, **kwargs):
+    if isinstance(request, ASGIRequest):
+        content = batches(content)
+    return StreamingHttpResponse(content, **kwargs)
+
+
+async def batches(content):
+    content = iter(content)
+    next_batch = sync_to_async(lambda: list(islice(content, BATCH_SIZE))) #thread sensitive, same thread every time
+    try:
+        while batch := await next_batch():
+            yield ''.join(batch)
+    finally:
+        if hasattr(content, 'close'): #client went away, let the generator close its cursor
+            await sync_to_async(content.close)()
@@ -0,0 +1,28 @@
+from django import template
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from .. import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(path, alt='', sizes='100vw', lazy=True):
+    #{% responsive_image 'images/im1.jpg' alt='Slide 1' sizes='48vw' lazy=False %}
+    #a <picture> with avif/webp/jpeg srcsets when collectstatic made them (images.py), a plain <img> otherwise.
+    #lazy=False for whatever is on screen when the page opens, the rest only load once they're shown
+    loading = format_html(' loading="lazy" decoding="async"') if lazy else format_html(' fetchpriority="high"')
+    entry = images.read_manifest(staticfiles_storage).get(path)
+    if entry is None:
+        return format_html('<img src="{}" alt="{}"{}>', static(path), alt, loading)
+
+    def srcset(source):
+        return ', '.join(f"{static(name)} {width}w" for name, width in source['srcset'])
+
+    *modern, fallback = entry['sources']
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}"{}></picture>',
+        format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', ((source['type'], srcset(source), sizes) for source in modern)),
+        static(path), srcset(fallback), sizes, entry['width'], entry['height'], alt, loading,
+    )
@@ -1,3 +1,1354 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, time, timedelta
+from smtplib import SMTPException
+from unittest import mock
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Template, Context
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils.http import http_date
+from django.utils import timezone
+
+from .search import search
+from .imports import import_schedule
+from .archive import archive_events
+from .waitlist import promote
+from .models import Service, ServiceProfessional, Event, Reservation, Review, OutgoingEmail, EventRating, ServiceRating, ArchivedEvent, ArchivedReservation, WaitlistEntry
+from .booking import qualified_professionals, free_professionals, reserve_professional, AssignmentStrategy, LeastLoadedStrategy, check_assignment_setting
+from .emails import queue_email, send_queued_emails
+from .pagination import encode_cursor
+from .caching import get_content_version
+from .middleware import request_stats, QueryTimingMiddleware
+from . import availability, images, ratings, schedule, views
 
 # Create your tests here.
+
+#settings.py points the cache at files in the temp dir (or redis) that a dev server on the same machine uses too.
+#the tests clear the cache before every test, so they get one of their own in memory
+test_cache = override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cosmetology-tests',
+    }
+})
+
+
+@test_cache
+class BookingTestData(TestCase):
+    #shared setup: a few services, pros with different skills and one event offering everything
+    @classmethod
+    def setUpTestData(cls):
+        cls.cut = Service.objects.create(name="Haircut", service_description="cut")
+        cls.nails = Service.objects.create(name="Manicure", service_description="nails")
+        cls.facial = Service.objects.create(name="Facial", service_description="face")
+
+        cls.pro_all = ServiceProfessional.objects.create(name="Everything")
+        cls.pro_all.services.set([cls.cut, cls.nails, cls.facial])
+        cls.pro_cut = ServiceProfessional.objects.create(name="Cuts only")
+        cls.pro_cut.services.set([cls.cut])
+        cls.pro_cut_nails = ServiceProfessional.objects.create(name="Cuts and nails")
+        cls.pro_cut_nails.services.set([cls.cut, cls.nails])
+
+        cls.start = timezone.now() + timedelta(days=7)
+        cls.event = Event.objects.create(
+            name="Spring Clinic",
+            description="clinic",
+            start_time_and_date=cls.start,
+            event_location="ACC",
+            end_time=cls.start + timedelta(hours=4),
+        )
+        cls.event.services.set([cls.cut, cls.nails, cls.facial])
+
+        cls.user = User.objects.create_user(username="client", email="client@example.com", password="pw")
+
+    def setUp(self):
+        cache.clear() #the tests' locmem cache (test_cache above) lives for the whole test run
+
+
+class QualifiedProfessionalsTests(BookingTestData):
+    def test_only_pros_with_every_service_match(self):
+        pros = set(qualified_professionals([self.cut, self.nails]))
+        self.assertEqual(pros, {self.pro_all, self.pro_cut_nails})
+
+        pros = set(qualified_professionals([self.facial]))
+        self.assertEqual(pros, {self.pro_all})
+
+    def test_no_pro_returns_none(self):
+        lonely = Service.objects.create(name="Massage", service_description="nobody does this")
+        with transaction.atomic():
+            self.assertIsNone(reserve_professional([self.cut, lonely], self.start))
+
+    def test_query_count_does_not_grow_with_staff(self):
+        #the old loop did one query per pro per service, this should always be 1
+        with self.assertNumQueries(1):
+            list(free_professionals([self.cut, self.nails], self.start))
+
+        for i in range(20):
+            pro = ServiceProfessional.objects.create(name=f"Extra {i}")
+            pro.services.set([self.cut, self.nails])
+
+        with self.assertNumQueries(1):
+            list(free_professionals([self.cut, self.nails], self.start))
+
+
+class AssignmentStrategyTests(BookingTestData):
+    def book(self, pro, minutes, event=None):
+        Reservation.objects.create(username="client", time_and_date=self.start + timedelta(minutes=minutes), event=event or self.event, professional=pro, user=self.user)
+
+    def test_least_loaded_goes_first(self):
+        self.book(self.pro_all, 0)
+        self.book(self.pro_all, 60)
+        self.book(self.pro_cut, 120)
+        later = Event.objects.create(name="Later", description="x", start_time_and_date=self.start + timedelta(days=1), event_location="ACC", end_time=self.start + timedelta(days=1, hours=4))
+        for minutes in (0, 30, 60):
+            self.book(self.pro_cut_nails, 24 * 60 + minutes, later) #busy at another event, doesn't count here
+
+        candidates = free_professionals([self.cut], self.start + timedelta(minutes=180))
+        with self.assertNumQueries(1):
+            order = LeastLoadedStrategy().order(candidates, self.start, self.event)
+        self.assertEqual(order, [self.pro_cut_nails.pk, self.pro_cut.pk, self.pro_all.pk])
+        #no event: everything within 4 hours of the time counts
+        self.assertEqual(LeastLoadedStrategy().order(candidates, self.start)[-1], self.pro_all.pk)
+
+        with transaction.atomic():
+            self.assertEqual(reserve_professional([self.cut], self.start + timedelta(minutes=180), self.event), self.pro_cut_nails)
+
+    def test_unknown_strategy_fails_the_system_check(self):
+        self.assertEqual(check_assignment_setting(None), [])
+        with self.settings(APPOINTMENT_ASSIGNMENT="least-loaded"):
+            errors = check_assignment_setting(None)
+        self.assertEqual([error.id for error in errors], ['core.E001'])
+        with self.assertRaises(TypeError): #order() has to be implemented
+            type("Unfinished", (AssignmentStrategy,), {})()
+
+    def test_simulation_leaves_nothing_behind(self):
+        out = io.StringIO()
+        call_command("simulate_assignment", pros=3, hours=2, stdout=out)
+        self.assertIn("least_loaded", out.getvalue())
+        self.assertFalse(Service.objects.filter(name__startswith="Simulated").exists())
+
+
+class FreeProfessionalsTests(BookingTestData):
+    def book(self, professional, time_and_date):
+        reservation = Reservation.objects.create(
+            username=self.user.username, time_and_date=time_and_date,
+            event=self.event, professional=professional, user=self.user,
+        )
+        reservation.services.set([self.cut])
+        return reservation
+
+    def test_busy_pro_is_skipped(self):
+        self.book(self.pro_all, self.start + timedelta(minutes=10)) #overlaps a slot starting at self.start
+        pros = set(free_professionals([self.facial], self.start))
+        self.assertEqual(pros, set())
+        pros = set(free_professionals([self.cut], self.start))
+        self.assertEqual(pros, {self.pro_cut, self.pro_cut_nails})
+
+    def test_back_to_back_slots_do_not_conflict(self):
+        with self.settings(APPOINTMENT_SLOT_MINUTES=30):
+            self.book(self.pro_all, self.start)
+            pros = set(free_professionals([self.facial], self.start + timedelta(minutes=30)))
+        self.assertEqual(pros, {self.pro_all})
+
+
+class UserAppointmentAddTests(BookingTestData):
+    def test_booking_assigns_qualified_pro(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('Cosmetology:user_appointment_add', kwargs={'event_id': self.event.pk}),
+            {
+                'services': [self.cut.pk, self.nails.pk],
+                'time_and_date': timezone.localtime(self.start + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M'),
+            },
+        )
+        self.assertRedirects(response, reverse('Cosmetology:user_appointments'))
+        reservation = Reservation.objects.get()
+        self.assertIn(reservation.professional, [self.pro_all, self.pro_cut_nails])
+
+        #the email is only queued, nothing is sent during the request
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutgoingEmail.objects.get()
+        self.assertEqual(queued.to_email, "client@example.com")
+        self.assertIn("Spring Clinic", queued.message)
+
+    def test_full_slot_shows_error(self):
+        self.client.force_login(self.user)
+        url = reverse('Cosmetology:user_appointment_add', kwargs={'event_id': self.event.pk})
+        data = {
+            'services': [self.facial.pk], #only pro_all can do this
+            'time_and_date': timezone.localtime(self.start + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M'),
+        }
+        self.client.post(url, data)
+        response = self.client.post(url, data)
+        self.assertContains(response, "No professional is available at that time.")
+        self.assertEqual(Reservation.objects.count(), 1)
+
+
+@test_cache
+class ConcurrentBookingTests(TransactionTestCase):
+    #lots of people booking the same slot at once, only as many as there are free pros should get in.
+    #runs on whatever database is configured, so run it with DJANGO_DB=postgres too
+    def test_no_double_booking_under_race(self):
+        cut = Service.objects.create(name="Haircut", service_description="cut")
+        for i in range(3):
+            ServiceProfessional.objects.create(name=f"Pro {i}").services.set([cut])
+        start = timezone.now() + timedelta(days=1)
+        event = Event.objects.create(
+            name="Rush", description="rush", start_time_and_date=start,
+            event_location="ACC", end_time=start + timedelta(hours=2),
+        )
+        users = [User.objects.create_user(username=f"racer{i}", password="pw") for i in range(12)]
+
+        barrier = threading.Barrier(len(users))
+        errors = []
+
+        def book(user):
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    professional = reserve_professional([cut], start)
+                    if professional is not None:
+                        reservation = Reservation.objects.create(
+                            username=user.username, time_and_date=start,
+                            event=event, professional=professional, user=user,
+                        )
+                        reservation.services.set([cut])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(user,)) for user in users]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Reservation.objects.count(), 3)
+        self.assertEqual(Reservation.objects.values('professional').distinct().count(), 3)
+
+
+@test_cache
+class ConcurrentWaitlistTests(TransactionTestCase):
+    #several cancellations at the same moment, every freed slot goes to a different waiter
+    def test_each_waiter_promoted_once(self):
+        cut = Service.objects.create(name="Haircut", service_description="cut")
+        start = timezone.now() + timedelta(days=1)
+        event = Event.objects.create(name="Rush", description="rush", start_time_and_date=start, event_location="ACC", end_time=start + timedelta(hours=2))
+        slots = []
+        for i in range(4):
+            pro = ServiceProfessional.objects.create(name=f"Pro {i}")
+            pro.services.set([cut])
+            slots.append((pro.pk, start + timedelta(hours=i % 2)))
+        for i in range(6):
+            user = User.objects.create_user(username=f"waiter{i}", password="pw")
+            WaitlistEntry.objects.create(user=user, username=user.username, event=event).services.set([cut])
+
+        barrier = threading.Barrier(len(slots))
+        errors = []
+
+        def cancel(professional_id, time_and_date):
+            try:
+                barrier.wait()
+                promote(event.pk, professional_id, time_and_date)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=cancel, args=slot) for slot in slots]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Reservation.objects.count(), 4)
+        self.assertEqual(Reservation.objects.values('user').distinct().count(), 4)
+        self.assertEqual(WaitlistEntry.objects.filter(status=WaitlistEntry.PROMOTED, reservation__isnull=False).count(), 4)
+
+
+@test_cache
+class OutboxTests(TestCase):
+    #the test runner swaps in the locmem email backend, so sent mail ends up in mail.outbox
+    def test_worker_sends_batch_and_marks_sent(self):
+        for i in range(3):
+            queue_email(f"user{i}@example.com", "Hi", "body")
+
+        call_command("send_queued_emails", batch_size=2, stdout=mock.MagicMock())
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(OutgoingEmail.objects.filter(status=OutgoingEmail.SENT).count(), 3)
+        self.assertEqual(send_queued_emails(), (0, 0)) #nothing sent twice
+
+    @mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages", side_effect=SMTPException("boom"))
+    def test_failure_backs_off_then_gives_up(self, send_messages):
+        email = queue_email("user@example.com", "Hi", "body")
+
+        with self.settings(EMAIL_MAX_ATTEMPTS=2, EMAIL_RETRY_BASE_SECONDS=60):
+            self.assertEqual(send_queued_emails(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual(email.status, OutgoingEmail.PENDING)
+            self.assertEqual(email.attempts, 1)
+            self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=50))
+            self.assertIn("boom", email.last_error)
+
+            self.assertEqual(send_queued_emails(), (0, 0)) #not due yet
+
+            OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+            send_queued_emails()
+            email.refresh_from_db()
+            self.assertEqual(email.status, OutgoingEmail.FAILED)
+            self.assertEqual(email.attempts, 2)
+
+
+class ReviewsPageTests(BookingTestData):
+    def add_reviews(self, count):
+        reviews = Review.objects.bulk_create([
+            Review(user=self.user, username=self.user.username, name=f"Review {i}", text="great", stars=5, event=self.event)
+            for i in range(count)
+        ])
+        Through = Review.services.through
+        Through.objects.bulk_create(
+            [Through(review_id=review.pk, service_id=self.cut.pk) for review in reviews]
+            + [Through(review_id=review.pk, service_id=self.nails.pk) for review in reviews]
+        )
+
+    def count_page_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('Cosmetology:reviews'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_stays_flat(self):
+        self.add_reviews(10)
+        small = self.count_page_queries()
+        self.add_reviews(10000 - 10)
+        self.assertEqual(self.count_page_queries(), small)
+
+    def test_reviews_are_paginated(self):
+        self.add_reviews(25)
+        response = self.client.get(reverse('Cosmetology:reviews'))
+        self.assertEqual(len(response.context['review_list']), 20)
+        self.assertContains(response, "Older reviews")
+        response = self.client.get(reverse('Cosmetology:reviews') + "?page=2")
+        self.assertEqual(len(response.context['review_list']), 5)
+
+
+class AdminAppointmentsTests(BookingTestData):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.create_superuser(username="boss", email="boss@example.com", password="pw")
+
+    def add_reservations(self, count, professional=None, service=None):
+        Through = Reservation.services.through
+        reservations = Reservation.objects.bulk_create([
+            Reservation(
+                username=self.user.username, user=self.user, event=self.event,
+                professional=professional or self.pro_all,
+                time_and_date=self.start + timedelta(minutes=i),
+            )
+            for i in range(count)
+        ])
+        Through.objects.bulk_create([Through(reservation_id=r.pk, service_id=(service or self.cut).pk) for r in reservations])
+        return reservations
+
+    def get_page(self, query=""):
+        return self.client.get(reverse('Cosmetology:admin_user_appointments') + query)
+
+    def test_walks_every_page_once(self):
+        self.client.force_login(self.admin)
+        created = self.add_reservations(120)
+        seen = []
+        response = self.get_page()
+        while True:
+            seen += [r.pk for r in response.context['object_list']]
+            if 'next_page_query' not in response.context:
+                break
+            response = self.get_page("?" + response.context['next_page_query'])
+        self.assertEqual(seen, [r.pk for r in created])
+
+    def test_page_query_count_is_fixed(self):
+        self.client.force_login(self.admin)
+        self.add_reservations(10)
+        with CaptureQueriesContext(connection) as small:
+            self.get_page()
+        self.add_reservations(200)
+        with CaptureQueriesContext(connection) as big:
+            self.get_page()
+        self.assertEqual(len(small), len(big))
+
+    def test_filters(self):
+        self.client.force_login(self.admin)
+        self.add_reservations(3)
+        nails = self.add_reservations(2, professional=self.pro_cut_nails, service=self.nails)
+
+        response = self.get_page(f"?professional={self.pro_cut_nails.pk}")
+        self.assertEqual([r.pk for r in response.context['object_list']], [r.pk for r in nails])
+        response = self.get_page(f"?service={self.nails.pk}")
+        self.assertEqual(len(response.context['object_list']), 2)
+
+        day = timezone.localtime(self.start).date()
+        response = self.get_page(f"?start_date={day + timedelta(days=1)}")
+        self.assertEqual(len(response.context['object_list']), 0)
+        response = self.get_page(f"?start_date={day}&end_date={day}&event={self.event.pk}")
+        self.assertEqual(len(response.context['object_list']), 5)
+
+    def test_csv_export_streams_filtered_rows(self):
+        self.add_reservations(30)
+        self.add_reservations(5, professional=self.pro_cut_nails, service=self.nails)
+        url = reverse('Cosmetology:admin_user_appointments_export')
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(url, {'service': self.nails.pk})
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(rows[0][0], "ID")
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][6:], ["Cuts and nails", "Manicure"])
+
+        with CaptureQueriesContext(connection) as small:
+            b"".join(self.client.get(url).streaming_content)
+        self.add_reservations(100)
+        with CaptureQueriesContext(connection) as big:
+            b"".join(self.client.get(url).streaming_content)
+        self.assertEqual(len(small), len(big)) #services are prefetched per chunk, not per row
+
+    def test_bad_filters_are_not_ignored(self):
+        self.client.force_login(self.admin)
+        self.add_reservations(3)
+        response = self.get_page("?start_date=2026-13-01")
+        self.assertEqual(len(response.context['object_list']), 0)
+        self.assertTrue(response.context['filter_form'].errors)
+        url = reverse('Cosmetology:admin_user_appointments_export')
+        self.assertEqual(self.client.get(url, {'start_date': "2026-13-01"}).status_code, 400)
+
+    def test_csv_export_escapes_formulas(self):
+        self.client.force_login(self.admin)
+        ServiceProfessional.objects.filter(pk=self.pro_all.pk).update(name="=HYPERLINK(\"http://evil\")")
+        reservation, = self.add_reservations(1)
+        User.objects.filter(pk=reservation.user_id).update(username="@SUM(A1)")
+        response = self.client.get(reverse('Cosmetology:admin_user_appointments_export'))
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(rows[1][6], "'=HYPERLINK(\"http://evil\")")
+        self.assertEqual(rows[1][4], "'@SUM(A1)")
+        self.assertEqual(rows[1][7], "Haircut")
+
+    def test_bad_cursor(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.get_page("?after=nonsense").status_code, 400)
+        #decodes fine, but the value isn't a date
+        for cursor in [encode_cursor("notadate", 1), encode_cursor(None, 1), encode_cursor({"a": 1}, 1)]:
+            self.assertEqual(self.get_page(f"?after={cursor}").status_code, 400)
+            self.assertEqual(self.client.get(reverse('Cosmetology:api_events'), {'after': cursor}).status_code, 400)
+            self.assertEqual(self.client.get(reverse('Cosmetology:api_reviews'), {'after': cursor}).status_code, 400)
+            self.assertEqual(self.client.get(reverse('Cosmetology:past_events'), {'after': cursor}).status_code, 400)
+
+
+class AvailabilityGridTests(BookingTestData):
+    def book(self, professional, time_and_date):
+        with self.captureOnCommitCallbacks(execute=True): #the grid is updated after commit
+            reservation = Reservation.objects.create(
+                username=self.user.username, time_and_date=time_and_date,
+                event=self.event, professional=professional, user=self.user,
+            )
+        return reservation
+
+    def open_times(self, services):
+        return [start for start, pros in availability.open_slots(self.event, [s.pk for s in services])]
+
+    def test_grid_has_a_slot_per_slot_length(self):
+        with self.settings(APPOINTMENT_SLOT_MINUTES=30):
+            self.assertEqual(len(self.open_times([self.facial])), 8) #4 hour event
+
+    def test_booking_updates_cached_grid_without_rebuild(self):
+        with self.settings(APPOINTMENT_SLOT_MINUTES=30):
+            availability.get_grid(self.event)
+            availability.get_skills()
+            self.book(self.pro_all, self.start)
+            with self.assertNumQueries(0): #served from the updated cache
+                times = self.open_times([self.facial])
+            self.assertNotIn(self.start, times)
+            self.assertIn(self.start + timedelta(minutes=30), times)
+            #other pros can still do haircuts at that time
+            self.assertIn(self.start, self.open_times([self.cut]))
+
+    def test_moving_and_cancelling_frees_the_slot(self):
+        with self.settings(APPOINTMENT_SLOT_MINUTES=30):
+            availability.get_grid(self.event)
+            reservation = self.book(self.pro_all, self.start)
+            reservation.time_and_date = self.start + timedelta(hours=1)
+            with self.captureOnCommitCallbacks(execute=True):
+                reservation.save()
+            times = self.open_times([self.facial])
+            self.assertIn(self.start, times)
+            self.assertNotIn(self.start + timedelta(hours=1), times)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                reservation.delete()
+            self.assertIn(self.start + timedelta(hours=1), self.open_times([self.facial]))
+
+    def test_concurrent_refreshes_keep_both_bookings(self):
+        #two bookings for different pros, committed in different workers: the second refresh runs while the first is
+        #between reading the cache and writing it. neither may lose the other's booking
+        with self.settings(APPOINTMENT_SLOT_MINUTES=30):
+            availability.get_grid(self.event)
+            with self.captureOnCommitCallbacks() as first:
+                Reservation.objects.create(username="client", time_and_date=self.start, event=self.event, professional=self.pro_all, user=self.user)
+            with self.captureOnCommitCallbacks() as second:
+                Reservation.objects.create(username="client", time_and_date=self.start, event=self.event, professional=self.pro_cut, user=self.user)
+
+            busy_slots_for = availability.busy_slots_for
+            def run_second_in_between(*args):
+                if second:
+                    second.pop(0)() #the other worker's refresh (the first callback) lands right now
+                    second.clear()
+                return busy_slots_for(*args)
+            with mock.patch.object(availability, 'busy_slots_for', run_second_in_between):
+                first[0]()
+
+            free = dict(availability.open_slots(self.event, [self.cut.pk]))[self.start]
+            self.assertEqual(free, [self.pro_cut_nails.pk])
+
+    def test_new_skill_shows_up(self):
+        self.assertEqual(availability.open_slots(self.event, [self.facial.pk])[0][1], [self.pro_all.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pro_cut.services.add(self.facial)
+        self.assertEqual(
+            set(availability.open_slots(self.event, [self.facial.pk])[0][1]),
+            {self.pro_all.pk, self.pro_cut.pk},
+        )
+
+    def test_booking_page_lists_open_times(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('Cosmetology:user_appointment_add', kwargs={'event_id': self.event.pk}))
+        self.assertContains(response, "Open times")
+        self.assertTrue(response.context['open_slots'])
+
+
+class PublicPageCacheTests(BookingTestData):
+    def test_tests_never_touch_the_shared_cache(self):
+        self.assertIsInstance(caches['default'], LocMemCache)
+
+    def test_anonymous_page_served_from_cache(self):
+        url = reverse('Cosmetology:services')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, "HAIRCUT")
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('Cosmetology:cache_stats'))
+        self.assertEqual(response.status_code, 403) #admins only
+
+    def test_junk_query_strings_share_one_entry(self):
+        url = reverse('Cosmetology:services')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            for i in range(5):
+                self.assertContains(self.client.get(url, {'x': i}), "HAIRCUT")
+        self.assertEqual(cache.get("public_pages:misses"), 1)
+
+        #past events reads ?after, so that one does get its own entry
+        url = reverse('Cosmetology:past_events')
+        self.client.get(url)
+        self.client.get(url, {'after': encode_cursor(timezone.now().isoformat(), 1)})
+        self.assertEqual(cache.get("public_pages:misses"), 3)
+
+    def test_edit_shows_up_immediately(self):
+        url = reverse('Cosmetology:event_detail', kwargs={'pk': self.event.pk})
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Service.objects.create(name="Massage", service_description="relax")
+            self.event.services.add(Service.objects.get(name="Massage"))
+        self.assertContains(self.client.get(url), "Massage")
+
+    def test_logged_in_nav_is_not_shared(self):
+        url = reverse('Cosmetology:index')
+        self.client.get(url) #cached for anonymous
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertContains(response, "Logout")
+        self.assertNotContains(response, "Sign up")
+
+        admin = User.objects.create_superuser(username="boss", email="boss@example.com", password="pw")
+        self.client.force_login(admin)
+        response = self.client.get(url)
+        self.assertContains(response, reverse('Cosmetology:service_edit', kwargs={'pk': self.cut.pk})) #not the user's cached fragment
+
+        stats = self.client.get(reverse('Cosmetology:cache_stats')).json()
+        self.assertEqual(stats['misses'], 1)
+
+
+@test_cache
+class FillDatUpTests(TestCase):
+    def fill(self):
+        call_command("fill_dat_up", users=20, pros=5, events=4, reservations=60, reviews=10, seed=3, start="2026-01-05", stdout=mock.MagicMock())
+        return list(Reservation.objects.order_by('time_and_date', 'professional__name').values_list('time_and_date', 'professional__name', 'user__username'))
+
+    def test_same_seed_same_data(self):
+        first = self.fill()
+        self.assertTrue(first)
+        self.assertEqual(self.fill(), first) #running again replaces the data instead of adding to it
+
+    def test_generated_reservations_follow_booking_rules(self):
+        self.fill()
+        for reservation in Reservation.objects.prefetch_related('services', 'professional__services'):
+            self.assertTrue(set(reservation.services.all()) <= set(reservation.professional.services.all()))
+            self.assertTrue(reservation.event.start_time_and_date <= reservation.time_and_date < reservation.event.end_time)
+        pairs = list(Reservation.objects.values_list('professional_id', 'time_and_date'))
+        self.assertEqual(len(pairs), len(set(pairs)))
+
+    @override_settings(APPOINTMENT_SLOT_MINUTES=60)
+    def test_uses_the_configured_slot_length(self):
+        self.fill()
+        for reservation in Reservation.objects.select_related('event'):
+            self.assertEqual((reservation.time_and_date - reservation.event.start_time_and_date) % timedelta(hours=1), timedelta())
+            self.assertFalse(
+                Reservation.objects
+                .filter(professional=reservation.professional_id, time_and_date__gt=reservation.time_and_date - timedelta(hours=1), time_and_date__lt=reservation.time_and_date + timedelta(hours=1))
+                .exclude(pk=reservation.pk).exists()
+            )
+
+    def test_generated_users_can_log_in(self):
+        #the load_test command logs in through the real form, so email verification can't get in the way
+        self.fill()
+        response = self.client.post(reverse('account_login'), {'login': "loadgen_0", 'password': "password123"})
+        self.assertRedirects(response, "/", fetch_redirect_response=False)
+
+
+class SessionCacheTests(BookingTestData):
+    def test_logged_in_requests_read_the_session_from_cache(self):
+        self.client.force_login(self.user)
+        url = reverse('Cosmetology:user_appointment_pick_event_create')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertFalse([query for query in queries if 'django_session' in query['sql']])
+
+    def test_session_survives_cache_loss(self):
+        self.client.force_login(self.user)
+        cache.clear() #e.g. redis restarted, the database copy takes over
+        self.assertEqual(self.client.get(reverse('Cosmetology:user_appointment_pick_event_create')).status_code, 200)
+
+
+class RatingTests(BookingTestData):
+    def review(self, stars, services=(), event=None):
+        review = Review.objects.create(user=self.user, username="client", name="R", text="ok", stars=stars, event=event or self.event)
+        review.services.set(services)
+        return review
+
+    def snapshot(self):
+        fields = ('count', 'total', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5')
+        return ( #rows that went back to zero stay around, they mean the same as no row
+            sorted(EventRating.objects.filter(count__gt=0).values_list('pk', *fields)),
+            sorted(ServiceRating.objects.filter(count__gt=0).values_list('pk', *fields)),
+        )
+
+    def test_totals_follow_every_kind_of_change(self):
+        other = Event.objects.create(name="Fall", description="d", start_time_and_date=self.start, end_time=self.start + timedelta(hours=1), event_location="ACC")
+        first = self.review(5, [self.cut, self.nails])
+        second = self.review(2, [self.cut])
+        rating = EventRating.objects.get(event=self.event)
+        self.assertEqual((rating.count, rating.total, rating.average), (2, 7, 3.5))
+        self.assertEqual(ServiceRating.objects.get(service=self.cut).stars_5, 1)
+
+        first.stars = 4 #edited
+        first.save()
+        second.event = other #moved to another event
+        second.save()
+        second.services.remove(self.cut)
+        first.services.clear()
+        first.services.add(self.facial)
+        self.cut.review_set.add(second) #from the other side
+        incremental = self.snapshot()
+
+        ratings.rebuild()
+        self.assertEqual(self.snapshot(), incremental) #same as counting from scratch
+
+        first.delete()
+        second.delete()
+        self.assertEqual(self.snapshot(), ([], []))
+
+    def test_shown_on_pages_without_extra_queries(self):
+        for stars in (5, 4, 4):
+            self.review(stars, [self.cut])
+        response = self.client.get(reverse('Cosmetology:services'))
+        self.assertContains(response, "4.3 / 5")
+        self.assertContains(response, "No reviews yet.")
+        for _ in range(20):
+            self.review(3, [self.nails, self.facial])
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertContains(self.client.get(reverse('Cosmetology:services')), "from 20 reviews")
+        self.assertLess(len(queries), 5)
+        response = self.client.get(reverse('Cosmetology:event_detail', kwargs={'pk': self.event.pk}))
+        self.assertContains(response, "from 23 reviews")
+
+    def test_reviews_only_move_the_reviews_version(self):
+        #a new review refreshes the rating on the services page, the other cached pages stay cached
+        url = reverse('Cosmetology:services')
+        self.client.get(url)
+        self.client.get(reverse('Cosmetology:service_providers'))
+        content_version = get_content_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.review(5, [self.cut])
+        self.assertEqual(get_content_version(), content_version)
+        self.assertContains(self.client.get(url), "5.0 / 5")
+        hits = cache.get("public_pages:hits", 0)
+        self.client.get(reverse('Cosmetology:service_providers'))
+        self.assertEqual(cache.get("public_pages:hits"), hits + 1)
+
+    def test_fill_dat_up_counts_its_reviews(self):
+        call_command("fill_dat_up", users=10, pros=3, events=3, reservations=10, reviews=30, seed=1, stdout=mock.MagicMock())
+        self.assertEqual(sum(EventRating.objects.values_list('count', flat=True)), Review.objects.exclude(event=None).count())
+
+
+class SearchTests(BookingTestData):
+    def review(self, text):
+        return Review.objects.create(user=self.user, username="client", name="R", text=text, stars=5, event=self.event)
+
+    def test_finds_highlights_and_ranks(self):
+        self.review("Great braids, very neat")
+        best = self.review("Braids braids braids!")
+        self.review("The haircut was fine")
+        results = search("braid")
+        self.assertEqual([review for review, _ in results['reviews']][0], best)
+        self.assertEqual(len(results['reviews']), 2)
+        self.assertIn("<mark>", results['reviews'][0][1])
+        self.assertEqual([service for service, _ in search("mani")['services']], [self.nails]) #prefix of manicure
+        self.assertEqual([event for event, _ in search("spring")['events']], [self.event])
+
+    def test_index_follows_edits_and_deletes(self):
+        review = self.review("lovely nails")
+        review.text = "lovely curls"
+        review.save()
+        self.assertFalse(search("nails")['reviews'])
+        self.assertTrue(search("curls")['reviews'])
+        review.delete()
+        self.assertFalse(search("curls")['reviews'])
+
+    def test_user_text_is_escaped_and_not_query_syntax(self):
+        self.review('<script>alert("hi")</script> nice')
+        snippet = search("nice")['reviews'][0][1]
+        self.assertNotIn("<script>", snippet)
+        self.assertIn("&lt;script&gt;", snippet)
+        for query in ['"', 'nice OR', '(nice', 'NEAR(a b)', '*', '']:
+            search(query) #doesn't raise
+
+    def test_search_page(self):
+        self.review("Fantastic facial")
+        response = self.client.get(reverse('Cosmetology:search'), {'q': "facial"})
+        self.assertContains(response, "<mark>Fantastic</mark>", count=0)
+        self.assertContains(response, "<mark>facial</mark>")
+        self.assertContains(response, "No events match.")
+
+
+class ImportScheduleTests(BookingTestData):
+    def run_import(self, text, kind, **options):
+        return import_schedule(io.StringIO(text), kind, **options)
+
+    def test_csv_events_upsert_and_report_bad_rows(self):
+        result = self.run_import(
+            "name,start,end,location,description,services\n"
+            "Spring Clinic,{start},{end},Room 5,updated,Haircut;manicure\n"
+            "Fall Clinic,2026-09-08 09:00,2026-09-08 13:00,Gym,\"two\nlines\",Facial\n"
+            "Broken,2026-13-01 09:00,2026-09-08 13:00,Gym,x,\n"
+            "Backwards,2026-09-08 13:00,2026-09-08 09:00,Gym,x,\n"
+            "Unknown,2026-09-09 09:00,2026-09-09 13:00,Gym,x,Tattoos\n".format(
+                start=timezone.localtime(self.start).isoformat(), end=timezone.localtime(self.start + timedelta(hours=5)).isoformat()),
+            'events_csv',
+        )
+        self.assertEqual((result.created, result.updated), (1, 1))
+        self.assertEqual([line for line, _ in result.errors], [5, 6, 7]) #the quoted new line counts
+        self.assertIn("Tattoos", result.errors[2][1])
+
+        self.event.refresh_from_db()
+        self.assertEqual((self.event.event_location, self.event.description), ("Room 5", "updated"))
+        self.assertEqual(set(self.event.services.all()), {self.cut, self.nails}) #replaced, not added to
+        fall = Event.objects.get(name="Fall Clinic")
+        self.assertEqual(fall.description, "two\nlines")
+        self.assertEqual(list(fall.services.all()), [self.facial])
+
+    def test_updates_that_strand_reservations_are_errors(self):
+        booked = Reservation.objects.create(username="client", user=self.user, event=self.event, professional=self.pro_all, time_and_date=self.start + timedelta(hours=3))
+        booked.services.set([self.facial])
+        def update(hours, services):
+            return self.run_import(
+                "name,start,end,location,description,services\n"
+                f"Spring Clinic,{timezone.localtime(self.start).isoformat()},{timezone.localtime(self.start + timedelta(hours=hours)).isoformat()},Gym,x,{services}\n",
+                'events_csv',
+            )
+
+        result = update(2, "Haircut;Facial")
+        self.assertEqual((result.updated, [line for line, _ in result.errors]), (0, [2]))
+        self.assertIn("after the new end time", result.errors[0][1])
+        result = update(5, "Haircut")
+        self.assertEqual(result.updated, 0)
+        self.assertIn("reservations for Facial", result.errors[0][1])
+        self.event.refresh_from_db()
+        self.assertEqual((self.event.end_time, self.event.event_location), (self.start + timedelta(hours=4), "ACC"))
+        self.assertEqual(self.event.services.count(), 3)
+
+        result = update(3, "Facial") #the last booking still fits
+        self.assertEqual((result.updated, result.errors), (1, []))
+        self.assertEqual(list(self.event.services.all()), [self.facial])
+
+    def test_ics_events(self):
+        result = self.run_import(
+            "BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\n"
+            "SUMMARY:Braids\\, twists and more\r\n"
+            "DTSTART;TZID=America/Chicago:20260915T090000\r\n"
+            "DTEND:20260915T190000Z\r\n"
+            "LOCATION:Room 2\r\n"
+            "DESCRIPTION:A very long description that the calendar program folded onto\r\n  a second line\\nand a third\r\n"
+            "CATEGORIES:Haircut,Mystery\r\n"
+            "END:VEVENT\r\nBEGIN:VEVENT\r\nSUMMARY:All day\r\nDTSTART;VALUE=DATE:20260916\r\nDTEND;VALUE=DATE:20260917\r\n"
+            "END:VEVENT\r\nEND:VCALENDAR\r\n",
+            'events_ics', create_services=True,
+        )
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.errors[0][0], 11)
+        event = Event.objects.get(name="Braids, twists and more")
+        self.assertEqual(event.start_time_and_date.isoformat(), "2026-09-15T14:00:00+00:00")
+        self.assertEqual(event.description, "A very long description that the calendar program folded onto a second line\nand a third")
+        self.assertEqual(sorted(service.name for service in event.services.all()), ["Haircut", "Mystery"])
+
+    def test_professionals_and_dry_run(self):
+        text = "name,services\nCuts only,Haircut;Facial\nNew Pro,Manicure\n,Haircut\n"
+        result = self.run_import(text, 'professionals_csv', dry_run=True)
+        self.assertEqual((result.created, result.updated, len(result.errors)), (1, 1, 1))
+        self.assertFalse(ServiceProfessional.objects.filter(name="New Pro").exists())
+
+        self.run_import(text, 'professionals_csv')
+        self.assertEqual(set(self.pro_cut.services.all()), {self.cut, self.facial})
+        self.assertEqual(list(ServiceProfessional.objects.get(name="New Pro").services.all()), [self.nails])
+        self.assertIn(self.pro_cut.pk, [pk for _, free in availability.open_slots(self.event, [self.facial.pk]) for pk in free])
+
+    def test_admin_upload(self):
+        upload = SimpleUploadedFile("fall.csv", "\ufeffname,start,end,location,description,services\nFall,2026-09-08 09:00,2026-09-08 13:00,Gym,Fall clinic,Facial\n".encode())
+        url = reverse('Cosmetology:import_schedule')
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(url, {'file': upload}).status_code, 403)
+
+        admin = User.objects.create_superuser(username="boss", email="boss@example.com", password="pw")
+        self.client.force_login(admin)
+        upload.seek(0)
+        response = self.client.post(url, {'file': upload})
+        self.assertContains(response, "1 created, 0 updated, 0 rows with errors")
+        self.assertTrue(Event.objects.filter(name="Fall").exists())
+
+
+@test_cache
+class ResponsiveImageTests(TestCase):
+    def setUp(self):
+        images.read_manifest.cache_clear()
+        self.addCleanup(images.read_manifest.cache_clear)
+
+    def render(self, tag):
+        return Template("{% load responsive_images %}" + tag).render(Context())
+
+    def test_plain_img_before_collectstatic(self):
+        html = self.render("{% responsive_image 'images/im2.jpeg' alt='Slide 2' %}")
+        self.assertEqual(html, '<img src="/static/images/im2.jpeg" alt="Slide 2" loading="lazy" decoding="async">')
+
+    def test_missing_manifest_fails_outside_debug(self):
+        outbox = mail.outbox
+        del mail.outbox #what a production process looks like: no test runner
+        self.addCleanup(setattr, mail, 'outbox', outbox)
+        with self.assertRaisesMessage(ValueError, "Missing staticfiles manifest entry"):
+            self.render("{% load static %}{% static 'images/im2.jpeg' %}")
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.render("{% load static %}{% static 'images/im2.jpeg' %}"), "/static/images/im2.jpeg")
+
+    def test_collectstatic_makes_smaller_copies(self):
+        from PIL import Image
+
+        source, root = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        self.addCleanup(root.cleanup)
+        os.mkdir(os.path.join(source.name, 'images'))
+        Image.new('RGB', (1000, 500), 'red').save(os.path.join(source.name, 'images', 'photo.jpg'))
+
+        settings = override_settings(
+            STATICFILES_DIRS=[source.name], STATIC_ROOT=root.name,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        )
+        with settings, mock.patch.object(images, 'SOURCES', ['images/photo.jpg']):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            html = self.render("{% responsive_image 'images/photo.jpg' alt='Photo' sizes='48vw' lazy=False %}")
+
+        self.assertTrue(os.path.exists(os.path.join(root.name, 'images', 'photo.480w.avif')))
+        self.assertIn('<source type="image/avif" srcset="/static/images/photo.480w.', html)
+        self.assertIn('<source type="image/webp"', html)
+        self.assertRegex(html, r'srcset="/static/images/photo\.480w\.\w+\.jpg 480w, /static/images/photo\.800w\.\w+\.jpg 800w, /static/images/photo\.1000w\.\w+\.jpg 1000w"')
+        self.assertIn('width="1000" height="500" alt="Photo" fetchpriority="high"', html) #hashed names, no upscaling
+
+
+class EventWindowTests(BookingTestData):
+    def make_event(self, name, start, hours=4):
+        event = Event.objects.create(name=name, description=name, start_time_and_date=start, event_location="ACC", end_time=start + timedelta(hours=hours))
+        event.services.set([self.cut])
+        return event
+
+    def test_upcoming_current_past(self):
+        now = timezone.now()
+        over = self.make_event("Over", now - timedelta(days=1))
+        on_now = self.make_event("On now", now - timedelta(hours=1))
+        self.assertEqual(list(Event.objects.upcoming()), [on_now, self.event])
+        self.assertEqual(list(Event.objects.current()), [on_now])
+        self.assertEqual(list(Event.objects.past()), [over])
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('Cosmetology:user_appointment_pick_event_create'))
+        self.assertEqual(list(response.context['events']), [on_now, self.event])
+        self.assertNotContains(self.client.get(reverse('Cosmetology:index')), "OVER")
+
+    def test_only_the_future_can_be_booked(self):
+        now = timezone.now()
+        over = self.make_event("Over", now - timedelta(days=1))
+        on_now = self.make_event("On now", now - timedelta(hours=1))
+        self.client.force_login(self.user)
+        def book(event, when):
+            return self.client.post(
+                reverse('Cosmetology:user_appointment_add', kwargs={'event_id': event.pk}),
+                {'services': [self.cut.pk], 'time_and_date': timezone.localtime(when).strftime('%Y-%m-%dT%H:%M')},
+            )
+        self.assertEqual(book(over, over.start_time_and_date + timedelta(hours=1)).status_code, 404)
+        self.assertContains(book(on_now, now - timedelta(minutes=30)), "can&#x27;t be in the past")
+        self.assertRedirects(book(on_now, now + timedelta(hours=1)), reverse('Cosmetology:user_appointments'))
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_archive_moves_old_events_and_keeps_reviews(self):
+        now = timezone.now()
+        old = self.make_event("Old", now - timedelta(days=200))
+        recent = self.make_event("Recent", now - timedelta(days=10))
+        booking = Reservation.objects.create(username="client", time_and_date=old.start_time_and_date, event=old, professional=self.pro_cut, user=self.user)
+        booking.services.set([self.cut])
+        Reservation.objects.create(username="client", time_and_date=self.start, event=self.event, professional=self.pro_cut, user=self.user)
+        review = Review.objects.create(user=self.user, username="client", name="Me", text="great", stars=5, event=old)
+        WaitlistEntry.objects.create(user=self.user, username="client", event=old, reservation=booking)
+
+        self.assertEqual(archive_events(keep_days=90), (1, 1))
+        self.assertEqual(archive_events(keep_days=90), (0, 0))
+
+        self.assertFalse(Event.objects.filter(pk=old.pk).exists())
+        archived = ArchivedEvent.objects.get(pk=old.pk)
+        self.assertEqual((archived.name, archived.services), ("Old", "Haircut"))
+        moved = ArchivedReservation.objects.get(pk=booking.pk)
+        self.assertEqual((moved.event, moved.professional, moved.services), (archived, "Cuts only", "Haircut"))
+        self.assertEqual(Reservation.objects.count(), 1)
+        review.refresh_from_db()
+        self.assertEqual((review.event, review.any_event), (None, archived))
+        self.assertContains(self.client.get(reverse('Cosmetology:reviews')), "Event: Old")
+
+        #newest first across the live and archived events, one page at a time
+        url = reverse('Cosmetology:past_events')
+        with mock.patch.object(views.PastEvents, 'page_size', 1):
+            first = self.client.get(url)
+            self.assertEqual(first.context['events'], [recent])
+            second = self.client.get(url, {'after': first.context['next_cursor']})
+        self.assertEqual(second.context['events'], [archived])
+        self.assertIsNone(second.context['next_cursor'])
+        self.assertContains(second, "OLD")
+
+    def test_past_events_mix_live_and_archived_by_end_time(self):
+        #an imported event that ended long ago stays live until the next archive run, so the two tables overlap
+        now = timezone.now()
+        def archived(pk, days_ago):
+            start = now - timedelta(days=days_ago)
+            return ArchivedEvent.objects.create(
+                id=pk, name=f"Archived {days_ago}", description="x", start_time_and_date=start,
+                end_time=start + timedelta(hours=4), event_location="ACC", services="Haircut",
+            )
+        expected = [
+            self.make_event("Live 10", now - timedelta(days=10)),
+            archived(10001, 100),
+            self.make_event("Live 300", now - timedelta(days=300)),
+            archived(10002, 400),
+            archived(10003, 500),
+        ]
+        url = reverse('Cosmetology:past_events')
+        seen, cursor = [], None
+        with mock.patch.object(views.PastEvents, 'page_size', 2):
+            while True:
+                response = self.client.get(url, {'after': cursor} if cursor else {})
+                seen += response.context['events']
+                cursor = response.context['next_cursor']
+                if not cursor:
+                    break
+        self.assertEqual([event.name for event in seen], [event.name for event in expected])
+
+
+class ProfessionalScheduleTests(BookingTestData):
+    def setUp(self):
+        super().setUp()
+        self.day = timezone.localdate() + timedelta(days=10)
+        self.nine = timezone.make_aware(datetime.combine(self.day, time(9)))
+        self.clinic = Event.objects.create(name="Day Clinic", description="x", start_time_and_date=self.nine, event_location="ACC", end_time=self.nine + timedelta(hours=4))
+        self.clinic.services.set([self.cut])
+
+    def book(self, at):
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation = Reservation.objects.create(username="client", time_and_date=at, event=self.clinic, professional=self.pro_cut, user=self.user)
+            reservation.services.set([self.cut])
+        return reservation
+
+    def test_intervals(self):
+        self.assertEqual(schedule.merge([(5, 7), (1, 3), (2, 4), (7, 8)]), [(1, 4), (5, 8)])
+        self.assertEqual(schedule.subtract([(0, 10), (20, 30)], [(2, 3), (5, 22), (29, 40)]), [(0, 2), (3, 5), (22, 29)])
+
+    def test_gaps_utilization_and_cache(self):
+        self.book(self.nine)
+        self.book(self.nine + timedelta(hours=1))
+        day, = schedule.schedule(self.pro_cut, self.day)
+        self.assertEqual((day['working_minutes'], day['booked_minutes'], day['utilization']), (240, 60, 25))
+        self.assertEqual(day['gaps'], [(self.nine + timedelta(minutes=30), self.nine + timedelta(hours=1)), (self.nine + timedelta(minutes=90), self.nine + timedelta(hours=4))])
+        self.assertEqual([booking['services'] for booking in day['bookings']], [["Haircut"], ["Haircut"]])
+
+        with self.assertNumQueries(0):
+            schedule.schedule(self.pro_cut, self.day)
+
+        moved = self.book(self.nine + timedelta(hours=2)) #drops the cached day
+        day, = schedule.schedule(self.pro_cut, self.day)
+        self.assertEqual(day['booked_minutes'], 90)
+        with self.captureOnCommitCallbacks(execute=True):
+            moved.delete()
+        self.assertEqual(schedule.schedule(self.pro_cut, self.day)[0]['booked_minutes'], 60)
+
+    def test_booking_during_a_build_is_not_lost(self):
+        #the reservation commits (and its signal runs) after the build read the database but before it cached the day
+        build_days = schedule.build_days
+        def book_in_between(professional, days):
+            built = build_days(professional, days)
+            self.book(self.nine)
+            return built
+        with mock.patch.object(schedule, 'build_days', book_in_between):
+            self.assertEqual(schedule.schedule(self.pro_cut, self.day)[0]['booked_minutes'], 0)
+        self.assertEqual(schedule.schedule(self.pro_cut, self.day)[0]['booked_minutes'], 30)
+
+    def test_view_is_admin_only(self):
+        self.book(self.nine)
+        url = reverse('Cosmetology:professional_schedule', args=[self.pro_cut.pk])
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(User.objects.create_superuser(username="boss", email="boss@example.com", password="pw"))
+        response = self.client.get(url, {'start': self.day.isoformat(), 'days': 2})
+        self.assertContains(response, "30 of 240 minutes booked (12%)")
+        self.assertContains(response, "no events")
+        data = self.client.get(url, {'start': self.day.isoformat(), 'format': 'json'}).json()
+        self.assertEqual(data['days'][0]['bookings'][0]['client'], "client")
+        self.assertEqual(self.client.get(url, {'days': 99}).status_code, 400)
+
+
+class WaitlistTests(BookingTestData):
+    def waiter(self, name, services):
+        user = User.objects.create_user(username=name, email=f"{name}@example.com", password="pw")
+        entry = WaitlistEntry.objects.create(user=user, username=name, event=self.event)
+        entry.services.set(services)
+        return entry
+
+    def test_full_event_offers_waitlist(self):
+        hour_in = self.start + timedelta(hours=1)
+        for pro in (self.pro_all, self.pro_cut, self.pro_cut_nails):
+            Reservation.objects.create(username="x", time_and_date=hour_in, event=self.event, professional=pro, user=self.user)
+        self.client.force_login(self.user)
+        url = reverse('Cosmetology:user_appointment_add', args=[self.event.pk])
+        response = self.client.post(url, {'services': [self.cut.pk], 'time_and_date': timezone.localtime(hour_in).strftime('%Y-%m-%dT%H:%M')})
+        self.assertContains(response, "Join the waitlist")
+
+        join = reverse('Cosmetology:waitlist_join', args=[self.event.pk])
+        self.client.post(join, {'services': [self.cut.pk]})
+        self.client.post(join, {'services': [self.cut.pk]}) #same place in line
+        entry = WaitlistEntry.objects.get(user=self.user)
+        self.assertContains(self.client.get(reverse('Cosmetology:user_appointments')), "Waitlist")
+
+        self.client.post(reverse('Cosmetology:waitlist_leave', args=[entry.pk]))
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, WaitlistEntry.LEFT)
+
+    def test_cancel_books_next_eligible_waiter(self):
+        booking = Reservation.objects.create(username="client", time_and_date=self.start, event=self.event, professional=self.pro_cut, user=self.user)
+        needs_facial = self.waiter("facial", [self.facial]) #pro_cut can't do it
+        busy = self.waiter("busy", [self.cut])
+        Reservation.objects.create(username="busy", time_and_date=self.start, event=self.event, professional=self.pro_all, user=busy.user)
+        next_up = self.waiter("next", [self.cut])
+        later = self.waiter("later", [self.cut])
+
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('Cosmetology:user_appointment_cancel', args=[booking.pk]))
+
+        next_up.refresh_from_db()
+        self.assertEqual(next_up.status, WaitlistEntry.PROMOTED)
+        self.assertEqual((next_up.reservation.professional, next_up.reservation.time_and_date), (self.pro_cut, self.start))
+        self.assertEqual(list(next_up.reservation.services.all()), [self.cut])
+        self.assertEqual(
+            set(WaitlistEntry.objects.filter(status=WaitlistEntry.WAITING).values_list('pk', flat=True)),
+            {needs_facial.pk, busy.pk, later.pk},
+        )
+        self.assertTrue(OutgoingEmail.objects.filter(to_email="next@example.com", subject__contains="spot opened up").exists())
+
+    def test_past_or_taken_slots_are_not_handed_out(self):
+        self.waiter("next", [self.cut])
+        self.assertIsNone(promote(self.event.pk, self.pro_cut.pk, timezone.now() - timedelta(hours=1)))
+        Reservation.objects.create(username="client", time_and_date=self.start, event=self.event, professional=self.pro_cut, user=self.user)
+        self.assertIsNone(promote(self.event.pk, self.pro_cut.pk, self.start))
+
+    def test_benchmark_leaves_nothing_behind(self):
+        out = io.StringIO()
+        call_command("benchmark_waitlist", waiters=50, pros=2, hours=1, cancellations=3, stdout=out)
+        self.assertIn("3 of 3 cancellations filled", out.getvalue())
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+
+class QueryTimingMiddlewareTests(BookingTestData):
+    def setUp(self):
+        super().setUp()
+        request_stats.reset()
+
+    def test_server_timing_header_and_summary(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('Cosmetology:user_appointments'))
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+')
+
+        admin = User.objects.create_superuser(username="boss", email="boss@example.com", password="pw")
+        self.client.force_login(admin)
+        summary = self.client.get(reverse('Cosmetology:request_stats')).json()
+        self.assertEqual(summary['views']['Cosmetology:user_appointments']['requests'], 1)
+        self.assertGreater(summary['views']['Cosmetology:user_appointments']['avg_queries'], 0)
+
+    def test_repeated_queries_are_flagged(self):
+        def n_plus_one_view(request):
+            for pro in ServiceProfessional.objects.all():
+                list(pro.services.all()) #one query per pro
+            return HttpResponse("ok")
+
+        request = RequestFactory().get("/")
+        with self.settings(REQUEST_STATS_DUPLICATE_THRESHOLD=3), self.assertLogs('core.middleware', level='WARNING') as logs:
+            QueryTimingMiddleware(n_plus_one_view)(request)
+        self.assertIn("Possible N+1 in unresolved: query ran 3 times", logs.output[0])
+        self.assertEqual(request_stats.summary()['views']['unresolved']['max_duplicate_queries'], 2)
+
+
+class CalendarFeedTests(BookingTestData):
+    def feed(self, name, **params):
+        return self.client.get(reverse(f'Cosmetology:{name}'), params)
+
+    def test_events_json_is_range_bounded(self):
+        later = Event.objects.create(
+            name="Fall Clinic", description="later", start_time_and_date=self.start + timedelta(days=200),
+            event_location="ACC", end_time=self.start + timedelta(days=200, hours=2),
+        )
+        response = self.feed('event_feed_json')
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual([event['name'] for event in data], ["Spring Clinic"])
+        self.assertEqual(sorted(data[0]['services']), ["Facial", "Haircut", "Manicure"])
+
+        day = timezone.localtime(later.start_time_and_date).date()
+        data = json.loads(b"".join(self.feed('event_feed_json', start=str(day), end=str(day + timedelta(days=1))).streaming_content))
+        self.assertEqual([event['name'] for event in data], ["Fall Clinic"])
+
+        self.assertEqual(self.feed('event_feed_json', start="2026-01-01", end="2028-01-01").status_code, 400)
+        self.assertEqual(self.feed('event_feed_json', start="nope").status_code, 400)
+
+    def test_conditional_get(self):
+        response = self.feed('event_feed_ics')
+        etag = response['ETag']
+        self.assertFalse(response.has_header('Last-Modified')) #the ETag covers more than max(updated_at) could
+        self.assertEqual(self.client.get(reverse('Cosmetology:event_feed_ics'), HTTP_IF_MODIFIED_SINCE=http_date()).status_code, 200)
+        self.assertEqual(self.client.get(reverse('Cosmetology:event_feed_ics'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.event.services.remove(self.facial) #m2m changes count as a change too
+        response = self.client.get(reverse('Cosmetology:event_feed_ics'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_ics_format(self):
+        self.event.description = "A long description, with commas; semicolons and a line break\n" + "x" * 80
+        self.event.save()
+        body = b"".join(self.feed('event_feed_ics').streaming_content).decode()
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertIn("SUMMARY:Spring Clinic\r\n", body)
+        self.assertIn("with commas\\; semicolons", body)
+        for line in body.split("\r\n"):
+            self.assertLessEqual(len(line.encode()), 75)
+
+    def test_user_appointments_feed(self):
+        self.assertEqual(self.feed('user_appointment_feed_ics').status_code, 302) #login required
+        reservation = Reservation.objects.create(
+            username=self.user.username, user=self.user, event=self.event,
+            professional=self.pro_all, time_and_date=self.start,
+        )
+        reservation.services.set([self.cut])
+        self.client.force_login(self.user)
+        response = self.feed('user_appointment_feed_json')
+        self.assertIn('private', response['Cache-Control'])
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(data[0]['professional'], "Everything")
+        self.assertIn("UID:reservation-", b"".join(self.feed('user_appointment_feed_ics').streaming_content).decode())
+
+    def test_related_edits_change_etag(self):
+        #the rows show service names and the event's name/location, editing those has to get past the 304
+        reservation = Reservation.objects.create(
+            username=self.user.username, user=self.user, event=self.event,
+            professional=self.pro_all, time_and_date=self.start,
+        )
+        reservation.services.set([self.cut])
+        self.client.force_login(self.user)
+        for name in ['user_appointment_feed_json', 'event_feed_json']:
+            url = reverse(f'Cosmetology:{name}')
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.cut.name = "Trim"
+                self.cut.save()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, name)
+            self.assertIn("Trim", b"".join(response.streaming_content).decode())
+
+        url = reverse('Cosmetology:user_appointment_feed_json')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.event_location = "Room 101"
+            self.event.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Room 101", b"".join(response.streaming_content).decode())
+
+
+class ApiTests(BookingTestData):
+    def api(self, name, **params):
+        response = self.client.get(reverse(f'Cosmetology:{name}'), params)
+        return response, response.json() if response.status_code == 200 else None
+
+    def test_page_of_500_events_is_constant_queries(self):
+        events = Event.objects.bulk_create([
+            Event(name=f"Event {i}", description="d", start_time_and_date=self.start + timedelta(days=i),
+                  end_time=self.start + timedelta(days=i, hours=2), event_location="ACC")
+            for i in range(600)
+        ])
+        Through = Event.services.through
+        Through.objects.bulk_create([Through(event_id=e.pk, service_id=self.cut.pk) for e in events])
+
+        with CaptureQueriesContext(connection) as small:
+            self.api('api_events', limit=5)
+        with CaptureQueriesContext(connection) as big:
+            response, data = self.api('api_events', limit=500)
+        self.assertEqual(len(small), len(big))
+        self.assertEqual(len(data['results']), 500)
+        self.assertEqual(data['results'][1]['services'], [{'id': self.cut.pk, 'name': "Haircut"}])
+
+        seen = len(data['results'])
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            seen += len(data['results'])
+        self.assertEqual(seen, 601)
+
+    def test_field_selection(self):
+        response, data = self.api('api_professionals', fields="name")
+        self.assertEqual(data['results'][0], {'name': "Everything"})
+        response, data = self.api('api_professionals', fields="name,salary")
+        self.assertEqual(response.status_code, 400)
+
+    def test_reviews_newest_first_with_embedded_event(self):
+        for i in range(3):
+            review = Review.objects.create(user=self.user, username="client", name=f"R{i}", text="ok", stars=4, event=self.event)
+            review.services.set([self.nails])
+        response, data = self.api('api_reviews', fields="name,event,services,author")
+        self.assertEqual([r['name'] for r in data['results']], ["R2", "R1", "R0"])
+        self.assertEqual(data['results'][0]['event'], {'id': self.event.pk, 'name': "Spring Clinic"})
+        self.assertEqual(data['results'][0]['author'], "client")
+
+    def test_conditional_requests(self):
+        url = reverse('Cosmetology:api_services')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0): #answered from the content version alone
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Service.objects.create(name="Massage", service_description="relax")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        url = reverse('Cosmetology:api_reviews')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class AsyncViewTests(BookingTestData):
+    #AsyncClient goes through django's asgi handler, like uvicorn does in production
+    async def test_user_appointments_async(self):
+        reservation = await Reservation.objects.acreate(
+            username=self.user.username, user=self.user, event=self.event,
+            professional=self.pro_all, time_and_date=self.start,
+        )
+        await reservation.services.aset([self.cut, self.nails])
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('Cosmetology:user_appointments'))
+        self.assertContains(response, "Everything")
+        self.assertContains(response, "Manicure")
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"') #the timing middleware sees async queries too
+
+    async def test_login_required(self):
+        response = await self.async_client.get(reverse('Cosmetology:user_appointment_pick_event_create'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("login", response['Location'])
+
+    async def test_select_event_async(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse('Cosmetology:user_appointment_pick_event_create')
+        self.assertContains(await self.async_client.get(url), "Spring Clinic")
+        response = await self.async_client.post(url, {'event': self.event.pk})
+        self.assertRedirects(response, reverse('Cosmetology:user_appointment_add', kwargs={'event_id': self.event.pk}), fetch_redirect_response=False)
+
+    async def test_exports_and_feeds_stream(self):
+        #under asgi they get an async iterator, so django doesn't read them into a list before sending
+        reservation = await Reservation.objects.acreate(
+            username=self.user.username, user=self.user, event=self.event,
+            professional=self.pro_all, time_and_date=self.start,
+        )
+        await reservation.services.aset([self.cut])
+        admin = await User.objects.acreate(username="boss", email="boss@example.com", is_superuser=True, is_staff=True)
+        await self.async_client.aforce_login(admin)
+        with mock.patch('core.streaming.BATCH_SIZE', 2):
+            for name in ['admin_user_appointments_export', 'event_feed_json', 'event_feed_ics']:
+                response = await self.async_client.get(reverse(f'Cosmetology:{name}'))
+                self.assertTrue(response.is_async, name)
+                chunks = [chunk async for chunk in response.streaming_content]
+                self.assertGreater(len(chunks), 1, name) #sent a batch at a time
+                body = b"".join(chunks).decode('utf-8-sig')
+                self.assertIn("Spring Clinic", body)
+                if name == 'event_feed_json':
+                    self.assertEqual(len(json.loads(body)), 1)
+
+    async def test_home_async_cache(self):
+        url = reverse('Cosmetology:index')
+        first = await self.async_client.get(url)
+        self.assertContains(first, "SPRING CLINIC")
+        second = await self.async_client.get(url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(await cache.aget("public_pages:hits"), 1)
+
+    def test_load_test_session_logs_in(self):
+        from .loadtest import login_session
+        self.client.cookies.load(login_session(self.user))
+        response = self.client.get(reverse('Cosmetology:user_appointment_pick_event_create'))
+        self.assertEqual(response.status_code, 200)
@@ -1,16 +1,30 @@
 from django.urls import path
 from django.contrib.auth.views import LogoutView
-from . import views
+from . import views, api
 
 app_name = "Cosmetology"
 urlpatterns = [
     path("", views.Home.as_view(), name="index"), #it is going to list events in the calendar
     path('accounts/logout/', LogoutView.as_view(next_page='/'), name='logout'),
     path("event_detail/<pk>", views.EventDetail.as_view(), name="event_detail"), #upon clicking event from calendar
+    path("past_events", views.PastEvents.as_view(), name="past_events"),
+
+    #calendar feeds, take ?start= and ?end=
+    path("calendar/events.json", views.EventFeed.as_view(format='json'), name="event_feed_json"),
+    path("calendar/events.ics", views.EventFeed.as_view(format='ics'), name="event_feed_ics"),
+    path("calendar/my_appointments.json", views.UserAppointmentFeed.as_view(format='json'), name="user_appointment_feed_json"),
+    path("calendar/my_appointments.ics", views.UserAppointmentFeed.as_view(format='ics'), name="user_appointment_feed_ics"),
+
+    #read-only json api, see api.py
+    path("api/v1/events", api.EventList.as_view(), name="api_events"),
+    path("api/v1/services", api.ServiceList.as_view(), name="api_services"),
+    path("api/v1/professionals", api.ProfessionalList.as_view(), name="api_professionals"),
+    path("api/v1/reviews", api.ReviewList.as_view(), name="api_reviews"),
 
 
     #admin only
     path("event_add", views.EventAdd.as_view(), name="event_add"), 
+    path("import_schedule", views.ImportSchedule.as_view(), name="import_schedule"), #admin only, CSV/ICS upload
     path("event_delete/<pk>", views.EventDelete.as_view(), name="event_delete"),
     path("event_edit/<pk>", views.EventEdit.as_view(), name="event_edit"),
 
@@ -29,17 +43,26 @@ urlpatterns = [
     path("user_appointment_pick_event_update/<pk>", views.SelectEventUpdateView.as_view(), name="user_appointment_pick_event_update"),
     path("user_appointment_add/<int:event_id>", views.UserAppointmentAdd.as_view(), name="user_appointment_add"), #name other id's for clarity
     path('user_appointment/<int:event_id>/edit/<pk>/', views.UserAppointmentEdit.as_view(), name='user_appointment_update'),
+    path("waitlist_join/<int:event_id>", views.WaitlistJoin.as_view(), name="waitlist_join"), #when an event is full, see waitlist.py
+    path("waitlist_leave/<int:pk>", views.WaitlistLeave.as_view(), name="waitlist_leave"),
     
     #admin only
     path("admin_user_appointments", views.AdminUserAppointments.as_view(), name="admin_user_appointments"), #list ALL apts.
+    path("admin_user_appointments/export.csv", views.ExportAppointments.as_view(), name="admin_user_appointments_export"),
 
     #admin only
     path("service_providers", views.ServiceProviders.as_view(), name="service_providers"), 
     path("service_provider_add", views.ServiceProviderAdd.as_view(), name="service_provider_add"), 
     path("service_provider_update/<pk>", views.ServiceProviderUpdate.as_view(), name="service_provider_edit"),
     path("service_provider_delete/<pk>", views.ServiceProviderDelete.as_view(), name="service_provider_delete"),
+    path("service_providers/<int:pk>/schedule", views.ProfessionalSchedule.as_view(), name="professional_schedule"),
+
+    #admin only
+    path("cache_stats", views.CacheStats.as_view(), name="cache_stats"),
+    path("request_stats", views.RequestStats.as_view(), name="request_stats"),
 
     path("reviews", views.Reviews.as_view(), name="reviews"),
+    path("search", views.Search.as_view(), name="search"),
     path("review_add", views.ReviewAddView.as_view(), name="review_add"),
     path("review_delete/<pk>", views.ReviewDeleteView.as_view(), name="review_delete"),
 ]
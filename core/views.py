@@ -1,61 +1,79 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
 from django.views import generic, View
-from .models import Service, ServiceProfessional, Event, Reservation, Review
+from .models import Service, ServiceProfessional, Event, Reservation, Review, ArchivedEvent, WaitlistEntry
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.exceptions import PermissionDenied
-from .forms import EventForm, UserAppointmentForm, AdminAppointmentForm, ReviewForm, ServiceForm
-from datetime import date
-import random
-from django.core.mail import send_mail
-from django.conf import settings
+from django.core.exceptions import PermissionDenied, BadRequest
+from .forms import EventForm, UserAppointmentForm, AdminAppointmentForm, ReviewForm, ServiceForm, AppointmentFilterForm, ImportScheduleForm
+from datetime import date, timedelta
+import io
+from itertools import chain
+from django.utils import timezone
+from .booking import qualified_professionals, reserve_professional, is_professional_free
+from django.db import transaction
+from .emails import queue_appointment_email
+from .pagination import keyset_page, keyset_page_across, BadCursor
+from .availability import open_slots_by_service
+from .caching import PublicPageCacheMixin, cache_stats, aget_content_version
+from django.template.response import TemplateResponse
+from .middleware import request_stats
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from . import feeds
+from .exports import csv_rows, appointment_row
+from .streaming import streaming_response
+from .search import search
+from . import schedule, waitlist
+from django.core.serializers.json import DjangoJSONEncoder
+from .imports import detect_kind, import_schedule
 
 # Create your views here.
 
-#https://docs.djangoproject.com/en/5.2/topics/email/
-def send_appointment_email(appointment):
-    subject = "Your Appointment Confirmation"
-
-    service_names = []
-    for service in appointment.services.all():
-        service_names.append(service.name)
-    services_string = "Services: " + ", ".join(service_names)
-
-    message = (
-        f"Hello {appointment.user.username},\n\n"
-        f"Your appointment has been confirmed with the following details:\n\n"
-        f"Event: {appointment.event.name}\n"
-        f"Date: {appointment.time_and_date}\n"
-        f"Services: {services_string}\n"
-        f"Assigned Professional: {appointment.professional.name if appointment.professional else 'TBD'}\n\n"
-        f"Thank you for choosing our services!\n"
-        f"- Cosmetology Team"
-    )
-
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [appointment.user.email],
-        fail_silently=False,
-    )
-
-
-class Home(generic.ListView):
-    model = Event
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    #LoginRequiredMixin reads request.user, which would hit the database synchronously inside an async view.
+    #this loads the user with the async api first and then does the same check
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser() #so templates and handle_no_permission don't load it again
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        return await View.dispatch(self, request, *args, **kwargs)
+
+class Home(PublicPageCacheMixin, View): #async: logged out visitors are answered straight from the cache
     template_name = "core/home_placeholder.html"
-    context_object_name = 'events'
-    
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['services'] = Service.objects.all()  # Add services manually
-        return context
 
-class EventDetail(generic.DetailView):
+    async def get(self, request):
+        #the querysets are lazy, they only run if the {% cache %} fragments in the template miss.
+        #TemplateResponse renders in a worker thread, so that is allowed
+        return TemplateResponse(request, self.template_name, {
+            'events': Event.objects.upcoming(), #past ones are on the past events page
+            'services': Service.objects.all(),
+            'content_version': await aget_content_version(),
+        })
+
+class EventDetail(PublicPageCacheMixin, generic.DetailView):
     model = Event
+    shows_reviews = True
+    queryset = Event.objects.select_related('rating') #review totals, see ratings.py
     template_name = "core/event_detail.html"
     
 
+class PastEvents(PublicPageCacheMixin, View): #newest first, live past events and archived ones mixed together
+    template_name = "core/past_events.html"
+    page_size = 30
+    cache_params = ('after',)
+
+    def get(self, request):
+        #merged by end time, not one table after the other: imports can add live events that ended before some archived
+        #ones, and events that aren't archived yet sit among them too. one cursor works for both tables
+        try:
+            events, next_cursor = keyset_page_across(
+                [Event.objects.past(), ArchivedEvent.objects.all()], 'end_time', request.GET.get('after'), self.page_size, descending=True,
+            )
+        except BadCursor:
+            raise BadRequest("Invalid page cursor.")
+        return render(request, self.template_name, {'events': events, 'next_cursor': next_cursor})
+
 class EventAdd(LoginRequiredMixin, generic.CreateView):
     model = Event
     template_name = "core/event_add.html"
@@ -67,6 +85,33 @@ class EventAdd(LoginRequiredMixin, generic.CreateView):
             raise PermissionDenied
         return super().dispatch(request, *args, **kwargs) #If the user is a superuser, this line calls the original dispatch() method from the parent class
 
+class ImportSchedule(LoginRequiredMixin, View): #admin only, upload a CSV/ICS of events or professionals (see imports.py)
+    template_name = "core/import_schedule.html"
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request):
+        return render(request, self.template_name, {'form': ImportScheduleForm()})
+
+    def post(self, request):
+        form = ImportScheduleForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return render(request, self.template_name, {'form': form})
+        upload = form.cleaned_data['file']
+        lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', errors='replace', newline='') #read as it goes, not all at once
+        first_line = lines.readline()
+        kind = form.cleaned_data['kind'] or detect_kind(upload.name, first_line)
+        result = import_schedule(
+            chain([first_line], lines), kind,
+            create_services=form.cleaned_data['create_services'], dry_run=form.cleaned_data['dry_run'],
+        )
+        return render(request, self.template_name, {
+            'form': ImportScheduleForm(), 'result': result, 'kind': kind, 'dry_run': form.cleaned_data['dry_run'],
+        })
+
 class EventDelete(LoginRequiredMixin, generic.DeleteView):
     model = Event
     template_name = "core/event_delete.html"
@@ -93,25 +138,40 @@ class EventEdit(LoginRequiredMixin, generic.UpdateView):
 
 
     
-class UserAppointments(LoginRequiredMixin, generic.ListView):
-    model = Reservation
+class UserAppointments(AsyncLoginRequiredMixin, View):
     template_name = "core/user_appointments.html"
 
-    def get_queryset(self):
-        return Reservation.objects.filter(user=self.request.user)
+    async def get(self, request):
+        reservations = (
+            Reservation.objects
+            .filter(user=request.user)
+            .select_related('event', 'professional')
+            .prefetch_related('services')
+            .order_by('time_and_date') #uses the user+time index
+        )
+        reservation_list = [reservation async for reservation in reservations] #loads everything up front, no queries while rendering
+        waiting = (
+            WaitlistEntry.objects
+            .filter(user=request.user, status=WaitlistEntry.WAITING)
+            .select_related('event')
+            .prefetch_related('services')
+            .order_by('created_at')
+        )
+        waitlist_entries = [entry async for entry in waiting]
+        return TemplateResponse(request, self.template_name, {'reservation_list': reservation_list, 'waitlist_entries': waitlist_entries})
     
-class SelectEventCreateView(LoginRequiredMixin, View): #cant use generic here since we are not CRUDing, only grabbing an event id and trying to pass it down to the next view
-    def get(self, request):
-        events = Event.objects.all()
-        return render(request, 'core/event_select.html', {'events': events})
+class SelectEventCreateView(AsyncLoginRequiredMixin, View): #cant use generic here since we are not CRUDing, only grabbing an event id and trying to pass it down to the next view
+    async def get(self, request):
+        events = [event async for event in Event.objects.upcoming()] #only ones that can still be booked
+        return TemplateResponse(request, 'core/event_select.html', {'events': events})
 
-    def post(self, request):
+    async def post(self, request):
         event_id = request.POST.get('event') #get that event id
         return redirect('Cosmetology:user_appointment_add', event_id=event_id) #go to the appointment_add view and provide the event to the view for filtering logic
     
 class SelectEventUpdateView(LoginRequiredMixin, View): #seems inneficient but I don't know how else to do this
     def get(self, request, pk):
-        events = Event.objects.all()
+        events = Event.objects.upcoming()
         return render(request, 'core/event_select.html', {'events': events})
 
     def post(self, request, pk):
@@ -134,15 +194,17 @@ class UserAppointmentAdd(LoginRequiredMixin, generic.CreateView):
         context = super().get_context_data(**kwargs)
 
         event_id = self.kwargs.get('event_id') #you use self.kwargs.get to grab an id from a url
-        event = get_object_or_404(Event, pk=event_id)
+        event = get_object_or_404(Event.objects.upcoming(), pk=event_id) #events that are over can't be booked
         context['event'] = event
+        context['open_slots'] = open_slots_by_service(event) #comes from the cache, see availability.py
+        context['waitlist_services'] = getattr(self, 'waitlist_services', None) #set when booking failed because everyone was taken
 
         return context
 
     def get_initial(self):
         initial = super().get_initial()
         event_id = self.kwargs.get('event_id')
-        event = get_object_or_404(Event, pk=event_id)
+        event = get_object_or_404(Event.objects.upcoming(), pk=event_id)
         initial['time_and_date'] = event.start_time_and_date.date
         return initial
 
@@ -152,38 +214,52 @@ class UserAppointmentAdd(LoginRequiredMixin, generic.CreateView):
         form.instance.username = user.username #assign username
 
         event_id = self.kwargs.get('event_id') #you use self.kwargs.get to grab an id from a url
-        event = get_object_or_404(Event, pk=event_id)
+        event = get_object_or_404(Event.objects.upcoming(), pk=event_id)
         form.instance.event = event #make the selection from the last page apply to the appointment
 
 
         selected_services = form.cleaned_data['services'] #this is how u get the clean data in a form valid function
 
-        all_pros = list(ServiceProfessional.objects.all()) #query all proffessionals 
-        random.shuffle(all_pros) #gives equal chance for each pro to get selected
-        for professional in all_pros: #get all the proffessionals
-            has_all_services = True #see whether they have that service
-            for service in selected_services: #check each service
-                if service not in professional.services.all(): #and see if it is in the proffessional's list of services
-                    has_all_services = False
-                    break #get out
-
-            if has_all_services == True: #if they do, assign them and stop the loop
-                form.instance.professional = professional
-                break
-        else: #show error if no proffessional has all those services
-            form.add_error(None, "No professional offers all selected services.") #add_error allows you to specify what error to show
-            return self.form_invalid(form)
-
         selected_time = form.cleaned_data['time_and_date'] #get the date the user picked
         if Event.objects.filter(pk = event.pk, start_time_and_date__lte = selected_time, end_time__gte=selected_time).exists()==False: #https://www.w3schools.com/django/ref_lookups_lte.php
             form.add_error(None, "Appointment time must be within event start and end time.")
             return self.form_invalid(form)
-        
-        #!!! do this first instead of directly returning this line because it creates self.object and we need self.object to use the emailing function
-        response = super().form_valid(form)
-        send_appointment_email(self.object)
+        if selected_time < timezone.now():
+            form.add_error(None, "Appointment time can't be in the past.")
+            return self.form_invalid(form)
+
+        with transaction.atomic(): #the pro stays locked until the reservation is saved so two people can't grab the same slot
+            professional = reserve_professional(selected_services, selected_time, event) #one query for every free pro that has all the services and how busy they are, see booking.py
+            if professional is None:
+                if qualified_professionals(selected_services).exists(): #only runs when booking failed, to give a better error
+                    form.add_error(None, "No professional is available at that time. Please pick another time, or join the waitlist.")
+                    self.waitlist_services = selected_services
+                else: #show error if no proffessional has all those services
+                    form.add_error(None, "No professional offers all selected services.") #add_error allows you to specify what error to show
+                return self.form_invalid(form)
+            form.instance.professional = professional
+
+            #!!! do this first instead of directly returning this line because it creates self.object and we need self.object to use the emailing function
+            response = super().form_valid(form)
+            queue_appointment_email(self.object) #only saved if the reservation is, the send_queued_emails command sends it
         return response
     
+class WaitlistJoin(LoginRequiredMixin, View): #POST services=..., from the booking page when everyone was taken
+    def post(self, request, event_id):
+        event = get_object_or_404(Event.objects.upcoming(), pk=event_id)
+        services = list(Service.objects.filter(event=event, pk__in=request.POST.getlist('services')))
+        if not services:
+            raise BadRequest("Pick at least one service.")
+        waitlist.join(request.user, event, services)
+        return redirect('Cosmetology:user_appointments')
+
+class WaitlistLeave(LoginRequiredMixin, View):
+    def post(self, request, pk):
+        entry = get_object_or_404(WaitlistEntry, pk=pk, user=request.user, status=WaitlistEntry.WAITING)
+        entry.status = WaitlistEntry.LEFT
+        entry.save(update_fields=['status'])
+        return redirect('Cosmetology:user_appointments')
+
 class UserAppointmentEdit(LoginRequiredMixin, generic.UpdateView):
     model = Reservation
     #form_class = AppointmentForm
@@ -225,7 +301,14 @@ class UserAppointmentEdit(LoginRequiredMixin, generic.UpdateView):
             form.add_error(None, "Appointment time must be within event start and end time.")
             return self.form_invalid(form)
 
-        return super().form_valid(form)
+        with transaction.atomic():
+            professional = form.instance.professional #admins can reassign the pro in the form, users keep theirs
+            if professional is not None:
+                ServiceProfessional.objects.select_for_update().filter(pk=professional.pk).first() #lock the pro like booking does
+                if not is_professional_free(professional, selected_time, exclude_pk=form.instance.pk):
+                    form.add_error(None, f"{professional.name} already has an appointment at that time.")
+                    return self.form_invalid(form)
+            return super().form_valid(form)
     
     def get_success_url(self): #success url doesn't work when you want to pass the primary key
         if self.request.user.is_superuser:
@@ -259,11 +342,60 @@ class AdminUserAppointments(LoginRequiredMixin, generic.ListView):
             raise PermissionDenied
         return super().dispatch(request, *args, **kwargs)
 
+    page_size = 50
+
     def get_queryset(self):
-        return Reservation.objects.all().order_by('time_and_date')
+        qs = Reservation.objects.select_related('event', 'professional', 'user').prefetch_related('services')
+
+        self.filter_form = AppointmentFilterForm(self.request.GET or None)
+        return self.filter_form.filter(qs)
+
+    def get_context_data(self, **kwargs):
+        #keyset pagination on (time_and_date, id), "after" is the cursor of the last row on the previous page
+        try:
+            rows, next_cursor = keyset_page(self.object_list, 'time_and_date', self.request.GET.get('after'), self.page_size)
+        except BadCursor:
+            raise BadRequest("Invalid page cursor.")
+        context = super().get_context_data(object_list=rows, **kwargs)
+        context['filter_form'] = self.filter_form
+
+        params = self.request.GET.copy() #keep the filters when going to the next page
+        params.pop('after', None)
+        context['first_page_query'] = params.urlencode()
+        context['export_query'] = params.urlencode() #export uses the same filters, but all pages
+        if next_cursor:
+            params['after'] = next_cursor
+            context['next_page_query'] = params.urlencode()
+        return context
     
-class Services(generic.ListView): #we will show the details in the list since the model only has 2 fields.
+class ExportAppointments(LoginRequiredMixin, View): #admin only, same filters as the appointments page, as a CSV file
+    columns = ['ID', 'Time', 'Event', 'Location', 'User', 'Email', 'Professional', 'Services']
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request):
+        form = AppointmentFilterForm(request.GET or None)
+        if form.is_bound and not form.is_valid(): #an empty file would look like there's nothing to export
+            raise BadRequest(f"Invalid filters: {form.errors.as_text()}")
+        qs = form.filter(
+            Reservation.objects
+            .select_related('event', 'professional', 'user')
+            .prefetch_related('services')
+            .order_by('time_and_date', 'pk')
+        )
+        rows = qs.iterator(chunk_size=2000) #only one chunk (and its services) is in memory at a time
+
+        response = streaming_response(request, csv_rows(self.columns, (appointment_row(r) for r in rows)), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="appointments-{timezone.localdate()}.csv"'
+        return response
+
+class Services(PublicPageCacheMixin, generic.ListView): #we will show the details in the list since the model only has 2 fields.
     model = Service
+    shows_reviews = True
+    queryset = Service.objects.select_related('rating') #review totals come with the services, see ratings.py
     fields = '__all__'
     template_name = "core/services.html"
 
@@ -303,10 +435,103 @@ class ServiceEdit(LoginRequiredMixin, generic.UpdateView):
     def get_success_url(self): #success url doesn't work when you want to pass the primary key
         return reverse_lazy('Cosmetology:services')
 
-class ServiceProviders(generic.ListView):
+class ServiceProviders(PublicPageCacheMixin, generic.ListView):
     model = ServiceProfessional
+    queryset = ServiceProfessional.objects.prefetch_related('services') #the template lists every pro's services
     template_name = "core/service_providers.html"
 
+class EventFeed(View): #calendar of events, ?start=2026-05-01&end=2026-06-01 (defaults to the next 90 days)
+    format = 'json'
+    cache_control = {'public': True, 'max_age': 300}
+
+    def get_queryset(self, start, end):
+        return feeds.events_in_range(start, end).prefetch_related('services').order_by('start_time_and_date', 'pk')
+
+    def rows_to(self):
+        return feeds.event_json if self.format == 'json' else feeds.event_vevent
+
+    def get(self, request):
+        start, end = feeds.date_range(request)
+        queryset = self.get_queryset(start, end)
+
+        #answer "nothing changed" with a 304 before reading any rows. only an ETag, no Last-Modified: max(updated_at)
+        #misses deleted rows and renamed services/events/pros, which the ETag covers
+        count, last_modified = feeds.feed_state(queryset)
+        etag = quote_etag(feeds.feed_etag(self.__class__.__name__ + self.format, start, end, count, last_modified))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            rows = queryset.iterator(chunk_size=feeds.CHUNK_SIZE) #prefetches one chunk at a time
+            if self.format == 'json':
+                response = streaming_response(request, feeds.stream_json(rows, self.rows_to(), request), content_type='application/json')
+            else:
+                response = streaming_response(
+                    request, feeds.stream_ics(rows, self.rows_to(), request, "ACC Cosmetology"), content_type='text/calendar; charset=utf-8')
+                response['Content-Disposition'] = 'inline; filename="cosmetology.ics"'
+        response['ETag'] = etag
+        patch_cache_control(response, **self.cache_control)
+        return response
+
+class UserAppointmentFeed(LoginRequiredMixin, EventFeed): #the logged in user's own appointments
+    cache_control = {'private': True, 'no_cache': True} #browser can keep it but has to check the ETag every time
+
+    def get_queryset(self, start, end):
+        return (
+            feeds.reservations_in_range(self.request.user, start, end)
+            .select_related('event', 'professional')
+            .prefetch_related('services')
+            .order_by('time_and_date', 'pk')
+        )
+
+    def rows_to(self):
+        return feeds.reservation_json if self.format == 'json' else feeds.reservation_vevent
+
+class CacheStats(LoginRequiredMixin, View): #admin only, shows how often the public page cache is hit
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request):
+        return JsonResponse(cache_stats())
+
+class RequestStats(LoginRequiredMixin, View): #admin only, query counts and timings per view for the worker that answers
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request):
+        return JsonResponse(request_stats.summary())
+
+class ProfessionalSchedule(LoginRequiredMixin, View): #admin only, ?start=2026-05-01&days=7 (defaults to today), ?format=json
+    template_name = "core/professional_schedule.html"
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, pk):
+        professional = get_object_or_404(ServiceProfessional, pk=pk)
+        try:
+            first_day = date.fromisoformat(request.GET['start']) if request.GET.get('start') else timezone.localdate()
+            days = int(request.GET.get('days', 1))
+        except ValueError:
+            raise BadRequest("Invalid start or days.")
+        if not 1 <= days <= schedule.MAX_DAYS:
+            raise BadRequest(f"days has to be between 1 and {schedule.MAX_DAYS}.")
+
+        days_list = schedule.schedule(professional, first_day, days)
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'professional': {'id': professional.pk, 'name': professional.name}, 'days': days_list}, encoder=DjangoJSONEncoder)
+        return render(request, self.template_name, {
+            'professional': professional,
+            'days': days_list,
+            'previous_start': first_day - timedelta(days=days),
+            'next_start': first_day + timedelta(days=days),
+            'day_count': days,
+        })
+
 class ServiceProviderAdd(LoginRequiredMixin, generic.CreateView):
     model = ServiceProfessional
     template_name = "core/service_provider_add.html"
@@ -344,6 +569,17 @@ class ServiceProviderUpdate(LoginRequiredMixin, generic.UpdateView):
 class Reviews(generic.ListView):
     model = Review
     template_name = "core/reviews.html"
+    paginate_by = 20 #the page would keep growing with every review otherwise
+
+    def get_queryset(self):
+        #grab the event and user in the same query and all the services in one more, instead of 3 queries per review
+        return (
+            Review.objects
+            .select_related('event', 'archived_event', 'user')
+            .prefetch_related('services')
+            .order_by('-time_and_date', '-pk') #newest first
+        )
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
@@ -352,6 +588,12 @@ class Reviews(generic.ListView):
         return context
 
 
+class Search(View): #?q=... over services, events and reviews, see search.py
+    def get(self, request):
+        query = request.GET.get('q', '')[:200]
+        return render(request, 'core/search.html', {'query': query, 'results': search(query)})
+
+
 class ReviewAddView(LoginRequiredMixin, View):
     def get(self,request):
         return redirect(reverse('Cosmetology:reviews'))
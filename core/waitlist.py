@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .booking import is_professional_free, overlapping_reservations
+from .emails import queue_appointment_email
+from .models import Reservation, ServiceProfessional, WaitlistEntry
+
+#people who couldn't book because every pro that does their services was taken. when a reservation is cancelled
+#(signals.py, after the cancel commits) the freed pro + time goes to the person who has waited longest at that event,
+#as long as the pro does all of their services and they aren't booked at that time themselves.
+#
+#safe with several cancellations at once: promote() locks the pro's row like booking does (booking.py), so the freed
+#slot is only handed out once, and the waiter is picked with SELECT ... FOR UPDATE SKIP LOCKED so two promotions
+#never pick the same person. sqlite doesn't have either, but it only lets one transaction write at a time anyway.
+
+PROMOTED_SUBJECT = "A spot opened up, you're booked"
+PROMOTED_INTRO = "A spot opened up at an event you were on the waitlist for, so we booked it for you:"
+
+
+def join(user, event, services):
+    #joining again with the same services keeps your place in line
+    wanted = {service.pk for service in services}
+    for entry in WaitlistEntry.objects.filter(user=user, event=event, status=WaitlistEntry.WAITING).prefetch_related('services'):
+        if {service.pk for service in entry.services.all()} == wanted:
+            return entry
+    entry = WaitlistEntry.objects.create(user=user, username=user.username, event=event)
+    entry.services.set(services)
+    return entry
+
+
+def next_waiter(event_id, professional, time_and_date):
+    #the longest waiting entry this pro can take at this time, locked. one query: the "needs something the pro doesn't
+    #do" and "already booked then" checks are NOT EXISTS subqueries, and the queue index gives the order
+    needs_more = (
+        WaitlistEntry.services.through.objects
+        .filter(waitlistentry=OuterRef('pk'))
+        .exclude(service__in=professional.services.values('pk'))
+    )
+    busy = overlapping_reservations(time_and_date).filter(user=OuterRef('user_id'))
+    return (
+        WaitlistEntry.objects
+        .filter(event_id=event_id, status=WaitlistEntry.WAITING)
+        .filter(~Exists(needs_more), ~Exists(busy))
+        .order_by('created_at', 'pk')
+        .select_for_update(skip_locked=True)
+        .first()
+    )
+
+
+def promote(event_id, professional_id, time_and_date):
+    #fills a freed slot from the waitlist, returns the new reservation or None
+    if professional_id is None or time_and_date <= timezone.now():
+        return None
+    with transaction.atomic():
+        professional = ServiceProfessional.objects.select_for_update().filter(pk=professional_id).first()
+        if professional is None or not is_professional_free(professional, time_and_date):
+            return None #the pro is gone, or somebody booked the slot before us
+        entry = next_waiter(event_id, professional, time_and_date)
+        if entry is None:
+            return None
+
+        reservation = Reservation.objects.create(
+            username=entry.username, time_and_date=time_and_date, event_id=event_id, professional=professional, user_id=entry.user_id)
+        reservation.services.set(entry.services.all())
+        entry.status = WaitlistEntry.PROMOTED
+        entry.reservation = reservation
+        entry.save(update_fields=['status', 'reservation'])
+        queue_appointment_email(reservation, subject=PROMOTED_SUBJECT, intro=PROMOTED_INTRO) #sent by send_queued_emails
+    return reservation
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 import environ
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -60,6 +61,7 @@ INSTALLED_APPS = [
     ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryTimingMiddleware', #first so it times everything below it, see /request_stats
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -91,11 +93,58 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = env("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = env("EMAIL_HOST_USER")
+#booking emails go into the OutgoingEmail table and are sent by "python manage.py send_queued_emails --loop"
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_BASE_SECONDS = 60 #doubles after every failed attempt
+EMAIL_RETRY_MAX_SECONDS = 60 * 60
 
 LOGIN_REDIRECT_URL = '/' #if there is no "?next"
 #security measures for logins
 ACCOUNT_LOGIN_ATTEMPTS_LIMIT = 5
 ACCOUNT_LOGIN_ATTEMPTS_TIMEOUT = 300
+#set by the load testing commands for the server they start. all their simulated users log in from 127.0.0.1,
+#which would trip allauth's per ip login rate limit right away. never set this in production
+LOAD_TEST = env.bool("LOAD_TEST", default=False)
+if LOAD_TEST:
+    ACCOUNT_RATE_LIMITS = False
+
+#how long one appointment blocks a professional, used to detect double bookings
+APPOINTMENT_SLOT_MINUTES = env.int("APPOINTMENT_SLOT_MINUTES", default=30)
+
+#how a booking picks among the free pros, a key of core.booking.STRATEGIES ("least_loaded" or "random").
+#compare them with the simulate_assignment command
+APPOINTMENT_ASSIGNMENT = env.str("APPOINTMENT_ASSIGNMENT", default="least_loaded")
+
+#one cache shared by every gunicorn worker: the page cache, availability grids, sessions and allauth's login
+#rate limits all live here, so they have to agree across workers (the default per process cache doesn't)
+REDIS_URL = env.str("REDIS_URL", default="")
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'cosmetology',
+        }
+    }
+else:
+    #no redis (local development, single server): files are still shared between workers on the same machine
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': env.str("CACHE_DIR", default=os.path.join(tempfile.gettempdir(), 'cosmetology_cache')),
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+#sessions are read from the cache, the database copy is only touched when a session changes or fell out of the cache
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+#logged out visitors get home/services/professionals/event pages from the cache, edits show up right away (see core/caching.py)
+PUBLIC_PAGE_CACHE_SECONDS = 60 * 10
+
+#per view query counts and timings (core/middleware.py)
+REQUEST_STATS_WINDOW = 200 #how many recent requests per view the summary keeps
+REQUEST_STATS_DUPLICATE_THRESHOLD = 5 #log a warning when one query runs this many times in a request
 
 
 ####
@@ -128,16 +177,45 @@ if USE_POSTGRES:
         'default': {
             'ENGINE': 'django.db.backends.postgresql',
             'HOST': os.environ.get('DBHOST'),
+            'PORT': os.environ.get('DBPORT', ''),
             'NAME': os.environ.get('DBNAME'),
             'USER': os.environ.get('DBUSER'),
-            'PASSWORD': os.environ.get('DBPASS')
+            'PASSWORD': os.environ.get('DBPASS'),
+            'CONN_HEALTH_CHECKS': True, #make sure a reused connection still works before a request gets it
+            'OPTIONS': {},
         }
     }
+    #connection reuse, so requests don't pay for a new tcp connection + login every time (see benchmark_db_connections).
+    #the sizes are per gunicorn worker process: workers * DB_POOL_MAX_SIZE has to stay under postgres' max_connections
+    DB_POOL_MAX_SIZE = env.int("DB_POOL_MAX_SIZE", default=10) #0 turns the pool off
+    if env.bool("DB_PGBOUNCER", default=False):
+        #pgbouncer in transaction mode (docker compose --profile pgbouncer) does the pooling, keep one connection to it.
+        #transactions can land on different server connections, so no server side cursors for .iterator()
+        DATABASES['default']['CONN_MAX_AGE'] = env.int("DB_CONN_MAX_AGE", default=60)
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+    elif DB_POOL_MAX_SIZE:
+        #psycopg's pool, shared by all the threads of a worker. works under asgi too, where persistent connections don't
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': env.int("DB_POOL_MIN_SIZE", default=2),
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': env.float("DB_POOL_TIMEOUT", default=10), #seconds a request waits for a free connection before erroring
+            'max_idle': 5 * 60, #close extra idle connections after this long
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = env.int("DB_CONN_MAX_AGE", default=60)
 else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            #take the write lock when a transaction starts so two bookings can't both read a slot as free
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+            },
+            #tests use a real file instead of in-memory so the concurrent booking test can open one connection per thread
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
         }
     }
 
@@ -186,7 +264,11 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),  # Custom directory for static files
 ]
 
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    #whitenoise's hashed + compressed files, plus smaller avif/webp/jpeg copies of the slideshow photos (core/images.py)
+    'staticfiles': {'BACKEND': 'core.storage.ResponsiveStaticFilesStorage'},
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field